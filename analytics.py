@@ -0,0 +1,221 @@
+"""Аналитика навигации: нажатия, ответы и вопросы менеджерам в Postgres.
+
+Обработчики только кладут событие в кольцевой буфер в памяти (deque с
+maxlen=ANALYTICS_BUFFER_SIZE) и увеличивают счётчики — без ожидания и
+ввода-вывода. Раз в ANALYTICS_FLUSH_INTERVAL фоновая задача забирает буфер и
+пишет события одним COPY (asyncpg copy_records_to_table) в analytics_events,
+а заранее сложенные счётчики — в analytics_node_counts (день, пункт меню,
+тип события) и analytics_funnel (день, этап воронки, пользователи).
+
+Если Postgres недоступен, события возвращаются в буфер, а повтор идёт с
+нарастающей паузой; при переполнении буфера теряются самые старые события
+(счётчик dropped). Ответы пользователям от этого не зависят.
+
+Воронка считает разных пользователей за день на этапах FUNNEL_STAGES.
+Обновления одного пользователя всегда попадают в один процесс (cluster.py),
+поэтому числа из разных воркеров складываются; после рестарта в тот же день
+пользователь может быть посчитан повторно.
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import Counter, deque
+from datetime import date, datetime, timezone
+from typing import Deque, Dict, List, NamedTuple, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+ANALYTICS_URL = os.getenv("ANALYTICS_URL", "")  # postgres://...; пусто — аналитика выключена
+ANALYTICS_BUFFER_SIZE = int(os.getenv("ANALYTICS_BUFFER_SIZE", 100_000))  # событий в памяти
+ANALYTICS_FLUSH_INTERVAL = float(os.getenv("ANALYTICS_FLUSH_INTERVAL", 10))  # секунды
+ANALYTICS_FLUSH_TIMEOUT = float(os.getenv("ANALYTICS_FLUSH_TIMEOUT", 30))  # секунды на одну запись
+ANALYTICS_MAX_BACKOFF = 300.0
+
+# Этапы воронки по порядку: открыл бота, нажал пункт меню, получил ответ, написал менеджеру
+FUNNEL_STAGES = ("start", "tap", "answer", "escalation")
+EVENT_COLUMNS = ("at", "user_id", "kind", "node", "answer")
+
+_EPOCH_DAY = date(1970, 1, 1).toordinal()
+
+
+class AnalyticsEvent(NamedTuple):
+    at: float  # time.time()
+    user_id: int
+    kind: str  # start | tap | answer | escalation
+    node: str  # путь пункта меню, "Раздел / Подраздел"; "" — главное меню
+    answer: Optional[str]
+
+
+class Analytics:
+    def __init__(self, dsn: str = ANALYTICS_URL, buffer_size: int = ANALYTICS_BUFFER_SIZE,
+                 flush_interval: float = ANALYTICS_FLUSH_INTERVAL, flush_timeout: float = ANALYTICS_FLUSH_TIMEOUT):
+        self.dsn = dsn
+        self.flush_interval = flush_interval
+        self.flush_timeout = flush_timeout
+        self._buffer: Deque[AnalyticsEvent] = deque(maxlen=buffer_size)
+        # Сложенные заранее, ещё не записанные приращения
+        self._node_counts: Counter = Counter()  # (день, пункт, тип) -> число
+        self._funnel: Counter = Counter()  # (день, этап) -> новые пользователи
+        self._seen: Dict[str, Set[int]] = {stage: set() for stage in FUNNEL_STAGES}
+        self._seen_day = 0
+        self.recorded = 0
+        self.dropped = 0
+        self.flushed = 0
+        self.failures = 0
+        self._pool = None
+        self._task = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.dsn)
+
+    @property
+    def pending(self) -> int:
+        return len(self._buffer)
+
+    def record(self, user_id: int, kind: str, node: str = "", answer: Optional[str] = None):
+        """Queue one event; O(1) and never waits for the database"""
+        if not self.enabled:
+            return
+        at = time.time()
+        if len(self._buffer) == self._buffer.maxlen:
+            self.dropped += 1
+        self._buffer.append(AnalyticsEvent(at, user_id, kind, node, answer))
+        self.recorded += 1
+        day = int(at // 86400)
+        self._node_counts[(day, node, kind)] += 1
+        if kind in self._seen:
+            if day != self._seen_day:
+                for users in self._seen.values():
+                    users.clear()
+                self._seen_day = day
+            users = self._seen[kind]
+            if user_id not in users:
+                users.add(user_id)
+                self._funnel[(day, kind)] += 1
+
+    # ── Запись в Postgres
+
+    async def _open(self):
+        import asyncpg
+
+        pool = await asyncpg.create_pool(self.dsn, min_size=1, max_size=2)
+        try:
+            await pool.execute(
+                "CREATE TABLE IF NOT EXISTS analytics_events ("
+                " at TIMESTAMPTZ NOT NULL,"
+                " user_id BIGINT NOT NULL,"
+                " kind TEXT NOT NULL,"
+                " node TEXT NOT NULL,"
+                " answer TEXT);"
+                "CREATE INDEX IF NOT EXISTS analytics_events_at ON analytics_events (at);"
+                "CREATE TABLE IF NOT EXISTS analytics_node_counts ("
+                " day DATE NOT NULL,"
+                " node TEXT NOT NULL,"
+                " kind TEXT NOT NULL,"
+                " count BIGINT NOT NULL,"
+                " PRIMARY KEY (day, node, kind));"
+                "CREATE TABLE IF NOT EXISTS analytics_funnel ("
+                " day DATE NOT NULL,"
+                " stage TEXT NOT NULL,"
+                " users BIGINT NOT NULL,"
+                " PRIMARY KEY (day, stage))"
+            )
+        except BaseException:
+            pool.terminate()
+            raise
+        self._pool = pool
+
+    def _take(self) -> Tuple[List[AnalyticsEvent], Counter, Counter]:
+        events, self._buffer = list(self._buffer), deque(maxlen=self._buffer.maxlen)
+        node_counts, self._node_counts = self._node_counts, Counter()
+        funnel, self._funnel = self._funnel, Counter()
+        return events, node_counts, funnel
+
+    def _put_back(self, events: List[AnalyticsEvent], node_counts: Counter, funnel: Counter):
+        # Более новые события важнее: при переполнении теряются старые
+        merged = deque(events, maxlen=self._buffer.maxlen)
+        overflow = max(0, len(events) + len(self._buffer) - self._buffer.maxlen)
+        merged.extend(self._buffer)
+        self.dropped += overflow
+        self._buffer = merged
+        self._node_counts.update(node_counts)
+        self._funnel.update(funnel)
+
+    async def _write(self, events: List[AnalyticsEvent], node_counts: Counter, funnel: Counter):
+        async with self._pool.acquire() as conn:
+            async with conn.transaction():
+                if events:
+                    await conn.copy_records_to_table(
+                        "analytics_events", columns=EVENT_COLUMNS,
+                        records=[(datetime.fromtimestamp(e.at, timezone.utc), e.user_id, e.kind, e.node, e.answer)
+                                 for e in events],
+                    )
+                if node_counts:
+                    await conn.executemany(
+                        "INSERT INTO analytics_node_counts (day, node, kind, count) VALUES ($1, $2, $3, $4) "
+                        "ON CONFLICT (day, node, kind) DO UPDATE "
+                        "SET count = analytics_node_counts.count + excluded.count",
+                        [(date.fromordinal(_EPOCH_DAY + day), node, kind, n)
+                         for (day, node, kind), n in node_counts.items()],
+                    )
+                if funnel:
+                    await conn.executemany(
+                        "INSERT INTO analytics_funnel (day, stage, users) VALUES ($1, $2, $3) "
+                        "ON CONFLICT (day, stage) DO UPDATE SET users = analytics_funnel.users + excluded.users",
+                        [(date.fromordinal(_EPOCH_DAY + day), stage, n) for (day, stage), n in funnel.items()],
+                    )
+
+    async def flush(self) -> int:
+        """Write buffered events and counters; on failure they go back to the buffer"""
+        if not self._buffer and not self._node_counts and not self._funnel:
+            return 0
+        batch = self._take()
+        try:
+            if self._pool is None:
+                await asyncio.wait_for(self._open(), self.flush_timeout)
+            await asyncio.wait_for(self._write(*batch), self.flush_timeout)
+        except BaseException:
+            self._put_back(*batch)
+            raise
+        self.flushed += len(batch[0])
+        return len(batch[0])
+
+    async def _flush_loop(self):
+        delay = self.flush_interval
+        while True:
+            await asyncio.sleep(delay)
+            try:
+                await self.flush()
+                delay = self.flush_interval
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failures += 1
+                delay = min(delay * 2, ANALYTICS_MAX_BACKOFF)
+                reason = str(e) or type(e).__name__  # у TimeoutError пустой текст
+                logger.warning(f"Analytics flush failed, {self.pending} events kept, retry in {delay:.0f}s: {reason}")
+
+    async def start(self):
+        if self.enabled:
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Final analytics flush failed, {self.pending} events lost: {str(e) or type(e).__name__}")
+        if self._pool is not None:
+            try:
+                await asyncio.wait_for(self._pool.close(), self.flush_timeout)
+            except asyncio.TimeoutError:
+                self._pool.terminate()
+            self._pool = None
@@ -0,0 +1,180 @@
+"""Скорость и надёжность рассылки (broadcast.py) против локального Bot API.
+
+    python -m bench.broadcast --users 3000 --rate 30 --latency 0.05 --blocked 0.05
+    python -m bench.broadcast --users 20000 --rate 1000 --global-rate 1000   # потолок без лимитов Telegram
+
+Хранилище сессий — SQLite с --users пользователями; отправка идёт через
+настоящие SendScheduler, PTB и HTTPX в сервер-заглушку (bench.fake_api),
+часть пользователей «заблокировала» бота. Рассылка прерывается на середине
+(как при рестарте) и продолжается новым Broadcaster. Затем вторая рассылка
+проверяет, что заблокировавшие пропускаются, а третья — два Broadcaster на
+одном файле, как два воркера: второй не перехватывает живую рассылку
+первого, видит её статус, отменяет её и разблокирует пользователя. Выводит
+отправок в секунду, повторы после рестарта и пропуски.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import time
+from collections import Counter
+
+from bench.fake_api import FakeBotApi
+from bench.stubs import BENCH_TOKEN, configure_env
+
+
+async def wait_done(broadcaster, broadcast_id):
+    while True:
+        broadcast = await broadcaster.status(broadcast_id)
+        if broadcast.status != "running":
+            return broadcast
+        await asyncio.sleep(0.05)
+
+
+async def run(args, api: FakeBotApi, users, blocked):
+    import bot_api
+    from broadcast import Broadcaster, BroadcastState
+    from sender import SendScheduler
+    from sessions import SQLiteBackend, WriteBehindSessionStore
+
+    logging.disable(logging.WARNING)
+    backend = SQLiteBackend(os.path.join(os.path.dirname(os.environ["BROADCAST_DB_PATH"]), "sessions.db"))
+    await backend.open()
+    await backend.save_many((u, 0) for u in users)
+    await backend.close()
+    sessions = WriteBehindSessionStore(backend)
+    await sessions.start()
+
+    bot = bot_api.make_bot(BENCH_TOKEN)
+    await bot.initialize()
+    sender = SendScheduler()
+    await sender.start(bot)
+
+    # Первый запуск: прерываем посередине
+    broadcaster = Broadcaster(sessions, sender)
+    await broadcaster.start()
+    started = time.perf_counter()
+    broadcast = await broadcaster.broadcast("🩸 Большая неделя донора — приходите!")
+    while api.calls.get("sendMessage", 0) < len(users) * args.interrupt_at:
+        await asyncio.sleep(0.01)
+    await broadcaster.stop()
+    state = BroadcastState()
+    state.open()
+    interrupted = state.get(broadcast.id)
+    state.close()
+    calls_before = api.calls.get("sendMessage", 0)
+
+    # Рестарт: новый Broadcaster продолжает с курсора
+    broadcaster = Broadcaster(sessions, sender)
+    await broadcaster.start()
+    first = await wait_done(broadcaster, broadcast.id)
+    elapsed = time.perf_counter() - started
+
+    # Доставленными считаются только ответы 200: 429 и 403 ничего не отправили
+    per_chat = Counter(int(call.params["chat_id"]) for call in api.log
+                       if call.method == "sendMessage" and call.status == 200)
+    missing = [u for u in users if u not in blocked and per_chat[u] == 0]
+    duplicates = sum(n - 1 for u, n in per_chat.items() if n > 1 and u not in blocked)
+
+    # Вторая рассылка: заблокировавших бота пропускаем
+    log_size = len(api.log)
+    second = await wait_done(broadcaster, (await broadcaster.broadcast("Напоминание")).id)
+    to_blocked = sum(1 for call in api.log[log_size:] if call.method == "sendMessage"
+                     and int(call.params["chat_id"]) in blocked)
+
+    await broadcaster.stop()
+
+    # Два воркера на одном файле; короткая аренда, чтобы отмена дошла быстро
+    first_worker, second_worker = Broadcaster(sessions, sender, lease=0.6), Broadcaster(sessions, sender, lease=0.6)
+    await first_worker.start()
+    await second_worker.start()
+    third = await first_worker.broadcast("Третья")
+    await asyncio.sleep(0.5)  # несколько продлений аренды
+    stolen = list(second_worker._tasks)
+    seen_running = (await second_worker.status(third.id)).status == "running"
+    cancelled = await second_worker.cancel(third.id)
+    deadline = time.monotonic() + 2
+    while third.id in first_worker._tasks and time.monotonic() < deadline:
+        await asyncio.sleep(0.02)
+    stopped = third.id not in first_worker._tasks
+    unblocked = min(blocked)
+    await second_worker.unblock(unblocked)
+    still_blocked = await asyncio.to_thread(first_worker.state.blocked_among, [unblocked])
+    # /start всех остальных, кроме заблокировавших, в файл не пишет
+    writes = []
+    remove_blocked = second_worker.state.remove_blocked
+    second_worker.state.remove_blocked = lambda user_id: writes.append(user_id) or remove_blocked(user_id)
+    for user_id in users:
+        if user_id not in blocked or user_id == unblocked:
+            await second_worker.unblock(user_id)
+    third = await first_worker.status(third.id)
+    await first_worker.stop()
+    await second_worker.stop()
+    await sender.stop()
+    await bot.shutdown()
+    await sessions.close()
+
+    print(f"users={len(users)} blocked={len(blocked)} rate limit={args.rate}/s "
+          f"global limit={args.global_rate}/s api latency={args.latency * 1000:.0f}ms")
+    print(f"first broadcast: {first.sent} sent, {first.blocked} blocked, {first.failed} failed "
+          f"in {elapsed:.2f}s ({first.sent / elapsed:.0f} sends/s)")
+    print(f"interrupted after {calls_before} calls, resumed from user_id {interrupted.cursor}; "
+          f"duplicates after resume: {duplicates} (window {broadcaster.window})")
+    print(f"second broadcast: {second.sent} sent, {to_blocked} sends to blocked users")
+    print(f"429 from api: {api.floods}, sender retries: {sender.retried}")
+    print(f"two workers: cancelled from the other after {third.sent} sends, status {third.status}")
+    failures = []
+    if missing:
+        failures.append(f"{len(missing)} users never received the broadcast")
+    if duplicates > broadcaster.window:
+        failures.append(f"{duplicates} duplicates exceed the window")
+    if to_blocked:
+        failures.append("blocked users were not skipped")
+    if stolen:
+        failures.append("second worker took over a live broadcast")
+    if not (seen_running and cancelled and stopped and third.status == "cancelled"):
+        failures.append("status/cancel from another worker did not reach the sending one")
+    if still_blocked:
+        failures.append("unblock from another worker is not visible")
+    if writes:
+        failures.append(f"/start of {len(writes)} users who never blocked the bot wrote to the database")
+    if failures:
+        print("FAILED: " + "; ".join(failures))
+        raise SystemExit(1)
+    print("OK")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=3000)
+    parser.add_argument("--rate", type=float, default=30, help="BROADCAST_RATE")
+    parser.add_argument("--global-rate", type=float, default=30, help="SEND_GLOBAL_RATE")
+    parser.add_argument("--window", type=int, default=16, help="BROADCAST_WINDOW")
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--flood", type=float, default=0.0, help="доля ответов 429")
+    parser.add_argument("--blocked", type=float, default=0.05, help="доля заблокировавших бота")
+    parser.add_argument("--interrupt-at", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    configure_env(args.users)
+    rng = random.Random(args.seed)
+    users = sorted(rng.sample(range(10_000, 10_000_000), args.users))
+    blocked = {u for u in users if rng.random() < args.blocked}
+    api = FakeBotApi(latency=args.latency, flood_rate=args.flood, blocked_chats=blocked, seed=args.seed)
+    api.start_in_thread()
+    os.environ.update({
+        "BOT_API_URL": api.url,
+        "SEND_GLOBAL_RATE": str(args.global_rate),
+        "BROADCAST_RATE": str(args.rate),
+        "BROADCAST_WINDOW": str(args.window),
+    })
+    try:
+        asyncio.run(run(args, api, users, blocked))
+    finally:
+        api.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""Проверка режима нескольких воркеров (cluster.py) без сети.
+
+    python -m bench.cluster_check --workers 4 --users 200 --taps 8
+    python -m bench.cluster_check --kill   # убить воркер посреди потока
+
+Поднимает WorkerPool с настоящими процессами-воркерами (Bot API — заглушка),
+общим SQLite-хранилищем сессий и перемешанным потоком обновлений от многих
+пользователей, принятых через журнал, как в main.main(). Проверяет, что
+каждый пользователь обслуживался одним воркером, его обновления обработаны
+по порядку, все они отмечены в журнале обработанными, а итоговые узлы меню
+в хранилище совпадают с ожидаемыми.
+
+С --kill воркер убивается на середине потока: проверяется, что его
+перезапустили и все обновления всё равно обработаны (часть — дважды) и
+отмечены в журнале. Итоговые узлы меню в этом режиме не сверяются: убитый
+воркер теряет сессии, не записанные за SESSION_FLUSH_INTERVAL.
+"""
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import time
+
+from bench.stubs import BENCH_TOKEN, StubRequest, configure_env, expected_node, make_update, navigation_session
+
+
+def check_worker(index: int, queue, acks, results, session_url: str):
+    configure_env(users=100_000)
+    os.environ["SESSION_STORE_URL"] = session_url
+    os.environ["LOG_LEVELS"] = "telegram=WARNING"
+
+    import main
+    from telegram import Update
+    from telegram.ext import Application, TypeHandler
+
+    async def record(update: Update, context):
+        results.put((index, update.effective_user.id, update.update_id))
+
+    app = (
+        Application.builder().token(BENCH_TOKEN)
+        .request(StubRequest()).get_updates_request(StubRequest())
+        .updater(None).build()
+    )
+    app.add_handler(TypeHandler(Update, record), group=-1)
+    main.register_handlers(app)
+    asyncio.run(main.run_worker(queue, acks, app))
+
+
+def main(workers: int, users: int, taps: int, seed: int, kill: bool = False):
+    configure_env(users)
+    tmp = os.path.dirname(os.environ["FORWARD_SPOOL_PATH"])
+    db_path = os.path.join(tmp, "sessions.db")
+
+    from cluster import WorkerPool
+    from content import load_content
+    from ingest import UpdateIngest
+    from menu import BACK_BUTTON
+
+    menu = load_content().menu
+    rng = random.Random(seed)
+    sessions = {1000 + u: navigation_session(menu, BACK_BUTTON, rng, taps) for u in range(users)}
+
+    # Перемешиваем пользователей, сохраняя порядок сообщений каждого
+    stream = [user for user, texts in sessions.items() for _ in texts]
+    rng.shuffle(stream)
+    cursors = dict.fromkeys(sessions, 0)
+    updates = []
+    for update_id, user in enumerate(stream, 1):
+        updates.append(make_update(update_id, user, sessions[user][cursors[user]]))
+        cursors[user] += 1
+
+    import multiprocessing
+    results = multiprocessing.get_context("spawn").Queue()
+    pool = WorkerPool(workers, target=check_worker, args=(results, f"sqlite:///{db_path}"))
+    pool.start()
+    started = time.perf_counter()
+
+    log_path = os.path.join(tmp, "cluster_updates.db")
+
+    async def feed():
+        ingest = UpdateIngest(pool.process, path=log_path, concurrency=32 * workers)
+        await ingest.start()
+        supervisor = asyncio.create_task(pool.supervise(interval=0.2))
+        for data in updates:
+            await ingest.accept(data)
+        if kill:
+            while ingest.queue_depth > len(updates) // 2:
+                await asyncio.sleep(0.01)
+            pool.processes[0].kill()
+        await ingest.stop(timeout=120)
+        supervisor.cancel()
+        await asyncio.gather(supervisor, return_exceptions=True)
+        await asyncio.to_thread(pool.stop, 120)
+
+    asyncio.run(feed())
+    elapsed = time.perf_counter() - started
+
+    seen = {}
+    processed = set()
+    while len(processed) < len(updates) or not results.empty():
+        index, user, update_id = results.get(timeout=10)
+        seen.setdefault(user, []).append((index, update_id))
+        processed.add(update_id)
+
+    failures = []
+    for user, entries in seen.items():
+        if len({index for index, _ in entries}) != 1:
+            failures.append(f"user {user}: served by several workers")
+        ids = [update_id for _, update_id in entries]
+        if ids != sorted(ids):
+            failures.append(f"user {user}: updates processed out of order")
+    if len(seen) != users:
+        failures.append(f"{users - len(seen)} users never processed")
+
+    with sqlite3.connect(log_path) as db:
+        unprocessed = db.execute("SELECT COUNT(*) FROM updates WHERE processed_at IS NULL").fetchone()[0]
+    if unprocessed:
+        failures.append(f"{unprocessed} updates not marked processed in the journal")
+
+    if kill and pool.restarts != 1:
+        failures.append(f"killed worker restarted {pool.restarts} times")
+
+    with sqlite3.connect(db_path) as db:
+        stored = dict(db.execute("SELECT user_id, node_id FROM sessions"))
+    for user, texts in sessions.items() if not kill else ():
+        want = expected_node(menu, BACK_BUTTON, texts)
+        if stored.get(user) != want:
+            failures.append(f"user {user}: stored node {stored.get(user)}, expected {want}")
+
+    per_worker = [0] * workers
+    for entries in seen.values():
+        per_worker[entries[0][0]] += len(entries)
+    print(f"workers:     {workers}")
+    print(f"updates:     {len(updates)} from {users} users in {elapsed:.2f}s (incl. worker startup)")
+    print(f"per worker:  {per_worker}")
+    if kill:
+        print(f"restarts:    {pool.restarts}, processed twice: {sum(map(len, seen.values())) - len(updates)}")
+    if failures:
+        print(f"FAILED: {len(failures)} problems")
+        for line in failures[:20]:
+            print(f"  {line}")
+        raise SystemExit(1)
+    print("OK: per-user ordering, single-worker routing and "
+          + ("restart of the killed worker hold" if kill else "shared session state hold"))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--taps", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--kill", action="store_true", help="убить воркер 0 на середине потока")
+    args = parser.parse_args()
+    main(args.workers, args.users, args.taps, args.seed, args.kill)
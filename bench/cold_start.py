@@ -0,0 +1,160 @@
+"""Холодный старт: от запуска процесса до первого ответа на вебхук.
+
+    python -m bench.cold_start --runs 5 --latency 0.1
+    python -m bench.cold_start --no-snapshot                 # компиляция контента при каждом старте
+    python -m bench.cold_start --history cold_start.jsonl    # сравнить с прошлым замером и дописать
+
+Как после простоя на бесплатном Render: процесс `python main.py`
+запускается заново, а первое обновление (/start) уже ждёт — «Telegram»
+стучится в вебхук, пока порт не откроется. Bot API — сервер-заглушка
+(bench.fake_api) с задержкой --latency, как сеть до Telegram. Меряется
+время от запуска до ответа 200 на вебхук и до отправки ответа
+пользователю; первый запуск собирает снимок контента (content.py) и идёт
+отдельной строкой.
+
+С --history медиана времени до ответа пользователю сравнивается с
+последней записью файла в том же режиме: хуже больше чем на --tolerance —
+код выхода 1 (регрессия). Новый замер дописывается в файл.
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from tornado.httpclient import AsyncHTTPClient, HTTPClientError, HTTPRequest
+
+from bench.e2e import free_port
+from bench.fake_api import FakeBotApi
+from bench.stubs import BENCH_TOKEN, configure_env, make_update
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+async def boot_once(api: FakeBotApi, env: dict, user_id: int, timeout: float):
+    """(seconds to webhook 200, seconds to the reply) for one fresh process"""
+    port = free_port()
+    env = {**env, "PORT": str(port), "RENDER_URL": f"http://127.0.0.1:{port}/"}
+    request = HTTPRequest(
+        f"http://127.0.0.1:{port}/{BENCH_TOKEN}", method="POST",
+        body=json.dumps(make_update(user_id, user_id, "/start")),
+        headers={"Content-Type": "application/json"}, request_timeout=timeout,
+    )
+    log_size = len(api.log)
+    with tempfile.TemporaryFile() as stderr:
+        started = time.perf_counter()
+        process = subprocess.Popen([sys.executable, "main.py"], cwd=REPO, env=env,
+                                   stdout=subprocess.DEVNULL, stderr=stderr)
+        try:
+            while True:
+                try:
+                    await AsyncHTTPClient().fetch(request)
+                    break
+                except (ConnectionError, HTTPClientError) as e:
+                    if isinstance(e, HTTPClientError) and e.code != 599:
+                        raise
+                if process.poll() is not None or time.perf_counter() - started > timeout:
+                    stderr.seek(0)
+                    raise RuntimeError(f"bot did not start:\n{stderr.read().decode()[-2000:]}")
+                await asyncio.sleep(0.002)
+            accepted = time.perf_counter() - started
+            while not any(call.method == "sendMessage" and int(call.params.get("chat_id", 0)) == user_id
+                          for call in api.log[log_size:]):
+                if time.perf_counter() - started > timeout:
+                    raise RuntimeError("no reply to /start")
+                await asyncio.sleep(0.002)
+            replied = time.perf_counter() - started
+        finally:
+            process.send_signal(signal.SIGINT)
+            try:
+                process.wait(15)
+            except subprocess.TimeoutExpired:
+                process.kill()
+    return accepted, replied
+
+
+def check_history(path: str, entry: dict, tolerance: float) -> bool:
+    previous = None
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                if record["mode"] == entry["mode"] and record["latency"] == entry["latency"]:
+                    previous = record
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry) + "\n")
+    if previous is None:
+        print(f"history: first {entry['mode']} record in {path}")
+        return True
+    change = entry["reply_p50"] / previous["reply_p50"] - 1
+    print(f"history: reply p50 {previous['reply_p50']:.3f}s -> {entry['reply_p50']:.3f}s ({change:+.0%}) "
+          f"vs {previous['revision']}")
+    return change <= tolerance
+
+
+def revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+async def run(args, api: FakeBotApi, env: dict):
+    results = []
+    for i in range(args.runs + 1):
+        results.append(await boot_once(api, env, 5000 + i, args.timeout))
+    first, rest = results[0], results[1:]
+    accepted = [a for a, _ in rest]
+    replied = [r for _, r in rest]
+    mode = "compile" if args.no_snapshot else "snapshot"
+    print(f"mode={mode} runs={args.runs} api latency={args.latency * 1000:.0f}ms")
+    print(f"first boot:    webhook 200 {first[0]:.3f}s, reply {first[1]:.3f}s"
+          + ("" if args.no_snapshot else " (builds the snapshot)"))
+    print(f"next boots:    webhook 200 p50 {statistics.median(accepted):.3f}s, "
+          f"reply p50 {statistics.median(replied):.3f}s min {min(replied):.3f}s max {max(replied):.3f}s")
+    if args.history:
+        entry = {
+            "at": time.strftime("%Y-%m-%dT%H:%M:%S"), "revision": revision(), "mode": mode,
+            "latency": args.latency, "runs": args.runs,
+            "accepted_p50": round(statistics.median(accepted), 4), "reply_p50": round(statistics.median(replied), 4),
+        }
+        if not check_history(args.history, entry, args.tolerance):
+            print(f"FAILED: cold start regressed by more than {args.tolerance:.0%}")
+            raise SystemExit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="запусков после первого")
+    parser.add_argument("--latency", type=float, default=0.1, help="задержка Bot API, с")
+    parser.add_argument("--no-snapshot", action="store_true", help="CONTENT_SNAPSHOT_PATH=''")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--history", help="файл JSON Lines с прошлыми замерами")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="допустимое ухудшение медианы")
+    args = parser.parse_args()
+
+    tmp = configure_env(1)
+    api = FakeBotApi(latency=args.latency)
+    api.start_in_thread()
+    env = {
+        **os.environ,
+        "BOT_TOKEN": BENCH_TOKEN,
+        "BOT_API_URL": api.url,
+        "TRANSPORT": "webhook",
+        "CONTENT_SNAPSHOT_PATH": "" if args.no_snapshot else os.path.join(tmp, "content.snapshot"),
+        "LOG_LEVEL": "WARNING",
+    }
+    try:
+        asyncio.run(run(args, api, env))
+    finally:
+        api.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""Стресс-проверка параллельной обработки с очередью на пользователя (ingest.py).
+
+    python -m bench.concurrency_check --users 500 --taps 10 --concurrency 64
+    python -m bench.concurrency_check --unsafe   # без сериализации — для сравнения
+
+Перемешанный поток навигации многих пользователей идёт через UpdateIngest с
+настоящими обработчиками; Bot API отвечает со случайной задержкой, чтобы
+обработчики одного пользователя пересекались во времени. Проверяет, что
+обновления каждого пользователя не обрабатывались одновременно и шли по
+порядку, итоговые узлы меню совпадают с ожидаемыми, разные пользователи
+обрабатывались параллельно, а очереди пользователей после дренажа удалены.
+С --unsafe та же нагрузка идёт без очередей и проверка должна упасть.
+"""
+import argparse
+import asyncio
+import logging
+import random
+import time
+
+from bench.stubs import BENCH_TOKEN, StubRequest, configure_env, expected_node, make_update, navigation_session
+
+
+class SlowStubRequest(StubRequest):
+    def __init__(self, rng: random.Random, max_delay: float):
+        super().__init__()
+        self.rng = rng
+        self.max_delay = max_delay
+
+    async def do_request(self, url, method, request_data=None, **kwargs):
+        if not url.endswith("getMe"):
+            await asyncio.sleep(self.rng.random() * self.max_delay)
+        return await super().do_request(url, method, request_data, **kwargs)
+
+
+async def run(users: int, taps: int, concurrency: int, seed: int, unsafe: bool):
+    import main
+    from ingest import UpdateIngest
+    from telegram import Update
+    from telegram.ext import Application
+
+    logging.disable(logging.WARNING)
+    rng = random.Random(seed)
+    request = SlowStubRequest(rng, max_delay=0.02)
+    app = (
+        Application.builder().token(BENCH_TOKEN)
+        .request(request).get_updates_request(StubRequest())
+        .updater(None).build()
+    )
+    main.register_handlers(app)
+    await app.initialize()
+    await main.sender.start(app.bot)
+    await main.manager_forwarder.start()
+
+    menu = main.content.current.menu
+    sessions = {1000 + u: navigation_session(menu, main.BACK_BUTTON, rng, taps) for u in range(users)}
+    stream = [user for user, texts in sessions.items() for _ in texts]
+    rng.shuffle(stream)
+    cursors = dict.fromkeys(sessions, 0)
+    updates = []
+    for update_id, user in enumerate(stream, 1):
+        updates.append(make_update(update_id, user, sessions[user][cursors[user]]))
+        cursors[user] += 1
+
+    processed = {}
+    user_busy = set()
+    overlaps = set()
+    in_flight = max_in_flight = 0
+
+    async def process(data):
+        nonlocal in_flight, max_in_flight
+        user = data["message"]["from"]["id"]
+        if user in user_busy:
+            overlaps.add(user)  # начали, не дождавшись предыдущего обновления того же пользователя
+        user_busy.add(user)
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        try:
+            processed.setdefault(user, []).append(data["update_id"])
+            await app.process_update(Update.de_json(data, app.bot))
+        finally:
+            in_flight -= 1
+            user_busy.discard(user)
+
+    started = time.perf_counter()
+    ingest = None
+    if unsafe:
+        # Наивная параллельность: каждое обновление — отдельная задача под общим семафором
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def guarded(data):
+            async with semaphore:
+                await process(data)
+
+        await asyncio.gather(*(guarded(data) for data in updates))
+    else:
+        ingest = UpdateIngest(process, path=":memory:", concurrency=concurrency)
+        await ingest.start()
+        for data in updates:
+            await ingest.accept(data)
+        await ingest.stop(timeout=300)
+    elapsed = time.perf_counter() - started
+
+    await main.manager_forwarder.stop()
+    await main.sender.stop()
+    await app.shutdown()
+
+    failures = []
+    for user in sorted(overlaps):
+        failures.append(f"user {user}: updates processed concurrently")
+    for user, ids in processed.items():
+        if ids != sorted(ids):
+            failures.append(f"user {user}: updates started out of order")
+    for user, texts in sessions.items():
+        got, want = main.user_navigation.get_cached(user), expected_node(menu, main.BACK_BUTTON, texts)
+        if got != want:
+            failures.append(f"user {user}: node {got}, expected {want}")
+    if max_in_flight < 2:
+        failures.append("updates were never processed in parallel")
+    if ingest is not None and ingest.active_users:
+        failures.append(f"{ingest.active_users} user queues left after drain")
+
+    mode = "unsafe (no per-user serialization)" if unsafe else "per-user queues"
+    print(f"mode:        {mode}")
+    print(f"updates:     {len(updates)} from {users} users in {elapsed:.2f}s ({len(updates) / elapsed:.0f} upd/s)")
+    print(f"parallelism: up to {max_in_flight} updates in flight (limit {concurrency})")
+    if failures:
+        print(f"FAILED: {len(failures)} problems")
+        for line in failures[:20]:
+            print(f"  {line}")
+        raise SystemExit(1)
+    print("OK: per-user order and navigation state preserved under concurrency")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--taps", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--unsafe", action="store_true", help="обрабатывать без очередей на пользователя")
+    args = parser.parse_args()
+
+    configure_env(args.users)
+    asyncio.run(run(args.users, args.taps, args.concurrency, args.seed, args.unsafe))
+
+
+if __name__ == "__main__":
+    main()
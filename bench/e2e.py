@@ -0,0 +1,158 @@
+"""Сквозной прогон: настоящий main() против локального Bot API (bench.fake_api).
+
+    python -m bench.e2e --users 200 --taps 6 --transport webhook --latency 0.02
+    python -m bench.e2e --transport polling --flood 0.01
+
+Запускает бота целиком — main.main(): журнал обновлений, транспорт,
+очередь отправки, HTTP-клиент Bot API, — направив его через BOT_API_URL на
+сервер-заглушку в отдельном потоке. «Пользователи» шлют обновления через
+вебхук (или getUpdates) и ждут ответа бота; каждый следующий шаг — после
+ответа на предыдущий. Выводит время старта, пропускную способность и время
+до первого ответа p50/p90/p99.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import socket
+import time
+import urllib.request
+
+from bench.fake_api import FakeBotApi
+from bench.handlers import summarize
+from bench.stubs import BENCH_TOKEN, configure_env, make_update, navigation_session
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def drive(api: FakeBotApi, sessions: dict, concurrency: int, timeout: float):
+    """Telegram side: users send their sessions step by step, waiting for each reply"""
+    latencies, missed = [], 0
+    update_id = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def user(user_id, texts):
+        nonlocal update_id, missed
+        async with semaphore:
+            for text in texts:
+                update_id += 1
+                reply = api.expect_message(user_id)
+                started = time.perf_counter()
+                status = await api.push_update(make_update(update_id, user_id, text))
+                try:
+                    await asyncio.wait_for(reply, timeout)
+                except asyncio.TimeoutError:
+                    missed += 1
+                    continue
+                if status == 200:
+                    latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(user(u, texts) for u, texts in sessions.items()))
+    return latencies, missed, time.perf_counter() - started
+
+
+def fetch_metrics(port: int) -> str:
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=10) as response:
+        return response.read().decode()
+
+
+def check_metrics(text: str, workers: int) -> str:
+    """Handler histograms must come from the processes that run handlers"""
+    handled = [line for line in text.splitlines() if line.startswith("donorsbot_handler_seconds_count")]
+    if workers > 1:
+        # Фронт-процесс обработчиков не выполняет и хранилищ не открывает
+        missing = [i for i in range(workers) if not any(f'worker="{i}"' in line for line in handled)]
+        front_stores = [line for line in text.splitlines() if line.startswith('donorsbot_sessions{worker="front"')]
+        if missing or front_stores:
+            raise SystemExit(f"/metrics: no handler samples from workers {missing}, front store gauges {front_stores}")
+    elif not handled:
+        raise SystemExit("/metrics: no handler samples")
+    return f"{len(text.splitlines())} lines, {len(handled)} handler series"
+
+
+async def run(args, api: FakeBotApi):
+    started = time.perf_counter()
+    import main  # читает окружение при импорте
+
+    logging.disable(logging.WARNING)
+    menu = main.content.current.menu
+    rng = random.Random(args.seed)
+    sessions = {1000 + u: navigation_session(menu, main.BACK_BUTTON, rng, args.taps) for u in range(args.users)}
+
+    bot_task = asyncio.create_task(main.main())
+    # Готов, когда Telegram-заглушка знает вебхук или бот начал опрос
+    while not (api.webhook_url if args.transport == "webhook" else "getUpdates" in api.calls):
+        if bot_task.done():
+            bot_task.result()  # ошибка старта
+        await asyncio.sleep(0.01)
+    startup = time.perf_counter() - started
+
+    try:
+        latencies, missed, elapsed = await api.run_in_server_loop(
+            drive(api, sessions, args.concurrency, args.reply_timeout)
+        )
+        scrape = await asyncio.to_thread(fetch_metrics, int(os.environ["PORT"]))
+    finally:
+        bot_task.cancel()
+        await asyncio.gather(bot_task, return_exceptions=True)
+
+    stats = summarize(latencies)
+    total = sum(len(texts) for texts in sessions.values())
+    print(f"transport={args.transport} users={args.users} updates={total} concurrency={args.concurrency}")
+    print(f"api latency={args.latency * 1000:.0f}ms jitter={args.jitter * 1000:.0f}ms flood rate={args.flood}")
+    print(f"startup:     {startup:.2f}s (import main + main() until the transport is up)")
+    print(f"throughput:  {len(latencies) / elapsed:.0f} updates/s over {elapsed:.2f}s")
+    print("first reply ms: " + " ".join(f"{k}={v:.1f}" for k, v in stats.items()))
+    print(f"no reply:    {missed}")
+    print(f"429 sent:    {api.floods}")
+    print("bot api calls: " + " ".join(f"{k}={v}" for k, v in sorted(api.calls.items())))
+    print(f"/metrics:    {check_metrics(scrape, args.workers)}")
+    if missed:
+        raise SystemExit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--taps", type=int, default=6, help="нажатий на пользователя после /start")
+    parser.add_argument("--concurrency", type=int, default=50, help="пользователей одновременно")
+    parser.add_argument("--transport", choices=("webhook", "polling"), default="webhook")
+    parser.add_argument("--latency", type=float, default=0.02, help="задержка ответа Bot API, с")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--flood", type=float, default=0.0, help="доля ответов 429 на отправку")
+    parser.add_argument("--reply-timeout", type=float, default=10.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=1, help="WORKERS; при > 1 сессии в общем SQLite")
+    args = parser.parse_args()
+
+    tmp = configure_env(args.users)
+    api = FakeBotApi(latency=args.latency, jitter=args.jitter, flood_rate=args.flood, seed=args.seed)
+    api.start_in_thread()
+    port = free_port()
+    os.environ.update({
+        "BOT_TOKEN": BENCH_TOKEN,
+        "BOT_API_URL": api.url,
+        "TRANSPORT": args.transport,
+        "RENDER_URL": f"http://127.0.0.1:{port}/",
+        "PORT": str(port),
+        "POLL_TIMEOUT": "1",
+        "INGEST_LOG_PATH": os.path.join(tmp, "updates.db"),
+        "LOG_LEVEL": "WARNING",
+        "WORKERS": str(args.workers),
+    })
+    if args.workers > 1:
+        os.environ["SESSION_STORE_URL"] = f"sqlite:///{os.path.join(tmp, 'sessions.db')}"
+    try:
+        asyncio.run(run(args, api))
+    finally:
+        api.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+"""Проверка загрузки календаря (events.py) против локального сервера и файла.
+
+    python -m bench.events_check
+    python -m bench.events_check --big 20000   # плюс скорость разбора большого календаря
+
+Сервер-заглушка отдаёт .ics с ETag и Last-Modified и отвечает 304 на
+условные запросы. Календарь строится относительно сегодняшнего дня: события
+на весь день и по времени, многодневные и уже идущие, повторы RRULE с
+EXDATE и изменённым вхождением, отменённые, прошедшие и слишком далёкие.
+Проверяются индекс и текст ответа, 304 без повторного разбора, подмена при
+изменении, локальный файл, и что answer() не ждёт медленную загрузку.
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import tornado.web
+from tornado.httpserver import HTTPServer
+from tornado.netutil import bind_sockets
+
+
+def ics_date(day) -> str:
+    return f"{day:%Y%m%d}"
+
+
+def ics_time(moment) -> str:
+    return f"{moment:%Y%m%dT%H%M%S}"
+
+
+def build_calendar(today, tz):
+    """(iCalendar text like Google exports, expected upcoming summaries) relative to `today`"""
+    d = lambda days: today + timedelta(days=days)  # noqa: E731
+    at = lambda days, hour: datetime.combine(d(days), datetime.min.time()) + timedelta(hours=hour)  # noqa: E731
+    local = lambda moment: moment.replace(tzinfo=tz)  # noqa: E731
+    utc = lambda moment: moment.replace(tzinfo=timezone.utc)  # noqa: E731
+    tue = next(k for k in range(1, 8) if d(k).weekday() == 1)  # еженедельная акция по вт и чт
+    lecture = "Лекция «Как подготовиться к донации», вход свободный <для всех>"
+    events = [
+        # весь день, один день
+        ["UID:single", f"DTSTART;VALUE=DATE:{ics_date(d(5))}", f"DTEND;VALUE=DATE:{ics_date(d(6))}",
+         "SUMMARY:День донора в Институте Вельтищева"],
+        # весь день, три дня
+        ["UID:week", f"DTSTART;VALUE=DATE:{ics_date(d(9))}", f"DTEND;VALUE=DATE:{ics_date(d(12))}",
+         "SUMMARY:Большая неделя донора в РНИМУ им. Пирогова"],
+        # по времени, свёрнутая строка и экранирование
+        ["UID:timed", f"DTSTART;TZID=Europe/Moscow:{ics_time(at(2, 10))}", f"DTEND;TZID=Europe/Moscow:{ics_time(at(2, 14))}",
+         "SUMMARY:Лекция «Как подготовиться к донации»\\, вход свободны", " й <для всех>",
+         "LOCATION:ул. Островитянова\\, 1"],
+        # ежегодный праздник, начался три года назад
+        ["UID:yearly", f"DTSTART;VALUE=DATE:{ics_date(d(20).replace(year=d(20).year - 3))}",
+         "RRULE:FREQ=YEARLY", "SUMMARY:День трансфузиолога"],
+        # вт и чт, 6 раз; первое вхождение исключено, третье перенесено
+        ["UID:weekly", f"DTSTART:{ics_time(at(tue, 9))}Z", "DURATION:PT2H", "RRULE:FREQ=WEEKLY;BYDAY=TU,TH;COUNT=6",
+         f"EXDATE:{ics_time(at(tue, 9))}Z", "SUMMARY:Выездная акция"],
+        ["UID:weekly", f"RECURRENCE-ID:{ics_time(at(tue + 7, 9))}Z", f"DTSTART:{ics_time(at(tue + 7, 11))}Z",
+         "DURATION:PT2H", "SUMMARY:Выездная акция (перенесена)"],
+        # уже идёт: вчера – завтра
+        ["UID:ongoing", f"DTSTART;VALUE=DATE:{ics_date(d(-1))}", f"DTEND;VALUE=DATE:{ics_date(d(2))}",
+         "SUMMARY:Донорский марафон"],
+        ["UID:past", f"DTSTART;VALUE=DATE:{ics_date(d(-10))}", "SUMMARY:Прошедшее"],
+        ["UID:cancelled", f"DTSTART;VALUE=DATE:{ics_date(d(3))}", "STATUS:CANCELLED", "SUMMARY:Отменённое"],
+        ["UID:far", f"DTSTART;VALUE=DATE:{ics_date(d(200))}", "SUMMARY:Слишком далеко"],
+        # с напоминанием: VALARM не должен сбивать разбор
+        ["UID:alarm", f"DTSTART;VALUE=DATE:{ics_date(d(30))}", "SUMMARY:С напоминанием",
+         "BEGIN:VALARM", "ACTION:DISPLAY", "DESCRIPTION:Напоминание", "END:VALARM"],
+    ]
+    expected = [
+        (local(at(-1, 0)), "Донорский марафон"), (local(at(2, 10)), lecture),
+        (local(at(5, 0)), "День донора в Институте Вельтищева"),
+        (local(at(9, 0)), "Большая неделя донора в РНИМУ им. Пирогова"),
+        (local(at(20, 0)), "День трансфузиолога"), (local(at(30, 0)), "С напоминанием"),
+        (utc(at(tue + 7, 11)), "Выездная акция (перенесена)"),
+    ] + [(utc(at(tue + k, 9)), "Выездная акция") for k in (2, 9, 14, 16)]
+    lines = ["BEGIN:VCALENDAR", "VERSION:2.0", "PRODID:-//Google Inc//Google Calendar 70.9054//EN",
+             "X-WR-TIMEZONE:Europe/Moscow"]
+    for props in events:
+        lines += ["BEGIN:VEVENT", *props, "END:VEVENT"]
+    lines.append("END:VCALENDAR")
+    return "\r\n".join(lines) + "\r\n", [summary for _, summary in sorted(expected)]
+
+
+def big_calendar(today, count: int) -> str:
+    lines = ["BEGIN:VCALENDAR", "VERSION:2.0", "X-WR-TIMEZONE:Europe/Moscow"]
+    for i in range(count):
+        day = today + timedelta(days=i % 2000 - 1500)
+        lines += ["BEGIN:VEVENT", f"UID:big-{i}", f"DTSTART;VALUE=DATE:{ics_date(day)}",
+                  f"SUMMARY:Событие {i}", "DESCRIPTION:" + "Описание события. " * 10, "END:VEVENT"]
+    lines.append("END:VCALENDAR")
+    return "\r\n".join(lines) + "\r\n"
+
+
+class IcsHandler(tornado.web.RequestHandler):
+    def initialize(self, server):
+        self.server = server
+
+    async def get(self):
+        server = self.server
+        server.requests += 1
+        etag = f'"{server.version}"'
+        if self.request.headers.get("If-None-Match") == etag:
+            server.not_modified += 1
+            self.set_status(304)
+            return
+        self.set_header("Content-Type", "text/calendar; charset=UTF-8")
+        self.set_header("ETag", etag)
+        self.set_header("Last-Modified", "Mon, 01 Sep 2025 00:00:00 GMT")
+        body = server.body.encode()
+        # Медленная отдача кусками, как большой календарь по плохой сети
+        step = max(1, len(body) // server.chunks)
+        for i in range(0, len(body), step):
+            self.write(body[i:i + step])
+            await self.flush()
+            if server.chunk_delay:
+                await asyncio.sleep(server.chunk_delay)
+
+
+class IcsServer:
+    def __init__(self, body: str):
+        self.body = body
+        self.version = 1
+        self.requests = 0
+        self.not_modified = 0
+        self.chunks = 1
+        self.chunk_delay = 0.0
+        self.url = None
+
+    def start_in_thread(self):
+        ready = threading.Event()
+
+        def run():
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            sockets = bind_sockets(0, "127.0.0.1")
+            HTTPServer(tornado.web.Application([(r"/basic.ics", IcsHandler, {"server": self})])).add_sockets(sockets)
+            self.url = f"http://127.0.0.1:{sockets[0].getsockname()[1]}/basic.ics"
+            ready.set()
+            loop.run_forever()
+
+        threading.Thread(target=run, name="ics-server", daemon=True).start()
+        ready.wait()
+
+    def update(self, body: str):
+        self.body = body
+        self.version += 1
+
+
+async def run(args):
+    from events import WEEKDAYS, EventsFeed
+
+    failures = []
+
+    def check(condition, message):
+        print(("ok    " if condition else "FAIL  ") + message)
+        if not condition:
+            failures.append(message)
+
+    probe = EventsFeed(url="", horizon_days=90, limit=50)
+    today = datetime.now(probe.tz).date()
+    calendar, expected = build_calendar(today, probe.tz)
+    server = IcsServer(calendar)
+    server.start_in_thread()
+
+    feed = EventsFeed(url=server.url, horizon_days=90, limit=50, cache_ttl=60)
+    check(feed.answer() is None, "до загрузки answer() отдаёт None (ответ из content.json)")
+    check(await feed.refresh(), "первая загрузка разобрана")
+    summaries = [e.summary for e in feed.upcoming()]
+    check(summaries == expected, f"события и порядок: {summaries}")
+    text = feed.answer().chunks[0]
+    week = f"({WEEKDAYS[(today + timedelta(days=9)).weekday()]}–{WEEKDAYS[(today + timedelta(days=11)).weekday()]})"
+    check(week in text and "&lt;для всех&gt;" in text and "(ул. Островитянова, 1)" in text and ", 10:00–14:00" in text,
+          "текст ответа: диапазон дат, время, место, экранирование HTML")
+    check(feed.answer() is feed.answer(), "ответ кэшируется на EVENTS_CACHE_TTL")
+
+    check(not await feed.refresh() and server.not_modified == 1, "неизменённый календарь: 304, без разбора")
+    server.update(calendar.replace("Донорский марафон", "Донорский марафон 2.0"))
+    check(await feed.refresh() and feed.upcoming()[0].summary == "Донорский марафон 2.0", "изменённый календарь подменяет индекс")
+
+    # Медленная загрузка: обработчики получают прежний ответ без ожидания
+    server.update(calendar)
+    server.chunks, server.chunk_delay = 20, 0.05
+    feed.cache_ttl = 0
+    before = feed.answer()
+    refresh = asyncio.create_task(feed.refresh())
+    worst, calls = 0.0, 0
+    while not refresh.done():
+        started = time.perf_counter()
+        answer = feed.answer()
+        worst = max(worst, time.perf_counter() - started)
+        calls += 1
+        await asyncio.sleep(0.005)
+    await refresh
+    check(answer.chunks == before.chunks and worst < 0.05,
+          f"во время медленной загрузки answer() вызван {calls} раз, худший {worst * 1000:.2f}ms, ответ прежний")
+
+    # Локальный файл: сравнение по времени изменения
+    path = os.path.join(tempfile.mkdtemp(prefix="donorsbot-events-"), "basic.ics")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(calendar)
+    local = EventsFeed(url=path, horizon_days=90, limit=50)
+    check(await local.refresh() and [e.summary for e in local.upcoming()] == expected, "локальный файл разобран")
+    check(not await local.refresh(), "неизменённый файл не разбирается заново")
+    await feed.stop()
+
+    if args.big:
+        body = big_calendar(today, args.big)
+        started = time.perf_counter()
+        server.update(body)
+        server.chunks, server.chunk_delay = 1, 0
+        big = EventsFeed(url=server.url, horizon_days=90)
+        await big.refresh()
+        elapsed = time.perf_counter() - started
+        print(f"big calendar: {args.big} events, {len(body) / 1e6:.1f} MB parsed in {elapsed:.2f}s, "
+              f"{len(big.events)} kept in the window")
+        await big.stop()
+
+    if failures:
+        print(f"FAILED: {len(failures)} checks")
+        raise SystemExit(1)
+    print("OK")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--big", type=int, default=0, help="событий в большом календаре для замера разбора")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
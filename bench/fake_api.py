@@ -0,0 +1,239 @@
+"""Локальный сервер-заглушка Bot API для офлайн-тестов через настоящий HTTP.
+
+В отличие от bench.stubs.StubRequest, запросы проходят весь путь PTB и
+HTTPX — пул соединений, keep-alive, сериализацию. Бот направляется сюда
+через BOT_API_URL (см. bot_api.py).
+
+Сервер реализует методы, которыми пользуется бот (getMe, sendMessage,
+sendPhoto, editMessageText, setWebhook, deleteWebhook, getUpdates; прочие
+отвечают True), записывает каждый вызов, умеет отвечать с задержкой,
+случайными 429 Too Many Requests и 403 от «заблокировавших» бота, а обновления отдаёт так же, как Telegram:
+POST на адрес вебхука или через long polling getUpdates.
+"""
+import asyncio
+import json
+import random
+import threading
+import time
+from collections import deque
+from typing import Dict, List, NamedTuple, Optional
+
+import tornado.web
+from tornado.httpclient import AsyncHTTPClient, HTTPClientError, HTTPRequest
+from tornado.httpserver import HTTPServer
+from tornado.netutil import bind_sockets
+
+from bench.stubs import BOT_USER
+
+# Методы, которые Telegram ограничивает по частоте; остальные 429 не получают
+LIMITED_METHODS = frozenset({"sendMessage", "sendPhoto", "editMessageText"})
+
+
+class Call(NamedTuple):
+    method: str
+    params: dict
+    at: float  # time.monotonic() при получении
+    status: int  # HTTP-статус ответа
+
+
+class MethodHandler(tornado.web.RequestHandler):
+    def initialize(self, api: "FakeBotApi"):
+        self.api = api
+
+    async def post(self, token: str, method: str):
+        params = {k: v[-1].decode() for k, v in self.request.body_arguments.items()}
+        if self.request.headers.get("Content-Type", "").startswith("application/json") and self.request.body:
+            params.update(json.loads(self.request.body))
+        status, payload = await self.api.respond(method, params)
+        self.set_status(status)
+        self.set_header("Content-Type", "application/json")
+        self.write(json.dumps(payload))
+
+    get = post
+
+    def log_exception(self, typ, value, tb):
+        pass
+
+
+class FakeBotApi:
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, flood_rate: float = 0.0,
+                 retry_after: int = 1, seed: int = 1, blocked_chats=()):
+        self.latency = latency  # секунды на каждый вызов, как сетевой RTT до Telegram
+        self.jitter = jitter  # плюс случайно до jitter секунд
+        self.flood_rate = flood_rate  # доля ответов 429 на методы отправки
+        self.retry_after = retry_after
+        self.blocked_chats = set(blocked_chats)  # пользователи, заблокировавшие бота: 403
+        self.rng = random.Random(seed)
+        self.calls: Dict[str, int] = {}
+        self.log: List[Call] = []
+        self.floods = 0
+        self.webhook_url: Optional[str] = None
+        self._message_id = 0
+        self._update_id = 0
+        self._pending: deque = deque()  # обновления для getUpdates
+        self._new_updates: Optional[asyncio.Event] = None
+        self._chat_waiters: Dict[int, List[asyncio.Future]] = {}
+        self._server = None
+        self._loop = None
+        self.url = None
+
+    # ── Ответы на методы
+
+    def _message(self, params, **extra):
+        self._message_id += 1
+        chat_id = int(params.get("chat_id", 0))
+        message = {
+            "message_id": self._message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private" if chat_id > 0 else "supergroup"},
+            "from": BOT_USER,
+        }
+        message.update(extra)
+        return message
+
+    def _notify_chat(self, chat_id: int, message: dict):
+        for waiter in self._chat_waiters.pop(chat_id, ()):
+            if not waiter.done():
+                waiter.set_result(message)
+
+    async def respond(self, method: str, params: dict):
+        """(HTTP status, JSON body) for one Bot API call"""
+        self.calls[method] = self.calls.get(method, 0) + 1
+        received = time.monotonic()
+        status, payload = await self._respond(method, params)
+        self.log.append(Call(method, params, received, status))
+        return status, payload
+
+    async def _respond(self, method: str, params: dict):
+        delay = self.latency + (self.rng.random() * self.jitter if self.jitter else 0)
+        if delay and method != "getUpdates":
+            await asyncio.sleep(delay)
+        if method in LIMITED_METHODS and self.flood_rate and self.rng.random() < self.flood_rate:
+            self.floods += 1
+            return 429, {
+                "ok": False, "error_code": 429,
+                "description": f"Too Many Requests: retry after {self.retry_after}",
+                "parameters": {"retry_after": self.retry_after},
+            }
+        if method in LIMITED_METHODS and int(params.get("chat_id", 0)) in self.blocked_chats:
+            return 403, {"ok": False, "error_code": 403, "description": "Forbidden: bot was blocked by the user"}
+        if method == "getUpdates":
+            return 200, {"ok": True, "result": await self._get_updates(params)}
+        return 200, {"ok": True, "result": self.handle(method, params)}
+
+    def handle(self, method: str, params: dict):
+        if method == "getMe":
+            return BOT_USER
+        if method == "sendMessage":
+            message = self._message(params, text=params.get("text", ""))
+            self._notify_chat(message["chat"]["id"], message)
+            return message
+        if method == "sendPhoto":
+            size = {"file_id": "FAKE-PHOTO", "file_unique_id": "fake", "width": 800, "height": 600}
+            message = self._message(params, photo=[size], caption=params.get("caption"))
+            self._notify_chat(message["chat"]["id"], message)
+            return message
+        if method == "editMessageText":
+            message = self._message(params, text=params.get("text", ""))
+            message["message_id"] = int(params.get("message_id", 0))
+            self._notify_chat(message["chat"]["id"], message)
+            return message
+        if method == "setWebhook":
+            self.webhook_url = params.get("url")
+        elif method == "deleteWebhook":
+            self.webhook_url = None
+        return True
+
+    async def _get_updates(self, params: dict) -> list:
+        if self.webhook_url:
+            return []  # как у Telegram: при вебхуке getUpdates не работает
+        offset = int(params.get("offset") or 0)
+        while self._pending and self._pending[0]["update_id"] < offset:
+            self._pending.popleft()  # подтверждены ботом
+        if not self._pending:
+            self._new_updates.clear()
+            try:
+                await asyncio.wait_for(self._new_updates.wait(), float(params.get("timeout") or 0))
+            except asyncio.TimeoutError:
+                pass
+        limit = int(params.get("limit") or 100)
+        return [u for u, _ in zip(self._pending, range(limit))]
+
+    # ── Обновления от «пользователей»
+
+    def _assign_id(self, update: dict) -> dict:
+        if "update_id" not in update:
+            self._update_id += 1
+            update = {**update, "update_id": self._update_id}
+        return update
+
+    async def push_update(self, update: dict) -> int:
+        """Deliver an update like Telegram: POST to the webhook, else queue for getUpdates"""
+        update = self._assign_id(update)
+        if self.webhook_url is None:
+            self._pending.append(update)
+            self._new_updates.set()
+            return 200
+        request = HTTPRequest(
+            self.webhook_url, method="POST", body=json.dumps(update),
+            headers={"Content-Type": "application/json"}, request_timeout=60,
+        )
+        try:
+            response = await AsyncHTTPClient().fetch(request)
+        except HTTPClientError as e:
+            return e.code
+        return response.code
+
+    def expect_message(self, chat_id: int) -> asyncio.Future:
+        """Future of the next message the bot sends (or edits) in chat_id; call before pushing"""
+        waiter = asyncio.get_running_loop().create_future()
+        self._chat_waiters.setdefault(chat_id, []).append(waiter)
+        return waiter
+
+    # ── Запуск
+
+    def make_app(self) -> tornado.web.Application:
+        return tornado.web.Application([
+            (r"/bot(?P<token>[^/]+)/(?P<method>\w+)", MethodHandler, {"api": self}),
+        ])
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0):
+        """Listen in the running event loop; port 0 picks a free port"""
+        self._new_updates = asyncio.Event()
+        # По умолчанию tornado держит не больше 10 одновременных запросов к вебхуку
+        AsyncHTTPClient.configure(None, max_clients=1000)
+        sockets = bind_sockets(port, host)
+        self._server = HTTPServer(self.make_app())
+        self._server.add_sockets(sockets)
+        self.url = f"http://{host}:{sockets[0].getsockname()[1]}"
+
+    def start_in_thread(self, **kwargs):
+        """Run the server on its own event loop, so it does not share CPU time with the client"""
+        ready = threading.Event()
+
+        def run():
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            loop.run_until_complete(self.start(**kwargs))
+            self._loop = loop
+            ready.set()
+            loop.run_forever()
+
+        threading.Thread(target=run, name="fake-bot-api", daemon=True).start()
+        ready.wait()
+
+    async def run_in_server_loop(self, coro):
+        """Await a coroutine (e.g. a traffic driver) on the server's own loop"""
+        if self._loop is None:
+            return await coro
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, self._loop))
+
+    def stop(self):
+        if self._server is None:
+            return
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._server.stop)
+            self._loop.call_soon_threadsafe(self._loop.stop)
+        else:
+            self._server.stop()
+        self._server = None
@@ -0,0 +1,122 @@
+"""Нагрузочный тест обработчиков бота без сети.
+
+    python -m bench.handlers --users 10000 --taps 6 --concurrency 50
+
+Синтетические Update прогоняются через настоящий Application с
+зарегистрированными start/handle_message, Bot API отвечает заглушка
+(bench.stubs.StubRequest). Выводит p50/p99 задержки обработчика,
+пропускную способность, RSS и рост задержки по мере заполнения хранилища
+сессий.
+"""
+import argparse
+import asyncio
+import logging
+import random
+import resource
+import time
+
+from bench.stubs import BENCH_TOKEN, StubRequest, configure_env, make_update, navigation_session
+
+
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def percentile(sorted_values, q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def summarize(latencies):
+    values = sorted(latencies)
+    return {
+        "p50": percentile(values, 0.50) * 1000,
+        "p90": percentile(values, 0.90) * 1000,
+        "p99": percentile(values, 0.99) * 1000,
+        "max": (values[-1] if values else 0) * 1000,
+    }
+
+
+async def run(users: int, taps: int, concurrency: int, seed: int, phases: int = 10):
+    import main
+    from telegram import Update
+    from telegram.ext import Application
+
+    logging.disable(logging.WARNING)
+    request = StubRequest()
+    app = (
+        Application.builder().token(BENCH_TOKEN)
+        .request(request).get_updates_request(StubRequest())
+        .updater(None).build()
+    )
+    main.register_handlers(app)
+    await app.initialize()
+    await main.sender.start(app.bot)
+    await main.manager_forwarder.start()
+
+    menu = main.content.current.menu
+    rng = random.Random(seed)
+    phase_size = max(1, users // phases)
+    phase_latencies = [[] for _ in range(phases + 1)]
+    update_id = 0
+    semaphore = asyncio.Semaphore(concurrency)
+    rss_before = rss_mb()
+
+    async def session(user_index: int):
+        nonlocal update_id
+        user_id = 1_000_000 + user_index
+        bucket = phase_latencies[min(user_index // phase_size, phases)]
+        async with semaphore:
+            for text in navigation_session(menu, main.BACK_BUTTON, rng, taps):
+                update_id += 1
+                update = Update.de_json(make_update(update_id, user_id, text), app.bot)
+                started = time.perf_counter()
+                await app.process_update(update)
+                bucket.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    batch = concurrency * 4
+    for first in range(0, users, batch):
+        await asyncio.gather(*(session(i) for i in range(first, min(users, first + batch))))
+    elapsed = time.perf_counter() - started
+
+    await main.manager_forwarder.stop()
+    await main.sender.stop()
+    await app.shutdown()
+
+    all_latencies = [x for phase in phase_latencies for x in phase]
+    stats = summarize(all_latencies)
+    print(f"users={users} taps/user={taps + 1} concurrency={concurrency}")
+    print(f"updates={len(all_latencies)} elapsed={elapsed:.2f}s throughput={len(all_latencies) / elapsed:.0f} upd/s")
+    print("handler latency ms: " + " ".join(f"{k}={v:.3f}" for k, v in stats.items()))
+    print(f"sessions={len(main.user_navigation)} rss={rss_mb():.1f}MB (before run {rss_before:.1f}MB)")
+    print("bot api calls: " + " ".join(f"{k}={v}" for k, v in sorted(request.calls.items())))
+    print("latency by share of users seen (p50 / p99 ms):")
+    for i, phase in enumerate(phase_latencies):
+        if phase:
+            s = summarize(phase)
+            print(f"  {min(100, (i + 1) * 100 // phases):>3}%  {s['p50']:.3f} / {s['p99']:.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--taps", type=int, default=6, help="нажатий на пользователя после /start")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    configure_env(args.users)
+    asyncio.run(run(args.users, args.taps, args.concurrency, args.seed))
+
+
+if __name__ == "__main__":
+    main()
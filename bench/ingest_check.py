@@ -0,0 +1,81 @@
+"""Проверка журнала принятых обновлений (ingest.py) без сети.
+
+    python -m bench.ingest_check --users 50 --updates 2000
+
+Принимает поток обновлений с повторами (как при ретраях Telegram),
+останавливает приём посреди обработки, запускает заново на том же журнале и
+проверяет, что каждое обновление обработано ровно один раз и по порядку в
+пределах пользователя.
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+from bench.stubs import make_update
+
+
+async def run(users: int, updates: int, seed: int):
+    from ingest import UpdateIngest
+
+    path = os.path.join(tempfile.mkdtemp(prefix="donorsbot-ingest-"), "updates.db")
+    rng = random.Random(seed)
+    stream = [make_update(i, 1000 + rng.randrange(users), "Акции") for i in range(1, updates + 1)]
+    processed = []
+
+    async def process(data):
+        await asyncio.sleep(rng.random() / 100)
+        processed.append((data["message"]["from"]["id"], data["update_id"]))
+
+    # Первый запуск: принимаем всё (часть дважды) и останавливаемся, не дождавшись конца
+    ingest = UpdateIngest(process, path=path, concurrency=8)
+    await ingest.start()
+    started = time.perf_counter()
+    for data in stream:
+        await ingest.accept(data)
+        if rng.random() < 0.1:
+            await ingest.accept(data)  # повторная доставка
+    accept_time = time.perf_counter() - started
+    duplicates = ingest.duplicates
+    await ingest.stop(timeout=0.05)
+    first_run = len(processed)
+
+    # Второй запуск: журнал дорабатывается, повторы после рестарта тоже отбрасываются
+    ingest = UpdateIngest(process, path=path, concurrency=8)
+    await ingest.start()
+    for data in stream[:100]:
+        await ingest.accept(data)
+    await ingest.stop()
+    duplicates += ingest.duplicates
+
+    failures = []
+    ids = [update_id for _, update_id in processed]
+    if sorted(ids) != list(range(1, updates + 1)):
+        failures.append(f"processed {len(ids)} updates, {len(set(ids))} distinct, expected {updates}")
+    by_user = {}
+    for user, update_id in processed:
+        by_user.setdefault(user, []).append(update_id)
+    for user, user_ids in by_user.items():
+        if user_ids != sorted(user_ids):
+            failures.append(f"user {user}: updates processed out of order")
+
+    print(f"accepted:    {updates} updates in {accept_time:.2f}s ({updates / accept_time:.0f}/s, fsync per update)")
+    print(f"duplicates:  {duplicates} dropped")
+    print(f"processed:   {first_run} before the restart, {len(processed) - first_run} after")
+    if failures:
+        print(f"FAILED: {len(failures)} problems")
+        for line in failures[:20]:
+            print(f"  {line}")
+        raise SystemExit(1)
+    print("OK: every update processed exactly once, in order per user")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--updates", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    asyncio.run(run(args.users, args.updates, args.seed))
@@ -0,0 +1,75 @@
+"""Пропускная способность вызовов Bot API в зависимости от размера пула HTTPX.
+
+    python -m bench.pool_size --calls 3000 --concurrency 128 --latency 0.05 --pools 4,16,64,128
+
+Бот ходит по настоящему HTTP в локальный сервер-заглушку (bench.fake_api),
+отвечающий с задержкой --latency, как Telegram по сети. Для каждого размера
+пула (bot_api.make_request) отправляется --calls сообщений --concurrency
+параллельными задачами — примерно как воркеры sender.py при всплеске.
+"""
+import argparse
+import asyncio
+import time
+
+from bench.handlers import percentile
+from bench.fake_api import FakeBotApi
+from bench.stubs import BENCH_TOKEN
+
+
+async def measure(url: str, pool_size: int, calls: int, concurrency: int, http2: bool):
+    import bot_api
+    from telegram import Bot
+    from telegram.error import TimedOut
+
+    bot = Bot(
+        BENCH_TOKEN, base_url=f"{url}/bot",
+        request=bot_api.make_request(pool_size, keepalive=pool_size, http2=http2),
+    )
+    await bot.initialize()
+    latencies, timeouts = [], 0
+    remaining = iter(range(calls))
+
+    async def worker():
+        nonlocal timeouts
+        for i in remaining:
+            started = time.perf_counter()
+            try:
+                await bot.send_message(chat_id=1000 + i % 500, text="Питание перед донацией")
+            except TimedOut:
+                timeouts += 1  # Pool timeout: соединение не освободилось за BOT_API_POOL_TIMEOUT
+                continue
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    await bot.shutdown()
+    latencies.sort()
+    return len(latencies) / elapsed, percentile(latencies, 0.5) * 1000, percentile(latencies, 0.99) * 1000, timeouts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=3000)
+    parser.add_argument("--concurrency", type=int, default=128)
+    parser.add_argument("--latency", type=float, default=0.05, help="задержка ответа сервера, с")
+    parser.add_argument("--pools", default="4,16,64,128")
+    parser.add_argument("--http2", action="store_true", help="нужен пакет h2 (и сервер с HTTP/2)")
+    args = parser.parse_args()
+
+    api = FakeBotApi(latency=args.latency)
+    api.start_in_thread()
+    print(f"calls={args.calls} concurrency={args.concurrency} server latency={args.latency * 1000:.0f}ms")
+    print(f"{'pool':>6} {'calls/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'pool timeouts':>14}")
+    try:
+        for pool_size in (int(p) for p in args.pools.split(",")):
+            rate, p50, p99, timeouts = asyncio.run(
+                measure(api.url, pool_size, args.calls, args.concurrency, args.http2)
+            )
+            print(f"{pool_size:>6} {rate:>9.0f} {p50:>8.1f} {p99:>8.1f} {timeouts:>14}")
+    finally:
+        api.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""Ответы менеджеров пользователям через тикеты (tickets.py).
+
+    python -m bench.relay_check
+    python -m bench.relay_check --tickets 200000   # плюс скорость поиска в большом хранилище
+
+Вопросы задаются через настоящие обработчики (Bot API — заглушка
+bench.stubs.StubRequest) и уходят дайджестом; затем «менеджер» отвечает в
+группе реплаями: с номером «#N», с цитатой, без уточнения при нескольких
+вопросах, на дайджест из одного вопроса и фото. Потом хранилище открывается
+заново — как после рестарта или в другом воркере — и ответ идёт уже через
+него. Проверяются адресаты, счётчик открытых тикетов, /tickets и TTL.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import statistics
+import time
+
+from bench.stubs import BENCH_TOKEN, StubRequest, configure_env, make_update
+
+MANAGER = {"id": 777, "is_bot": False, "first_name": "Менеджер"}
+
+
+class RecordingRequest(StubRequest):
+    """StubRequest that also keeps (method, parameters, result) of every call"""
+
+    def __init__(self):
+        super().__init__()
+        self.log = []
+
+    async def do_request(self, url, method, request_data=None, **kwargs):
+        status, body = await super().do_request(url, method, request_data, **kwargs)
+        params = request_data.parameters if request_data is not None else {}
+        self.log.append((url.rsplit("/", 1)[-1], params, json.loads(body)["result"]))
+        return status, body
+
+    def sent_to(self, chat_id: int, since: int = 0):
+        return [(method, params) for method, params, _ in self.log[since:]
+                if int(params.get("chat_id", 0)) == chat_id]
+
+
+def manager_reply(update_id: int, group: int, digest: dict, text: str = None, quote: dict = None,
+                  photo: bool = False) -> dict:
+    message = {
+        "message_id": 100_000 + update_id,
+        "date": int(time.time()),
+        "chat": {"id": group, "type": "supergroup", "title": "Менеджеры"},
+        "from": MANAGER,
+        "reply_to_message": digest,
+    }
+    if photo:
+        message["photo"] = [{"file_id": "MANAGER-PHOTO", "file_unique_id": "m", "width": 10, "height": 10}]
+    else:
+        message["text"] = text
+    if quote:
+        message["quote"] = quote
+    return {"update_id": update_id, "message": message}
+
+
+async def run(args):
+    import main
+    from telegram import Update
+    from telegram.ext import Application
+    from tickets import SQLiteTicketBackend, Ticket, TicketStore
+
+    logging.disable(logging.WARNING)
+    request = RecordingRequest()
+    app = (
+        Application.builder().token(BENCH_TOKEN)
+        .request(request).get_updates_request(StubRequest())
+        .updater(None).build()
+    )
+    main.register_handlers(app)
+    await app.initialize()
+    await main.sender.start(app.bot)
+    await main.tickets.start()
+    await main.manager_forwarder.start()
+    group = main.MANAGER_GROUP_CHAT_ID
+
+    failures = []
+
+    def check(condition, message):
+        print(("ok    " if condition else "FAIL  ") + message)
+        if not condition:
+            failures.append(message)
+
+    update_id = 0
+
+    async def process(data):
+        nonlocal update_id
+        update_id += 1
+        data["update_id"] = update_id
+        await app.process_update(Update.de_json(data, app.bot))
+
+    async def ask(user_id, text, username=True):
+        for message_text in ("/start", text):
+            data = make_update(0, user_id, message_text)
+            if not username:
+                del data["message"]["from"]["username"]
+            await process(data)
+
+    async def flush_digest() -> dict:
+        since = len(request.log)
+        await main.manager_forwarder.flush()
+        digests = [result for method, params, result in request.log[since:]
+                   if method == "sendMessage" and int(params["chat_id"]) == group]
+        return digests[-1]
+
+    def delivered(user_id, since):
+        return [params.get("text") or method for method, params in request.sent_to(user_id, since)]
+
+    # ── Дайджест из нескольких вопросов; двое без username
+    users = [2001, 2002, 2003, 2004]
+    for i, user_id in enumerate(users):
+        await ask(user_id, f"Вопрос {i + 1}: можно ли 🩸 qzx{i}?", username=i % 2 == 0)
+    digest = await flush_digest()
+    text = digest["text"]
+    check(text.count("Вопрос от") == 4 and "#4 Вопрос от Донор (id 2004)" in text,
+          "дайджест: вопросы пронумерованы, у пользователя без username — имя и id")
+    check(main.tickets.open_count == 4, f"открытых тикетов после дайджеста: {main.tickets.open_count}")
+
+    since = len(request.log)
+    await process(manager_reply(0, group, digest, "#2 Да, можно через месяц"))
+    check(delivered(2002, since) == ["💬 Ответ менеджера на ваш вопрос:\n\nДа, можно через месяц"],
+          "«#2 …» — ответ второму, без номера в тексте")
+
+    # Цитата: позиция в UTF-16, эмодзи в вопросах её сдвигают
+    position = len(text[:text.index("#3")].encode("utf-16-le")) // 2 + 5
+    since = len(request.log)
+    await process(manager_reply(0, group, digest, "Нет", quote={"text": "Вопрос", "position": position}))
+    check(delivered(2003, since) == ["💬 Ответ менеджера на ваш вопрос:\n\nНет"], "ответ с цитатой — третьему")
+
+    since = len(request.log)
+    await process(manager_reply(0, group, digest, "Ответ без номера"))
+    hints = delivered(group, since)
+    check(not any(delivered(u, since) for u in users) and hints and "#2" in hints[0],
+          "без номера и цитаты при нескольких вопросах — подсказка в группе, никому не отправлено")
+
+    since = len(request.log)
+    await process(manager_reply(0, group, digest, photo=True))
+    check(not any(delivered(u, since) for u in users), "фото без номера тоже не угадывается")
+
+    # ── Один вопрос в дайджесте: достаточно реплая; фото копируется
+    await ask(2005, "Нужна справка для работы qzx5", username=False)
+    single = await flush_digest()
+    since = len(request.log)
+    await process(manager_reply(0, group, single, photo=True))
+    check(delivered(2005, since) == ["copyMessage"], "фото в ответ на дайджест из одного вопроса — copyMessage")
+    check(main.tickets.open_count == 2, f"открытых после трёх ответов: {main.tickets.open_count}")
+
+    # ── Рестарт / другой воркер: новое хранилище на том же файле
+    await main.manager_forwarder.stop()
+    await main.tickets.close()
+    main.tickets = other = TicketStore(SQLiteTicketBackend(main.tickets.backend.path))
+    count, oldest = await other.open_tickets()
+    check(count == 2 and [t.user_id for t in oldest] == [2001, 2004], f"после рестарта открыто {count}: #1 и #4")
+    since = len(request.log)
+    await process(manager_reply(0, group, digest, "#4 Ответ после рестарта"))
+    check(delivered(2004, since) == ["💬 Ответ менеджера на ваш вопрос:\n\nОтвет после рестарта"],
+          "ответ после рестарта через другое хранилище")
+
+    since = len(request.log)
+    await process({"message": {
+        "message_id": 999_999, "date": int(time.time()), "from": MANAGER, "text": "/tickets",
+        "chat": {"id": group, "type": "supergroup", "title": "Менеджеры"},
+        "entities": [{"type": "bot_command", "offset": 0, "length": 8}],
+    }})
+    summary = delivered(group, since)
+    check(summary and summary[0].startswith("Открытых вопросов: 1."), f"/tickets: {summary[:1]}")
+
+    # ── TTL: истёкшие не находятся и удаляются
+    expired = TicketStore(other.backend, ttl=-1)
+    expired._opened = True
+    await expired.add_digest(group, 555_555, [{"user_id": 1, "text": "старый"}], [(0, 10)])
+    check(not await other.find(group, 555_555) and await other.backend.prune(time.time()) == 1,
+          "истёкший тикет не находится и удаляется")
+
+    # ── Одновременные запись, поиск, ответы и подсчёт на одном соединении SQLite
+    entries = [{"user_id": 3000 + i, "text": f"вопрос {i}"} for i in range(3)]
+    results = await asyncio.gather(*(
+        op for d in range(50) for op in (
+            other.add_digest(group, 700_000 + d, entries, [(0, 5), (6, 5), (12, 5)]),
+            other.find(group, 700_000 + d - 1),
+            other.open_tickets(),
+        )
+    ), return_exceptions=True)
+    errors = [r for r in results if isinstance(r, Exception)]
+    stored = [len(await other.find(group, 700_000 + d)) for d in range(50)]
+    check(not errors and stored == [3] * 50, f"параллельные операции: ошибок {len(errors)}, "
+                                             f"дайджестов со всеми тикетами {stored.count(3)}/50")
+
+    if args.tickets:
+        await lookup_speed(other, group, args.tickets, Ticket)
+    await other.close()
+    await main.sender.stop()
+    await app.shutdown()
+
+    if failures:
+        print(f"FAILED: {len(failures)} checks")
+        raise SystemExit(1)
+    print("OK")
+
+
+async def lookup_speed(store, group: int, count: int, Ticket):
+    backend = store.backend
+    per_digest = 10
+    now = time.time()
+    digests = count // per_digest
+    for first in range(0, digests, 1000):
+        batch = [
+            Ticket(group, 1_000_000 + d, seq, 10_000 + d, "bench", "вопрос", 0, 10, now)
+            for d in range(first, min(digests, first + 1000)) for seq in range(1, per_digest + 1)
+        ]
+        await backend.add_many(batch, now + 3600)
+    rng = random.Random(1)
+    latencies = []
+    for _ in range(2000):
+        started = time.perf_counter()
+        found = await store.find(group, 1_000_000 + rng.randrange(digests))
+        latencies.append(time.perf_counter() - started)
+        assert len(found) == per_digest
+    latencies.sort()
+    started = time.perf_counter()
+    total, _ = await store.open_tickets()
+    counted = time.perf_counter() - started
+    print(f"lookup in {digests * per_digest} tickets: p50 {statistics.median(latencies) * 1000:.3f}ms "
+          f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.3f}ms; open count {total} in {counted * 1000:.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tickets", type=int, default=0, help="тикетов для замера поиска")
+    args = parser.parse_args()
+    configure_env(1000)
+    os.environ["FORWARD_WINDOW"] = "3600"  # дайджесты только по flush()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Проверка поиска ответов (search.py) на размеченных вопросах.
+
+    python -m bench.search_check
+    python -m bench.search_check --verbose   # лучшие кандидаты для каждого вопроса
+
+Вопросы — такие, как пишут донорам боту свободным текстом: с
+приветствиями, опечатками в регистре и лишними словами. Для каждого указан
+ответ, который бот должен отдать сам, или None — вопрос должен уйти
+менеджерам (общие слова вроде «кровь», вопросы, которых в контенте нет).
+Ошибка — и неверный ответ, и лишняя эскалация.
+"""
+import argparse
+
+# (вопрос, ожидаемый ключ ответа или набор допустимых; None — менеджерам)
+LABELLED = [
+    ("можно ли сдавать кровь после прививки от гриппа", "vaccine"),
+    ("Здравствуйте! Подскажите пожалуйста, можно ли стать донором, если у меня татуировка?", "manipul"),
+    ("сделала пирсинг, через сколько можно сдавать кровь", "manipul"),
+    ("от каких продуктов воздержаться перед донацией", "food_before"),
+    ("нужно ли завтракать в день донации", "food_donation_day"),
+    ("как быстро восстановиться после сдачи крови, что есть", "food_after"),
+    ("по какому адресу проходят донорские акции", "location"),
+    ("как зарегистрироваться в личном кабинете донора", "reg_lk"),
+    ("как записаться на акцию", ("reg", "reg_event")),
+    ("пью антибиотики, когда можно сдавать кровь?", "medicine"),
+    ("низкий гемоглобин, можно ли сдать кровь", "phys"),
+    ("масса тела меньше 50 кг, могу ли я быть донором", "phys"),
+    ("как вступить в регистр доноров костного мозга", "where_join_rdkm"),
+    ("что такое РДКМ", "rdkm_info"),
+    ("что такое kell фактор", "kell_is"),
+    ("у меня kell положительный, могу ли я сдавать цельную кровь", "kell_donation"),
+    ("что нужно знать о донорстве плазмы", "plasma_donation"),
+    ("что нужно знать о сдаче тромбоцитов", "platelets_donation"),
+    ("у меня бронхиальная астма, можно быть донором?", "breathing"),
+    ("псориаз это противопоказание?", "eye"),
+    ("гепатит С в анамнезе, можно сдавать?", ("bloodborne_inf", "relative_contr_rdkm")),
+    ("Добрый день! Где найти донорский календарь?", "calendar"),
+    # Общие слова — ответ угадывать нельзя
+    ("сдать кровь", None),
+    ("донор", None),
+    ("кровь", None),
+    ("здравствуйте", None),
+    ("спасибо большое!", None),
+    ("хочу стать донором", None),
+    # В контенте ответа нет
+    ("мне нужна справка для работы", None),
+    ("сколько платят донорам", None),
+    ("дают ли выходной после донации", None),
+]
+
+
+def evaluate(index, verbose: bool = False):
+    wrong, escalated, missed = [], [], []
+    for query, expected in LABELLED:
+        allowed = {expected} if isinstance(expected, str) else set(expected or ())
+        hit = index.best(query)
+        got = hit.answer_key if hit else None
+        if verbose:
+            candidates = ", ".join(f"{h.answer_key} {h.score:.2f}/{h.confidence:.2f}" for h in index.search(query))
+            print(f"{'ok  ' if (got in allowed if allowed else got is None) else 'FAIL'} {query!r} -> {got} [{candidates}]")
+        if allowed and got in allowed or not allowed and got is None:
+            continue
+        if got is None:
+            escalated.append((query, expected))
+        elif not allowed:
+            wrong.append((query, got))
+        else:
+            missed.append((query, expected, got))
+    return wrong, escalated, missed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    from content import compile_content, read_raw, CONTENT_PATH
+
+    index = compile_content(read_raw(CONTENT_PATH)).search
+    wrong, escalated, missed = evaluate(index, args.verbose)
+    answered = sum(1 for _, e in LABELLED if e)
+    print(f"queries={len(LABELLED)}: answered correctly {answered - len(escalated) - len(missed)}/{answered}, "
+          f"escalated correctly {len(LABELLED) - answered - len(wrong)}/{len(LABELLED) - answered}")
+    for query, got in wrong:
+        print(f"  answered, should escalate: {query!r} -> {got}")
+    for query, expected in escalated:
+        print(f"  escalated, expected {expected}: {query!r}")
+    for query, expected, got in missed:
+        print(f"  wrong answer {got}, expected {expected}: {query!r}")
+    if wrong or escalated or missed:
+        print("FAILED")
+        raise SystemExit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
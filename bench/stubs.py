@@ -0,0 +1,148 @@
+"""Заглушки для офлайн-бенчмарков: Bot API без сети и синтетические Update."""
+import json
+import os
+import random
+import tempfile
+import time
+
+from telegram.request import BaseRequest
+
+BENCH_TOKEN = "123456:BENCH-TOKEN"
+BOT_USER = {"id": 123456, "is_bot": True, "first_name": "DonorsBot", "username": "donors_bench_bot"}
+
+
+def configure_env(users: int):
+    """Снять лимиты и направить файлы бота во временный каталог.
+
+    Вызывать до `import main`: модули читают настройки из окружения при импорте.
+    """
+    tmp = tempfile.mkdtemp(prefix="donorsbot-bench-")
+    unlimited = str(10 ** 9)
+    os.environ.update({
+        "MANAGER_GROUP_CHAT_ID": "-1001",
+        "SEND_GLOBAL_RATE": unlimited,
+        "SEND_CHAT_RATE": unlimited,
+        "SEND_CHAT_BURST": unlimited,
+        "SEND_GROUP_RATE": unlimited,
+        "SEND_GROUP_BURST": unlimited,
+        "SESSION_MAX_USERS": str(max(users, 1)),
+        "CONTENT_RELOAD_INTERVAL": "0",
+        "FORWARD_SPOOL_PATH": os.path.join(tmp, "spool.jsonl"),
+        "FORWARD_DEAD_LETTER_PATH": os.path.join(tmp, "dead_letter.jsonl"),
+        "FILE_ID_CACHE_PATH": os.path.join(tmp, "file_ids.json"),
+        "INGEST_LOG_PATH": os.path.join(tmp, "updates.db"),
+        "BROADCAST_DB_PATH": os.path.join(tmp, "broadcast.db"),
+        "TICKET_STORE_URL": f"sqlite:///{os.path.join(tmp, 'tickets.db')}",
+        "EVENTS_ICS_URL": "",  # без сети: ответ events из content.json
+    })
+    return tmp
+
+
+class StubRequest(BaseRequest):
+    """BaseRequest that answers Bot API calls in-process, without network"""
+
+    def __init__(self):
+        self.calls = {}
+        self._message_id = 0
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    @property
+    def read_timeout(self):
+        return None
+
+    def _message(self, params, **extra):
+        self._message_id += 1
+        chat_id = int(params.get("chat_id", 0))
+        message = {
+            "message_id": self._message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private" if chat_id > 0 else "supergroup"},
+            "from": BOT_USER,
+        }
+        message.update(extra)
+        return message
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None,
+                         write_timeout=None, connect_timeout=None, pool_timeout=None):
+        endpoint = url.rsplit("/", 1)[-1]
+        self.calls[endpoint] = self.calls.get(endpoint, 0) + 1
+        params = request_data.parameters if request_data is not None else {}
+
+        if endpoint == "getMe":
+            result = BOT_USER
+        elif endpoint == "sendMessage":
+            result = self._message(params, text=params.get("text", ""))
+        elif endpoint == "sendPhoto":
+            size = {"file_id": "BENCH-PHOTO", "file_unique_id": "bench", "width": 800, "height": 600}
+            result = self._message(params, photo=[size], caption=params.get("caption"))
+        elif endpoint == "copyMessage":
+            self._message_id += 1
+            result = {"message_id": self._message_id}
+        elif endpoint == "getUpdates":
+            result = []
+        else:
+            result = True
+        return 200, json.dumps({"ok": True, "result": result}).encode()
+
+
+def make_update(update_id: int, user_id: int, text: str) -> dict:
+    """Raw JSON of a private-chat text message update"""
+    entities = [{"type": "bot_command", "offset": 0, "length": len(text)}] if text.startswith("/") else []
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private", "first_name": "Донор"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Донор", "username": f"donor{user_id}"},
+            "text": text,
+            "entities": entities,
+        },
+    }
+
+
+FREE_TEXT = [
+    "можно ли сдавать кровь после прививки",
+    "сколько длится донация плазмы",
+    "где находится пункт сдачи",
+]
+
+
+def navigation_session(menu, back_button, rng: random.Random, taps: int):
+    """Случайная, но правдоподобная сессия: /start и блуждание по дереву меню"""
+    texts = ["/start"]
+    node = menu.root
+    for _ in range(taps):
+        roll = rng.random()
+        if node.parent is not None and roll < 0.2:
+            texts.append(back_button)
+            node = menu.get(node.parent)
+        elif node.parent is None and roll < 0.05:
+            texts.append(rng.choice(FREE_TEXT))
+        else:
+            label, child_id = rng.choice(list(node.children.items()))
+            texts.append(label)
+            child = menu.nodes[child_id]
+            if child.is_menu:
+                node = child
+    return texts
+
+
+def expected_node(menu, back_button, texts) -> int:
+    """Node a navigation session ends in, replayed the way handle_message moves"""
+    node = menu.root
+    for text in texts:
+        if text == "/start":
+            node = menu.root
+        elif text == back_button:
+            node = menu.get(node.parent) if node.parent is not None else menu.root
+        elif text in node.children:
+            child = menu.nodes[node.children[text]]
+            if child.is_menu:
+                node = child
+    return node.id
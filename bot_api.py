@@ -0,0 +1,86 @@
+"""HTTP-клиенты Bot API.
+
+Два отдельных пула HTTPX: общий — для всех исходящих вызовов (sender.py
+держит до SEND_WORKERS запросов одновременно, поэтому пул должен быть не
+меньше), и маленький — только для getUpdates в режиме polling, чтобы долгий
+опрос не занимал соединения ответов. Размер пула, keep-alive, таймауты и
+HTTP/2 настраиваются из окружения; BOT_API_URL позволяет направить бота на
+локальный сервер (см. bench/fake_api.py).
+
+Все клиенты делят один SSL-контекст (ssl_context()): загрузка корневых
+сертификатов стоит десятки миллисекунд на каждый клиент и заметна в
+холодном старте.
+
+HTTP/2 требует пакета h2: pip install "python-telegram-bot[http2]".
+"""
+import functools
+import os
+import ssl
+
+import httpx
+from telegram import Bot
+from telegram.ext import ApplicationBuilder
+from telegram.request import HTTPXRequest
+
+BOT_API_URL = os.getenv("BOT_API_URL", "https://api.telegram.org").rstrip("/")
+BOT_API_POOL_SIZE = int(os.getenv("BOT_API_POOL_SIZE", 64))  # соединений на общий пул
+BOT_API_KEEPALIVE = int(os.getenv("BOT_API_KEEPALIVE", 32))  # сколько из них держать открытыми
+BOT_API_KEEPALIVE_EXPIRY = float(os.getenv("BOT_API_KEEPALIVE_EXPIRY", 60))  # секунды простоя
+BOT_API_HTTP2 = os.getenv("BOT_API_HTTP2", "0") == "1"
+BOT_API_POOL_TIMEOUT = float(os.getenv("BOT_API_POOL_TIMEOUT", 5))  # ожидание свободного соединения
+BOT_API_CONNECT_TIMEOUT = float(os.getenv("BOT_API_CONNECT_TIMEOUT", 5))
+BOT_API_READ_TIMEOUT = float(os.getenv("BOT_API_READ_TIMEOUT", 10))
+BOT_API_WRITE_TIMEOUT = float(os.getenv("BOT_API_WRITE_TIMEOUT", 10))
+BOT_API_MEDIA_WRITE_TIMEOUT = float(os.getenv("BOT_API_MEDIA_WRITE_TIMEOUT", 30))  # загрузка фото
+GET_UPDATES_POOL_SIZE = int(os.getenv("GET_UPDATES_POOL_SIZE", 2))
+
+
+@functools.lru_cache(maxsize=None)
+def ssl_context() -> ssl.SSLContext:
+    """One SSL context per process, shared by every HTTPX client"""
+    return httpx.create_ssl_context()
+
+
+def make_request(pool_size: int = BOT_API_POOL_SIZE, keepalive: int = BOT_API_KEEPALIVE,
+                 http2: bool = BOT_API_HTTP2, pool_timeout: float = BOT_API_POOL_TIMEOUT) -> HTTPXRequest:
+    return HTTPXRequest(
+        connection_pool_size=pool_size,
+        connect_timeout=BOT_API_CONNECT_TIMEOUT,
+        read_timeout=BOT_API_READ_TIMEOUT,
+        write_timeout=BOT_API_WRITE_TIMEOUT,
+        media_write_timeout=BOT_API_MEDIA_WRITE_TIMEOUT,
+        pool_timeout=pool_timeout,
+        http_version="2" if http2 else "1.1",
+        httpx_kwargs={"verify": ssl_context(), "limits": httpx.Limits(
+            max_connections=pool_size,
+            max_keepalive_connections=min(keepalive, pool_size),
+            keepalive_expiry=BOT_API_KEEPALIVE_EXPIRY,
+        )},
+    )
+
+
+def make_updates_request() -> HTTPXRequest:
+    # Один опрос за раз, HTTP/2 ему не нужен
+    return make_request(GET_UPDATES_POOL_SIZE, keepalive=GET_UPDATES_POOL_SIZE, http2=False)
+
+
+def configure_builder(builder: ApplicationBuilder) -> ApplicationBuilder:
+    """Apply the Bot API address and both request pools to an Application builder"""
+    return (
+        builder
+        .base_url(f"{BOT_API_URL}/bot")
+        .base_file_url(f"{BOT_API_URL}/file/bot")
+        .request(make_request())
+        .get_updates_request(make_updates_request())
+    )
+
+
+def make_bot(token: str) -> Bot:
+    """Plain Bot with the same settings, for processes that run no Application"""
+    return Bot(
+        token,
+        base_url=f"{BOT_API_URL}/bot",
+        base_file_url=f"{BOT_API_URL}/file/bot",
+        request=make_request(),
+        get_updates_request=make_updates_request(),
+    )
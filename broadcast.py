@@ -0,0 +1,411 @@
+"""Рассылка объявлений всем пользователям, которых видел бот.
+
+Получатели читаются из хранилища сессий пачками по BROADCAST_CHUNK в порядке
+user_id (keyset-пагинация), отправка идёт через общую очередь sender.py —
+с её лимитами, повторами при 429 и сетевых ошибках. Скорость рассылки
+ограничена BROADCAST_RATE (ниже общего лимита бота, чтобы оставался запас на
+ответы пользователям), а в очереди отправки одновременно не больше
+BROADCAST_WINDOW сообщений рассылки, чтобы ответы не стояли за ней.
+
+Прогресс (курсор по user_id и счётчики) сохраняется в SQLite
+(BROADCAST_DB_PATH); прерванная рестартом рассылка продолжается с курсора,
+повторно получить сообщение могут не больше BROADCAST_WINDOW человек.
+Пользователи, заблокировавшие бота, запоминаются и пропускаются, пока снова
+не нажмут /start.
+
+Файл общий для всех воркеров (cluster.py), как и тикеты: /broadcast_status и
+/broadcast_cancel работают из любого воркера, а разблокировка видна всем.
+Рассылку ведёт один процесс — тот, что держит её аренду (owner, heartbeat
+раз в BROADCAST_LEASE / 6 секунд). Остановленный процесс отдаёт аренду, и
+рассылку сразу подхватывает следующий запуск или другой воркер; аренду
+упавшего забирают через BROADCAST_LEASE секунд. Отмена из другого воркера
+доходит до ведущего при следующем продлении аренды.
+
+«Все пользователи» — это хранилище сессий: с MemorySessionStore (без
+SESSION_STORE_URL) это только те, кто писал боту после последнего рестарта.
+"""
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Deque, Iterable, List, NamedTuple, Optional, Set
+
+from telegram.error import Forbidden, TelegramError
+
+from sender import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+BROADCAST_DB_PATH = os.getenv("BROADCAST_DB_PATH", "broadcast.db")
+BROADCAST_RATE = float(os.getenv("BROADCAST_RATE", 25))  # сообщений в секунду
+BROADCAST_WINDOW = int(os.getenv("BROADCAST_WINDOW", 16))  # незавершённых отправок рассылки подряд
+BROADCAST_CHUNK = int(os.getenv("BROADCAST_CHUNK", 500))  # получателей за одно чтение хранилища
+BROADCAST_CHECKPOINT_INTERVAL = 2.0  # секунды между сохранениями прогресса
+BROADCAST_LEASE = float(os.getenv("BROADCAST_LEASE", 30))  # секунды без heartbeat, после которых рассылку забирают
+# Кроме группы менеджеров, запускать рассылку могут эти пользователи
+BROADCAST_ADMINS = frozenset(int(x) for x in os.getenv("BROADCAST_ADMINS", "").replace(" ", "").split(",") if x)
+
+
+class Broadcast(NamedTuple):
+    id: int
+    text: str
+    parse_mode: Optional[str]
+    status: str  # running | done | cancelled
+    cursor: int  # все user_id <= cursor уже обработаны
+    sent: int
+    failed: int
+    blocked: int
+
+
+class BroadcastState:
+    """SQLite storage of broadcasts and of users who blocked the bot, shared by all workers"""
+
+    def __init__(self, path: str = BROADCAST_DB_PATH):
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()  # одно соединение на все потоки to_thread
+
+    def open(self):
+        # timeout: другие воркеры держат блокировку записи недолго, ждём, а не падаем
+        self._conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS broadcasts ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " text TEXT NOT NULL,"
+            " parse_mode TEXT,"
+            " status TEXT NOT NULL,"
+            " cursor INTEGER NOT NULL DEFAULT 0,"
+            " sent INTEGER NOT NULL DEFAULT 0,"
+            " failed INTEGER NOT NULL DEFAULT 0,"
+            " blocked INTEGER NOT NULL DEFAULT 0,"
+            " created_at REAL NOT NULL,"
+            " finished_at REAL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS blocked_users (user_id INTEGER PRIMARY KEY, blocked_at REAL NOT NULL)"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(broadcasts)")}
+        if "owner" not in columns:  # файл до общих рассылок
+            self._conn.execute("ALTER TABLE broadcasts ADD COLUMN owner TEXT")
+            self._conn.execute("ALTER TABLE broadcasts ADD COLUMN heartbeat REAL")
+        self._conn.commit()
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _row(self, row) -> Optional[Broadcast]:
+        return Broadcast(*row) if row else None
+
+    _COLUMNS = "id, text, parse_mode, status, cursor, sent, failed, blocked"
+
+    def create(self, text: str, parse_mode: Optional[str], owner: str) -> Broadcast:
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO broadcasts (text, parse_mode, status, created_at, owner, heartbeat)"
+                " VALUES (?, ?, 'running', ?, ?, ?)",
+                (text, parse_mode, now, owner, now),
+            )
+            self._conn.commit()
+            return Broadcast(cursor.lastrowid, text, parse_mode, "running", 0, 0, 0, 0)
+
+    def get(self, broadcast_id: int) -> Optional[Broadcast]:
+        with self._lock:
+            return self._row(self._conn.execute(
+                f"SELECT {self._COLUMNS} FROM broadcasts WHERE id = ?", (broadcast_id,)
+            ).fetchone())
+
+    def latest(self) -> Optional[Broadcast]:
+        with self._lock:
+            return self._row(self._conn.execute(
+                f"SELECT {self._COLUMNS} FROM broadcasts ORDER BY id DESC LIMIT 1"
+            ).fetchone())
+
+    def claim(self, owner: str, lease: float) -> List[Broadcast]:
+        """Take over running broadcasts nobody holds: released, or with an expired heartbeat"""
+        now = time.time()
+        claimed = []
+        with self._lock:
+            ids = [broadcast_id for broadcast_id, in self._conn.execute(
+                "SELECT id FROM broadcasts WHERE status = 'running' AND (owner IS NULL OR heartbeat < ?)"
+                " ORDER BY id", (now - lease,),
+            )]
+            for broadcast_id in ids:
+                # Условие повторяется: другой воркер мог забрать рассылку между SELECT и UPDATE
+                cursor = self._conn.execute(
+                    "UPDATE broadcasts SET owner = ?, heartbeat = ? WHERE id = ? AND status = 'running'"
+                    " AND (owner IS NULL OR heartbeat < ?)", (owner, now, broadcast_id, now - lease),
+                )
+                if cursor.rowcount:
+                    claimed.append(broadcast_id)
+            self._conn.commit()
+            rows = [self._conn.execute(f"SELECT {self._COLUMNS} FROM broadcasts WHERE id = ?", (i,)).fetchone()
+                    for i in claimed]
+        return [Broadcast(*row) for row in rows]
+
+    def renew(self, broadcast_ids: List[int], owner: str) -> Set[int]:
+        """Extend the lease; returns the ids that are still running and ours"""
+        if not broadcast_ids:
+            return set()
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE broadcasts SET heartbeat = ? WHERE id = ? AND owner = ? AND status = 'running'",
+                [(time.time(), broadcast_id, owner) for broadcast_id in broadcast_ids],
+            )
+            self._conn.commit()
+            rows = self._conn.execute(
+                f"SELECT id FROM broadcasts WHERE owner = ? AND status = 'running'"
+                f" AND id IN ({','.join('?' * len(broadcast_ids))})", (owner, *broadcast_ids),
+            ).fetchall()
+        return {broadcast_id for broadcast_id, in rows}
+
+    def release(self, broadcast_ids: List[int], owner: str):
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE broadcasts SET owner = NULL WHERE id = ? AND owner = ?",
+                [(broadcast_id, owner) for broadcast_id in broadcast_ids],
+            )
+            self._conn.commit()
+
+    def checkpoint(self, broadcast_id: int, owner: str, cursor: int, sent: int, failed: int, blocked: int,
+                   status: str = "running"):
+        """Save progress of a broadcast we hold; a cancelled one keeps its status"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE broadcasts SET cursor = ?, sent = ?, failed = ?, blocked = ?, heartbeat = ?,"
+                " status = CASE WHEN status = 'running' THEN ? ELSE status END,"
+                " finished_at = CASE WHEN status = 'running' AND ? != 'running' THEN ? ELSE finished_at END"
+                " WHERE id = ? AND owner = ?",
+                (cursor, sent, failed, blocked, time.time(), status, status, time.time(), broadcast_id, owner),
+            )
+            self._conn.commit()
+
+    def cancel(self, broadcast_id: int) -> bool:
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE broadcasts SET status = 'cancelled', finished_at = ? WHERE id = ? AND status = 'running'",
+                (time.time(), broadcast_id),
+            )
+            self._conn.commit()
+            return cursor.rowcount > 0
+
+    def add_blocked(self, user_ids: Iterable[int]):
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO blocked_users (user_id, blocked_at) VALUES (?, ?)",
+                [(u, now) for u in user_ids],
+            )
+            self._conn.commit()
+
+    def remove_blocked(self, user_id: int) -> bool:
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM blocked_users WHERE user_id = ?", (user_id,))
+            self._conn.commit()
+            return cursor.rowcount > 0
+
+    def blocked_ids(self) -> Set[int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT user_id FROM blocked_users").fetchall()
+        return {user_id for user_id, in rows}
+
+    def blocked_among(self, user_ids: List[int]) -> Set[int]:
+        if not user_ids:
+            return set()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT user_id FROM blocked_users WHERE user_id BETWEEN ? AND ?", (user_ids[0], user_ids[-1])
+            ).fetchall()
+        return {user_id for user_id, in rows}
+
+
+class Broadcaster:
+    def __init__(self, sessions, sender, path: str = BROADCAST_DB_PATH, rate: float = BROADCAST_RATE,
+                 window: int = BROADCAST_WINDOW, chunk: int = BROADCAST_CHUNK, lease: float = BROADCAST_LEASE):
+        self.sessions = sessions
+        self.sender = sender
+        self.state = BroadcastState(path)
+        self.rate = rate
+        self.window = window
+        self.chunk = chunk
+        self.lease = lease
+        self.owner = f"{os.getpid()}:{id(self):x}"  # владелец аренды рассылок
+        self._tasks = {}
+        self._watch_task = None
+        self._opened = False
+        # Копия blocked_users: /start пишет в общий файл, только если пользователь в ней
+        self._blocked: Set[int] = set()
+
+    async def start(self):
+        """Open the state and resume broadcasts interrupted by a restart"""
+        await asyncio.to_thread(self.state.open)
+        self._opened = True
+        self._blocked = await asyncio.to_thread(self.state.blocked_ids)
+        await self._claim()
+        self._watch_task = asyncio.create_task(self._watch())
+
+    async def stop(self):
+        if self._watch_task is not None:
+            self._watch_task.cancel()
+            await asyncio.gather(self._watch_task, return_exceptions=True)
+            self._watch_task = None
+        # Прогресс сохраняется при отмене; аренду отдаём, чтобы рассылку сразу
+        # продолжил следующий запуск или другой воркер
+        held = list(self._tasks)
+        for task in self._tasks.values():
+            task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        self._tasks = {}
+        if self._opened:
+            await asyncio.to_thread(self.state.release, held, self.owner)
+            await asyncio.to_thread(self.state.close)
+            self._opened = False
+
+    async def _claim(self):
+        for broadcast in await asyncio.to_thread(self.state.claim, self.owner, self.lease):
+            logger.info(f"Resuming broadcast {broadcast.id} after user_id {broadcast.cursor}")
+            self._launch(broadcast)
+
+    async def _watch(self):
+        """Renew our leases, stop broadcasts cancelled elsewhere, pick up abandoned ones,
+        re-read the users blocked or unblocked by other workers"""
+        while True:
+            await asyncio.sleep(self.lease / 6)
+            try:
+                held = await asyncio.to_thread(self.state.renew, list(self._tasks), self.owner)
+                for broadcast_id, task in list(self._tasks.items()):
+                    if broadcast_id not in held:
+                        logger.info(f"Broadcast {broadcast_id} cancelled or taken over, stopping")
+                        task.cancel()
+                await self._claim()
+                self._blocked = await asyncio.to_thread(self.state.blocked_ids)
+            except sqlite3.Error as e:
+                logger.error(f"Broadcast lease check failed: {e}")
+
+    def _launch(self, broadcast: Broadcast):
+        task = asyncio.create_task(self._run(broadcast))
+        self._tasks[broadcast.id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(broadcast.id, None))
+
+    async def broadcast(self, text: str, parse_mode: Optional[str] = None) -> Broadcast:
+        broadcast = await asyncio.to_thread(self.state.create, text, parse_mode, self.owner)
+        logger.info(f"Broadcast {broadcast.id} started")
+        self._launch(broadcast)
+        return broadcast
+
+    async def cancel(self, broadcast_id: int) -> bool:
+        """Cancel a running broadcast, whichever worker is sending it"""
+        if not await asyncio.to_thread(self.state.cancel, broadcast_id):
+            return False
+        task = self._tasks.get(broadcast_id)
+        if task is not None:
+            # Ведём её сами — останавливаем сразу, иначе — ведущий заметит при продлении аренды
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        return True
+
+    async def status(self, broadcast_id: Optional[int] = None) -> Optional[Broadcast]:
+        if broadcast_id is None:
+            return await asyncio.to_thread(self.state.latest)
+        return await asyncio.to_thread(self.state.get, broadcast_id)
+
+    async def unblock(self, user_id: int):
+        """The user talks to the bot again, so they can receive broadcasts"""
+        # Заблокировавших мало, а /start — каждый новый пользователь: в базу идём только
+        # за ними. Заблокированный в другом воркере виден здесь после ближайшего _watch
+        if self._opened and user_id in self._blocked:
+            self._blocked.discard(user_id)
+            await asyncio.to_thread(self.state.remove_blocked, user_id)
+
+    async def _run(self, broadcast: Broadcast):
+        cursor, sent, failed, blocked = broadcast.cursor, broadcast.sent, broadcast.failed, broadcast.blocked
+        # Скользящее окно по порядку user_id: голова — старейшая незавершённая
+        # отправка, следующую выдаём, только пока окно не длиннее BROADCAST_WINDOW.
+        # Одна медленная отправка держит курсор, поэтому и остальные ждут её —
+        # иначе после рестарта повторились бы все завершённые за ней.
+        in_flight: Deque[int] = deque()
+        finished: Set[int] = set()
+        advanced = asyncio.Event()
+        newly_blocked: List[int] = []
+        bucket = TokenBucket(self.rate, max(1.0, self.rate / 10))
+        last_issued = cursor
+        last_checkpoint = time.monotonic()
+
+        def safe_cursor() -> int:
+            # Все id до старейшего незавершённого уже обработаны
+            return in_flight[0] - 1 if in_flight else last_issued
+
+        async def save(status: str = "running", resume_at: Optional[int] = None):
+            nonlocal newly_blocked, last_checkpoint
+            if newly_blocked:
+                batch, newly_blocked = newly_blocked, []
+                await asyncio.to_thread(self.state.add_blocked, batch)
+                self._blocked.update(batch)
+            resume_at = safe_cursor() if resume_at is None else resume_at
+            await asyncio.to_thread(
+                self.state.checkpoint, broadcast.id, self.owner, resume_at, sent, failed, blocked, status,
+            )
+            last_checkpoint = time.monotonic()
+
+        async def send(user_id: int):
+            nonlocal sent, failed, blocked
+            try:
+                await self.sender.send_message(user_id, broadcast.text, parse_mode=broadcast.parse_mode)
+                sent += 1
+            except Forbidden:
+                blocked += 1
+                newly_blocked.append(user_id)
+            except TelegramError as e:
+                # sender уже повторил 429 и сетевые ошибки
+                failed += 1
+                logger.debug(f"Broadcast {broadcast.id} to {user_id} failed: {e}")
+            finally:
+                finished.add(user_id)
+                while in_flight and in_flight[0] in finished:
+                    finished.discard(in_flight.popleft())
+                advanced.set()
+
+        tasks = set()
+        try:
+            while True:
+                user_ids = await self.sessions.user_ids_after(cursor, self.chunk)
+                if not user_ids:
+                    break
+                skip = await asyncio.to_thread(self.state.blocked_among, user_ids)
+                for user_id in user_ids:
+                    if user_id in skip:
+                        last_issued = max(last_issued, user_id)
+                        continue
+                    while len(in_flight) >= self.window:
+                        advanced.clear()
+                        await advanced.wait()
+                    wait = bucket.delay()
+                    while wait > 0:
+                        await asyncio.sleep(wait)
+                        wait = bucket.delay()
+                    bucket.consume()
+                    in_flight.append(user_id)
+                    last_issued = user_id
+                    task = asyncio.create_task(send(user_id))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                    if time.monotonic() - last_checkpoint > BROADCAST_CHECKPOINT_INTERVAL:
+                        await save()
+                cursor = user_ids[-1]
+            await asyncio.gather(*tasks)
+            await save("done")
+            logger.info(f"Broadcast {broadcast.id} done: sent {sent}, blocked {blocked}, failed {failed}")
+        except asyncio.CancelledError:
+            # Незавершённые из окна после рестарта отправим заново
+            resume_at = safe_cursor()
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await save(resume_at=resume_at)
+            raise
@@ -0,0 +1,242 @@
+"""Несколько процессов-воркеров за одним вебхуком.
+
+При WORKERS > 1 основной процесс только принимает вебхук (см. webserver.py) и
+раскладывает обновления по воркерам по хэшу user_id: все обновления одного
+пользователя попадают в один и тот же процесс и обрабатываются по порядку,
+поэтому локальный кэш навигации воркера не расходится с общим хранилищем.
+Общее состояние — хранилище сессий (SESSION_STORE_URL, Postgres или SQLite),
+тикеты вопросов менеджерам (TICKET_STORE_URL): реплай менеджера попадает в
+воркер менеджера, а не того, кто переслал вопрос, — и рассылки с
+заблокировавшими бота (BROADCAST_DB_PATH, см. broadcast.py). Всё это
+переживает перезапуск и смену числа воркеров.
+
+Журнал принятых обновлений (ingest.py) ведёт основной процесс: вебхук
+отвечает 200 после записи в журнал, а обновление отмечается обработанным,
+когда воркер пришлёт его update_id в общую очередь подтверждений. Следующее
+обновление пользователя уходит воркеру только после подтверждения
+предыдущего, так что порядок сохраняется и без журнала в воркере. Упавший или
+остановленный посреди работы воркер ничего не теряет: неподтверждённые
+обновления остаются в журнале.
+
+Файлы, которые пишет каждый процесс (спул вопросов менеджерам, кэш file_id),
+получают суффикс с номером воркера. Лимиты Telegram на
+бота и на группу менеджеров общие, а SendScheduler у каждого воркера свой,
+поэтому каждый воркер получает 1/WORKERS от SEND_GLOBAL_RATE и SEND_GROUP_RATE.
+
+Основной процесс следит за воркерами (WorkerPool.supervise): упавший воркер
+перезапускается, и ему заново отправляются его неподтверждённые обновления.
+Если воркер падает больше WORKER_MAX_RESTARTS раз за WORKER_RESTART_WINDOW
+секунд (например, ошибка при запуске), бот останавливается целиком.
+
+Обработчики, Bot API и хранилища работают в воркерах, поэтому /metrics
+основного процесса собирается с них: запрос метрик идёт в очередь воркера,
+текст возвращается по каналу подтверждений, сэмплы получают метку worker.
+Воркер, не ответивший за WORKER_METRICS_TIMEOUT, в выдачу не попадает.
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from metrics import merge_rendered, render_all
+
+logger = logging.getLogger(__name__)
+
+WORKERS = int(os.getenv("WORKERS", 1))
+WORKER_CHECK_INTERVAL = float(os.getenv("WORKER_CHECK_INTERVAL", 1))  # секунды
+WORKER_MAX_RESTARTS = int(os.getenv("WORKER_MAX_RESTARTS", 5))
+WORKER_RESTART_WINDOW = float(os.getenv("WORKER_RESTART_WINDOW", 300))  # секунды
+WORKER_METRICS_TIMEOUT = float(os.getenv("WORKER_METRICS_TIMEOUT", 2))  # секунды
+
+# Пути к файлам, которые нельзя писать из нескольких процессов одновременно
+PER_WORKER_PATHS = {
+    "FORWARD_SPOOL_PATH": "manager_spool.jsonl",
+    "FORWARD_DEAD_LETTER_PATH": "manager_dead_letter.jsonl",
+    "FILE_ID_CACHE_PATH": "file_ids.json",
+}
+
+# Лимиты Telegram на весь бот, которые делятся между воркерами
+SHARED_BUDGETS = {
+    "SEND_GLOBAL_RATE": 30,
+    "SEND_GROUP_RATE": 20 / 60,
+    "SEND_GROUP_BURST": 3,
+}
+
+
+class MetricsRequest(NamedTuple):
+    """Put into a worker's queue; the worker answers (request, render_all()) on the ack queue"""
+    worker: int
+    request_id: int
+
+
+def update_user_id(data: dict) -> Optional[int]:
+    """Id of the user (or chat) an update belongs to, from its raw JSON"""
+    for key, value in data.items():
+        if key == "update_id" or not isinstance(value, dict):
+            continue
+        user = value.get("from") or value.get("user")
+        if isinstance(user, dict) and "id" in user:
+            return user["id"]
+        chat = value.get("chat")
+        if isinstance(chat, dict) and "id" in chat:
+            return chat["id"]
+    return None
+
+
+def shard_for(user_id: Optional[int], workers: int) -> int:
+    # Обновления без пользователя (редкие служебные) — всегда первому воркеру
+    return 0 if user_id is None else user_id % workers
+
+
+def worker_path(path: str, index: int) -> str:
+    root, ext = os.path.splitext(path)
+    return f"{root}.{index}{ext}"
+
+
+def split_budgets(workers: int):
+    """Set this process's share of the bot-wide send limits in the environment"""
+    for name, default in SHARED_BUDGETS.items():
+        share = float(os.getenv(name, default)) / workers
+        if name.endswith("_BURST"):
+            share = max(share, 1.0)  # меньше одного токена — bucket никогда не наполнится
+        os.environ[name] = str(share)
+
+
+def worker_main(index: int, queue, acks, workers: int = WORKERS):
+    """Entry point of a worker process"""
+    for name, default in PER_WORKER_PATHS.items():
+        os.environ[name] = worker_path(os.getenv(name, default), index)
+    split_budgets(workers)
+
+    import main  # импорт после настройки окружения: модуль читает его при загрузке
+
+    asyncio.run(main.run_worker(queue, acks))
+
+
+class WorkerPool:
+    def __init__(self, workers: int = WORKERS, target: Callable = worker_main, args: tuple = ()):
+        # spawn: воркеры не наследуют event loop и сокеты основного процесса
+        self._context = multiprocessing.get_context("spawn")
+        self._target = target
+        self._args = args
+        self.queues: List = [self._context.Queue() for _ in range(workers)]
+        self.acks = self._context.Queue()  # update_id обработанных обновлений от всех воркеров
+        self.processes = [self._spawn(i) for i in range(workers)]
+        self.restarts = 0
+        self._restarted_at: List[List[float]] = [[] for _ in range(workers)]
+        # update_id -> (ожидание подтверждения, само обновление для повторной отправки)
+        self._waiting: Dict[int, Tuple[asyncio.Future, dict]] = {}
+        self._ack_task: Optional[asyncio.Task] = None
+        self._metrics_waiting: Dict[MetricsRequest, asyncio.Future] = {}
+        self._metrics_requests = 0
+
+    def _spawn(self, index: int):
+        return self._context.Process(
+            target=self._target, args=(index, self.queues[index], self.acks, *self._args),
+            name=f"worker-{index}", daemon=True,
+        )
+
+    def start(self):
+        for process in self.processes:
+            process.start()
+        logger.info(f"Started {len(self.processes)} workers")
+
+    def _restart(self, index: int):
+        """Replace a dead worker and resend everything it has not acknowledged"""
+        dead = self.processes[index]
+        logger.error(f"{dead.name} died with exit code {dead.exitcode}, restarting")
+        # Новая очередь: непрочитанное из старой всё равно есть среди неподтверждённых
+        old = self.queues[index]
+        old.cancel_join_thread()
+        old.close()
+        self.queues[index] = self._context.Queue()
+        self.processes[index] = self._spawn(index)
+        self.processes[index].start()
+        self.restarts += 1
+        unacked = [data for _, data in self._waiting.values() if self.route(data) == index]
+        for data in unacked:
+            self.queues[index].put(data)
+        logger.info(f"Resent {len(unacked)} unacknowledged updates to worker-{index}")
+
+    async def supervise(self, interval: float = WORKER_CHECK_INTERVAL):
+        """Restart dead workers; raise if one keeps dying"""
+        while True:
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            for index, process in enumerate(self.processes):
+                if process.is_alive():
+                    continue
+                recent = [t for t in self._restarted_at[index] if now - t < WORKER_RESTART_WINDOW]
+                if len(recent) >= WORKER_MAX_RESTARTS:
+                    raise RuntimeError(f"{process.name} died {len(recent) + 1} times "
+                                       f"in {WORKER_RESTART_WINDOW:.0f}s, last exit code {process.exitcode}")
+                self._restarted_at[index] = recent + [now]
+                self._restart(index)
+
+    def route(self, data: dict) -> int:
+        return shard_for(update_user_id(data), len(self.queues))
+
+    async def _collect_acks(self):
+        while True:
+            item = await asyncio.to_thread(self.acks.get)
+            if item is None:
+                break
+            if isinstance(item, int):  # update_id обработанного обновления
+                future, _ = self._waiting.pop(item, (None, None))
+                result = None
+            else:  # (MetricsRequest, текст метрик)
+                request, result = item
+                future = self._metrics_waiting.pop(request, None)
+            if future is not None and not future.done():
+                future.set_result(result)
+
+    def _listen_acks(self):
+        if self._ack_task is None:
+            self._ack_task = asyncio.create_task(self._collect_acks())
+
+    async def render_metrics(self, timeout: float = WORKER_METRICS_TIMEOUT) -> str:
+        """/metrics of this process and of every worker that answers in time, labelled by worker"""
+        self._listen_acks()
+        self._metrics_requests += 1
+        loop = asyncio.get_running_loop()
+        futures = {}
+        for index, queue in enumerate(self.queues):
+            request = MetricsRequest(index, self._metrics_requests)
+            futures[index] = self._metrics_waiting[request] = loop.create_future()
+            queue.put(request)
+        await asyncio.wait(futures.values(), timeout=timeout)
+        parts = {"front": render_all()}
+        for index, future in futures.items():
+            self._metrics_waiting.pop(MetricsRequest(index, self._metrics_requests), None)
+            if future.done():
+                parts[str(index)] = future.result()
+            else:
+                logger.warning(f"worker-{index} did not send metrics in {timeout}s")
+        return merge_rendered(parts, "worker")
+
+    async def process(self, data: dict):
+        """Hand an update to its worker and wait until the worker has processed it"""
+        self._listen_acks()
+        update_id = data["update_id"]
+        future = asyncio.get_running_loop().create_future()
+        self._waiting[update_id] = (future, data)
+        # Очередь без ограничения: put не блокирует, отправкой занимается фоновый поток очереди
+        self.queues[self.route(data)].put(data)
+        try:
+            await future
+        finally:
+            self._waiting.pop(update_id, None)
+
+    def stop(self, timeout: float = 30):
+        """Let workers finish what they were given and exit"""
+        for queue in self.queues:
+            queue.put(None)
+        for process in self.processes:
+            process.join(timeout)
+            if process.is_alive():
+                logger.warning(f"{process.name} did not stop in {timeout}s, terminating")
+                process.terminate()
+                process.join()
+        self.acks.put(None)  # завершает _collect_acks
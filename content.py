@@ -0,0 +1,225 @@
+"""Контент бота (меню и ответы) с горячей перезагрузкой.
+
+Источник — версионированный content.json:
+    {"version": 1, "menu": {...MENU_TREE...}, "answers": {...ANSWERS...}}
+
+Файл проверяется и компилируется (индекс меню, отрендеренные ответы,
+поисковый и инлайн-индексы) в отдельном потоке, после чего ContentStore.current
+подменяется одной операцией присваивания. Обработчики берут снимок content.current и не
+ждут перезагрузки. Если новая версия не прошла проверку, остаётся старая.
+
+Скомпилированный контент (вместе с клавиатурами и индексами) сохраняется в
+CONTENT_SNAPSHOT_PATH, и холодный старт читает его одним чтением вместо
+компиляции. Снимок привязан к размеру и mtime content.json и модулей
+компиляции, версиям Python и python-telegram-bot; при любом расхождении он
+пересобирается. Собрать заранее, например при деплое:
+
+    python content.py
+"""
+import asyncio
+import copyreg
+import io
+import json
+import logging
+import os
+import pickle
+import sys
+from types import MappingProxyType
+from typing import Dict, NamedTuple, Optional
+
+from telegram import __version__ as PTB_VERSION
+
+from inline import InlineIndex, build_inline_index
+from menu import MenuIndex, compile_menu
+from render import RenderedAnswer, render_answers
+from search import SearchIndex, build_search_index
+
+logger = logging.getLogger(__name__)
+
+CONTENT_PATH = os.getenv("CONTENT_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "content.json"))
+CONTENT_RELOAD_INTERVAL = float(os.getenv("CONTENT_RELOAD_INTERVAL", 30))  # 0 — не следить за файлом
+# Пусто — компилировать при каждом старте
+CONTENT_SNAPSHOT_PATH = os.getenv("CONTENT_SNAPSHOT_PATH", f"{CONTENT_PATH}.snapshot")
+SNAPSHOT_FORMAT = 1
+# Модули, от кода которых зависит скомпилированный контент
+_COMPILER_MODULES = ("content", "menu", "render", "search", "inline")
+
+
+class ContentError(ValueError):
+    pass
+
+
+class Content(NamedTuple):
+    version: int
+    menu: MenuIndex
+    answers: Dict[str, RenderedAnswer]
+    search: SearchIndex
+    inline: InlineIndex
+    menu_tree: dict  # исходные данные — для валидатора и поиска
+    raw_answers: dict
+
+
+def read_raw(path: str = CONTENT_PATH) -> dict:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def check_structure(raw) -> None:
+    """Raise ContentError if raw content does not have the expected shape"""
+    if not isinstance(raw, dict):
+        raise ContentError("контент должен быть объектом")
+    if not isinstance(raw.get("version"), int):
+        raise ContentError("нет целочисленного поля version")
+    if not isinstance(raw.get("menu"), dict) or not raw["menu"]:
+        raise ContentError("нет непустого объекта menu")
+    answers = raw.get("answers")
+    if not isinstance(answers, dict):
+        raise ContentError("нет объекта answers")
+    for key, answer in answers.items():
+        if isinstance(answer, dict):
+            if not isinstance(answer.get("text", ""), str) or not isinstance(answer.get("photo_url", ""), str):
+                raise ContentError(f"answers.{key}: text и photo_url должны быть строками")
+        elif not isinstance(answer, str):
+            raise ContentError(f"answers.{key}: ответ должен быть строкой или объектом")
+
+
+def compile_content(raw) -> Content:
+    """Validate raw content and compile it into the runtime form"""
+    check_structure(raw)
+    try:
+        menu = compile_menu(raw["menu"])
+    except (TypeError, ValueError) as e:
+        raise ContentError(f"menu: {e}") from e
+    missing = sorted({n.answer for n in menu.nodes.values() if n.answer is not None} - raw["answers"].keys())
+    if missing:
+        raise ContentError(f"в answers нет ключей: {', '.join(missing)}")
+    answers = render_answers(raw["answers"])
+    return Content(
+        raw["version"], menu, answers,
+        build_search_index(menu, raw["answers"]), build_inline_index(menu, answers),
+        raw["menu"], raw["answers"],
+    )
+
+
+def snapshot_key(path: str = CONTENT_PATH) -> tuple:
+    """What a snapshot was compiled from: file sizes and mtimes, Python and PTB versions"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    files = [path] + [os.path.join(here, f"{module}.py") for module in _COMPILER_MODULES]
+    stats = tuple((os.path.basename(f), st.st_size, st.st_mtime_ns) for f in files for st in (os.stat(f),))
+    return SNAPSHOT_FORMAT, sys.version_info[:2], PTB_VERSION, stats
+
+
+def _mapping_proxy(items: dict) -> MappingProxyType:
+    return MappingProxyType(items)
+
+
+def save_snapshot(content: Content, key: tuple, path: str = CONTENT_SNAPSHOT_PATH):
+    buffer = io.BytesIO()
+    pickler = pickle.Pickler(buffer, protocol=pickle.HIGHEST_PROTOCOL)
+    # MappingProxyType (дети узлов, индекс меню) pickle сам не умеет
+    pickler.dispatch_table = copyreg.dispatch_table.copy()
+    pickler.dispatch_table[MappingProxyType] = lambda proxy: (_mapping_proxy, (dict(proxy),))
+    pickler.dump(key)
+    pickler.dump(content)
+    tmp = f"{path}.{os.getpid()}.tmp"  # воркеры кластера могут писать одновременно
+    with open(tmp, "wb") as f:
+        f.write(buffer.getvalue())
+    os.replace(tmp, path)
+
+
+def load_snapshot(key: tuple, path: str = CONTENT_SNAPSHOT_PATH) -> Optional[Content]:
+    """Compiled content from the snapshot, or None if it is missing or stale"""
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return None
+    unpickler = pickle.Unpickler(io.BytesIO(data))  # файл пишет сам бот
+    try:
+        if unpickler.load() != key:
+            return None
+        content = unpickler.load()
+    except Exception as e:
+        logger.warning(f"Content snapshot {path} is unreadable, recompiling: {e}")
+        return None
+    return content if isinstance(content, Content) else None
+
+
+def load_content(path: str = CONTENT_PATH, snapshot_path: str = CONTENT_SNAPSHOT_PATH) -> Content:
+    try:
+        # Ключ снимаем до чтения: если файл поменяется во время компиляции, снимок не совпадёт
+        key = snapshot_key(path) if snapshot_path else None
+        if key is not None:
+            content = load_snapshot(key, snapshot_path)
+            if content is not None:
+                return content
+        raw = read_raw(path)
+    except (OSError, ValueError) as e:
+        raise ContentError(f"{path}: {e}") from e
+    content = compile_content(raw)
+    if key is not None:
+        try:
+            save_snapshot(content, key, snapshot_path)
+        except OSError as e:
+            logger.warning(f"Cannot write content snapshot {snapshot_path}: {e}")
+    return content
+
+
+class ContentStore:
+    def __init__(self, path: str = CONTENT_PATH, reload_interval: float = CONTENT_RELOAD_INTERVAL,
+                 snapshot_path: str = CONTENT_SNAPSHOT_PATH):
+        self.path = path
+        self.reload_interval = reload_interval
+        self.snapshot_path = snapshot_path
+        self.current: Content = load_content(path, snapshot_path)
+        self._mtime = self._stat()
+        self._task = None
+
+    def _stat(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    async def reload(self) -> bool:
+        """Load, validate and atomically swap in the content file"""
+        try:
+            content = await asyncio.to_thread(load_content, self.path, self.snapshot_path)
+        except ContentError as e:
+            logger.error(f"Content reload rejected, keeping version {self.current.version}: {e}")
+            return False
+        self.current = content
+        logger.info(f"Content version {content.version} loaded")
+        return True
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            mtime = self._stat()
+            if mtime is not None and mtime != self._mtime:
+                self._mtime = mtime
+                await self.reload()
+
+    async def start(self):
+        if self.reload_interval > 0:
+            self._task = asyncio.create_task(self._watch())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    if not CONTENT_SNAPSHOT_PATH:
+        sys.exit("CONTENT_SNAPSHOT_PATH пуст")
+    # Через import: классы в снимке должны ссылаться на модуль content, а не __main__
+    import content as module
+
+    content = module.load_content()
+    print(f"{CONTENT_SNAPSHOT_PATH}: content version {content.version}, {len(content.menu.nodes)} menu nodes")
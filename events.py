@@ -0,0 +1,477 @@
+"""Ответ «Мероприятия в ближайшее время» из публичного календаря (iCal).
+
+Фоновая задача раз в EVENTS_REFRESH_INTERVAL скачивает .ics (тот же
+календарь, что в ответе calendar) условным запросом — If-None-Match /
+If-Modified-Since, так что неизменившийся календарь не качается и не
+разбирается. Новый файл разбирается построчно по мере загрузки; в памяти
+остаются только события (и повторы RRULE) в пределах EVENTS_HORIZON_DAYS,
+отсортированные по началу. Индекс подменяется целиком, только если файл
+разобран без ошибок.
+
+Обработчики не ждут календарь: EventsFeed.answer() рендерит ответ из
+индекса и кэширует его на EVENTS_CACHE_TTL секунд. Пока календарь ни разу
+не загрузился (или EVENTS_ICS_URL пуст), используется текст из content.json.
+
+EVENTS_ICS_URL может быть и путём к локальному файлу (или file://...) —
+тогда вместо ETag сравнивается время изменения файла.
+"""
+import asyncio
+import bisect
+import html
+import logging
+import os
+import re
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+import httpx
+
+from bot_api import ssl_context
+from render import RenderedAnswer, RenderError, render_answer
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ICS_URL = (
+    "https://calendar.google.com/calendar/ical/"
+    "ba74e1fa81fc29c5d262012a4eb8990704ab4cfd6c94133514ab5eda7489de1a%40group.calendar.google.com/public/basic.ics"
+)
+EVENTS_ICS_URL = os.getenv("EVENTS_ICS_URL", DEFAULT_ICS_URL)  # пусто — ответ только из content.json
+EVENTS_ANSWER_KEY = os.getenv("EVENTS_ANSWER_KEY", "events")
+EVENTS_REFRESH_INTERVAL = float(os.getenv("EVENTS_REFRESH_INTERVAL", 900))  # секунды между проверками календаря
+EVENTS_CACHE_TTL = float(os.getenv("EVENTS_CACHE_TTL", 60))  # секунды жизни отрендеренного ответа
+EVENTS_HORIZON_DAYS = int(os.getenv("EVENTS_HORIZON_DAYS", 90))
+EVENTS_LIMIT = int(os.getenv("EVENTS_LIMIT", 10))  # событий в ответе
+EVENTS_TIMEZONE = os.getenv("EVENTS_TIMEZONE", "Europe/Moscow")  # для дат без часового пояса и для ответа
+# Раз в сутки календарь скачивается без условных заголовков: повторы RRULE
+# раскрыты только до горизонта, и он должен сдвигаться, даже если файл не менялся
+EVENTS_FULL_RELOAD = 86400
+MAX_OCCURRENCES = 100_000  # защита от бесконечных RRULE
+
+MONTHS = ("января", "февраля", "марта", "апреля", "мая", "июня",
+          "июля", "августа", "сентября", "октября", "ноября", "декабря")
+WEEKDAYS = ("пн", "вт", "ср", "чт", "пт", "сб", "вс")
+ICAL_WEEKDAYS = {"MO": 0, "TU": 1, "WE": 2, "TH": 3, "FR": 4, "SA": 5, "SU": 6}
+
+_ESCAPE_RE = re.compile(r"\\([\\;,nN])")
+_DURATION_RE = re.compile(r"([+-])?P(?:(\d+)W)?(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?$")
+
+
+class Event(NamedTuple):
+    start: datetime  # с часовым поясом
+    end: datetime  # не включительно; у событий на весь день — полночь следующего дня
+    all_day: bool
+    summary: str
+    location: str
+
+
+class Property(NamedTuple):
+    name: str
+    params: Dict[str, str]
+    value: str
+
+
+# ── Разбор iCalendar (RFC 5545)
+
+def parse_property(line: str) -> Property:
+    """Split an unfolded content line into name, parameters and value"""
+    quoted = False
+    for i, char in enumerate(line):
+        if char == '"':
+            quoted = not quoted
+        elif char == ":" and not quoted:
+            head, value = line[:i], line[i + 1:]
+            break
+    else:
+        raise ValueError(f"нет двоеточия: {line[:40]!r}")
+    name, *params = head.split(";")
+    return Property(name.upper(), dict(_split_param(p) for p in params), value)
+
+
+def _split_param(param: str) -> Tuple[str, str]:
+    key, _, value = param.partition("=")
+    return key.upper(), value.strip('"')
+
+
+def unescape_text(value: str) -> str:
+    return _ESCAPE_RE.sub(lambda m: "\n" if m.group(1) in "nN" else m.group(1), value)
+
+
+def parse_duration(value: str) -> timedelta:
+    match = _DURATION_RE.match(value)
+    if not match or value in ("P", "PT"):
+        raise ValueError(f"непонятная длительность {value!r}")
+    sign, weeks, days, hours, minutes, seconds = match.groups()
+    duration = timedelta(weeks=int(weeks or 0), days=int(days or 0), hours=int(hours or 0),
+                         minutes=int(minutes or 0), seconds=int(seconds or 0))
+    return -duration if sign == "-" else duration
+
+
+def _zone(name: Optional[str], default: ZoneInfo) -> ZoneInfo:
+    if not name:
+        return default
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        logger.debug(f"Unknown TZID {name!r}, using {default}")
+        return default
+
+
+def parse_datetime(value: str, params: Dict[str, str], tz: ZoneInfo) -> Tuple[datetime, bool]:
+    """(aware datetime, all_day) of a DATE or DATE-TIME value"""
+    value = value.strip()
+    if params.get("VALUE") == "DATE" or len(value) == 8:
+        day = datetime.strptime(value, "%Y%m%d")
+        return day.replace(tzinfo=tz), True
+    if value.endswith("Z"):
+        return datetime.strptime(value, "%Y%m%dT%H%M%SZ").replace(tzinfo=timezone.utc), False
+    return datetime.strptime(value, "%Y%m%dT%H%M%S").replace(tzinfo=_zone(params.get("TZID"), tz)), False
+
+
+def _add_months(start: datetime, months: int) -> Optional[datetime]:
+    month = start.month - 1 + months
+    try:
+        return start.replace(year=start.year + month // 12, month=month % 12 + 1)
+    except ValueError:
+        return None  # 31-е или 29 февраля: в этом месяце повтора нет (RFC 5545)
+
+
+def expand_rrule(start: datetime, rule: str, tz: ZoneInfo, window_end: datetime) -> Iterator[datetime]:
+    """Occurrence starts of an RRULE up to window_end.
+
+    Поддерживаются FREQ=DAILY|WEEKLY|MONTHLY|YEARLY с INTERVAL, COUNT, UNTIL
+    и BYDAY у WEEKLY — так повторяются события в календарях Google. Прочие
+    BY*-части не раскрываются: остаётся только первое вхождение.
+    """
+    parts = dict(_split_param(p) for p in rule.split(";") if p)
+    freq = parts.get("FREQ")
+    interval = max(1, int(parts.get("INTERVAL", 1)))
+    count = int(parts["COUNT"]) if "COUNT" in parts else None
+    until = parse_datetime(parts["UNTIL"], {}, tz)[0] if "UNTIL" in parts else None
+    if until is not None and len(parts["UNTIL"]) == 8:
+        until += timedelta(days=1) - timedelta(microseconds=1)  # UNTIL=дата включает весь день
+    unsupported = {k for k in parts if k.startswith("BY")} - ({"BYDAY"} if freq == "WEEKLY" else set())
+    if freq not in ("DAILY", "WEEKLY", "MONTHLY", "YEARLY") or unsupported:
+        logger.debug(f"RRULE {rule!r} is not supported, using the first occurrence only")
+        yield start
+        return
+
+    def candidates() -> Iterator[datetime]:
+        days = sorted(ICAL_WEEKDAYS[d[-2:]] for d in parts.get("BYDAY", "").split(",") if d[-2:] in ICAL_WEEKDAYS)
+        if freq == "WEEKLY" and days:
+            week = start - timedelta(days=start.weekday())
+            while True:
+                for day in days:
+                    yield week + timedelta(days=day)
+                week += timedelta(weeks=interval)
+        for n in range(MAX_OCCURRENCES):
+            if freq == "DAILY":
+                yield start + timedelta(days=n * interval)
+            elif freq == "WEEKLY":
+                yield start + timedelta(weeks=n * interval)
+            else:
+                shifted = _add_months(start, n * interval * (12 if freq == "YEARLY" else 1))
+                if shifted is not None:
+                    yield shifted
+
+    emitted = 0
+    for n, occurrence in enumerate(candidates()):
+        if n >= MAX_OCCURRENCES or occurrence > window_end:
+            return
+        if occurrence < start:
+            continue  # дни недели до DTSTART в первой неделе
+        if until is not None and occurrence > until:
+            return
+        yield occurrence
+        emitted += 1
+        if count is not None and emitted >= count:
+            return
+
+
+class IcsParser:
+    """Incremental iCalendar parser: feed lines, get events inside the window.
+
+    Строки можно подавать по мере загрузки файла; в памяти держится только
+    текущий VEVENT и найденные события окна. Изменённые повторы
+    (RECURRENCE-ID) заменяют соответствующее вхождение основного события.
+    """
+
+    def __init__(self, window_start: datetime, window_end: datetime, tz: ZoneInfo):
+        self.window_start = window_start
+        self.window_end = window_end
+        self.tz = tz
+        self.skipped = 0  # VEVENT, которые не удалось разобрать
+        self._line: Optional[str] = None
+        self._event: Optional[List[Property]] = None
+        self._depth = 0  # вложенные компоненты внутри VEVENT (VALARM)
+        self._occurrences: Dict[Tuple[str, datetime], Event] = {}
+        self._overridden: Set[Tuple[str, datetime]] = set()
+
+    def feed(self, line: str):
+        line = line.rstrip("\r\n")
+        if line[:1] in (" ", "\t"):
+            if self._line is not None:
+                self._line += line[1:]  # продолжение свёрнутой строки
+            return
+        if self._line is not None:
+            self._process(self._line)
+        self._line = line
+
+    def close(self) -> List[Event]:
+        """Finish parsing; events sorted by start"""
+        if self._line is not None:
+            self._process(self._line)
+            self._line = None
+        return sorted(e for key, e in self._occurrences.items() if key not in self._overridden)
+
+    def _process(self, line: str):
+        if not line:
+            return
+        if line == "BEGIN:VEVENT":
+            self._event, self._depth = [], 0
+        elif self._event is None:
+            if line.startswith("X-WR-TIMEZONE:"):
+                self.tz = _zone(line.partition(":")[2].strip(), self.tz)
+        elif line.startswith("BEGIN:"):
+            self._depth += 1
+        elif line.startswith("END:") and self._depth:
+            self._depth -= 1
+        elif line == "END:VEVENT":
+            component, self._event = self._event, None
+            try:
+                self._add(component)
+            except (ValueError, KeyError) as e:
+                self.skipped += 1
+                logger.debug(f"Skipping VEVENT: {e}")
+        elif not self._depth:
+            try:
+                self._event.append(parse_property(line))
+            except ValueError as e:
+                logger.debug(f"Skipping calendar line: {e}")
+
+    def _add(self, component: List[Property]):
+        props: Dict[str, Property] = {}
+        exdates: Set[datetime] = set()
+        for prop in component:
+            if prop.name == "EXDATE":
+                exdates.update(parse_datetime(v, prop.params, self.tz)[0] for v in prop.value.split(","))
+            else:
+                props.setdefault(prop.name, prop)
+        dtstart = props["DTSTART"]
+        start, all_day = parse_datetime(dtstart.value, dtstart.params, self.tz)
+        if "DTEND" in props:
+            duration = parse_datetime(props["DTEND"].value, props["DTEND"].params, self.tz)[0] - start
+        elif "DURATION" in props:
+            duration = parse_duration(props["DURATION"].value)
+        else:
+            duration = timedelta(days=1) if all_day else timedelta(0)
+        uid = props["UID"].value if "UID" in props else f"!{id(component)}"
+        cancelled = "STATUS" in props and props["STATUS"].value.upper() == "CANCELLED"
+        summary = unescape_text(props["SUMMARY"].value).strip() if "SUMMARY" in props else ""
+        location = unescape_text(props["LOCATION"].value).strip() if "LOCATION" in props else ""
+
+        if "RECURRENCE-ID" in props:
+            recurrence = props["RECURRENCE-ID"]
+            original = parse_datetime(recurrence.value, recurrence.params, self.tz)[0]
+            self._overridden.add((uid, original))
+            starts: Iterable[datetime] = [start]
+            uid = f"!{uid}"  # изменённое вхождение не перекрывает само себя
+        elif "RRULE" in props:
+            starts = expand_rrule(start, props["RRULE"].value, self.tz, self.window_end)
+        else:
+            starts = [start]
+        if cancelled:
+            return
+        for occurrence in starts:
+            if occurrence in exdates or occurrence + duration <= self.window_start or occurrence > self.window_end:
+                continue
+            self._occurrences[(uid, occurrence)] = Event(
+                occurrence, occurrence + duration, all_day, summary, location
+            )
+
+
+def parse_ics(lines: Iterable[str], window_start: datetime, window_end: datetime, tz: ZoneInfo) -> List[Event]:
+    parser = IcsParser(window_start, window_end, tz)
+    for line in lines:
+        parser.feed(line)
+    return parser.close()
+
+
+# ── Текст ответа
+
+def _day(day: date, year: bool = True) -> str:
+    return f"{day.day} {MONTHS[day.month - 1]}" + (f" {day.year} года" if year else "")
+
+
+def format_when(event: Event, tz: ZoneInfo) -> str:
+    """Russian date (range) of an event, like the hand-written answer used to have"""
+    start = event.start.astimezone(tz) if not event.all_day else event.start
+    end = event.end.astimezone(tz) if not event.all_day else event.end
+    last = (end - timedelta(days=1)).date() if event.all_day else end.date()
+    first = start.date()
+    if last <= first:
+        when = f"{_day(first)} ({WEEKDAYS[first.weekday()]})"
+    elif (first.year, first.month) == (last.year, last.month):
+        when = f"{first.day}–{_day(last)} ({WEEKDAYS[first.weekday()]}–{WEEKDAYS[last.weekday()]})"
+    else:
+        when = (f"{_day(first, year=first.year != last.year)} – {_day(last)} "
+                f"({WEEKDAYS[first.weekday()]}–{WEEKDAYS[last.weekday()]})")
+    if not event.all_day:
+        when += f", {start:%H:%M}"
+        if end > start and last == first:
+            when += f"–{end:%H:%M}"
+    return when
+
+
+def format_events(events: List[Event], tz: ZoneInfo) -> str:
+    lines = ["<u>Ближайшие мероприятия</u>", ""]
+    if not events:
+        lines.append("В ближайшее время мероприятий не запланировано. Следите за донорским календарём!")
+        return "\n".join(lines)
+    lines.append("Можно принять участие в следующих мероприятиях:")
+    for event in events:
+        line = f"• {format_when(event, tz)} - {html.escape(event.summary or 'Мероприятие', quote=False)}"
+        if event.location:
+            line += f" ({html.escape(event.location, quote=False)})"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+# ── Загрузка календаря
+
+class EventsFeed:
+    def __init__(self, url: str = EVENTS_ICS_URL, refresh_interval: float = EVENTS_REFRESH_INTERVAL,
+                 cache_ttl: float = EVENTS_CACHE_TTL, horizon_days: int = EVENTS_HORIZON_DAYS,
+                 limit: int = EVENTS_LIMIT, timezone_name: str = EVENTS_TIMEZONE):
+        self.url = url
+        self.refresh_interval = refresh_interval
+        self.cache_ttl = cache_ttl
+        self.horizon = timedelta(days=horizon_days)
+        self.limit = limit
+        self.tz = ZoneInfo(timezone_name)
+        self.events: List[Event] = []  # отсортированы по началу
+        self._starts: List[datetime] = []
+        self._longest = timedelta(0)  # самое длинное событие — насколько назад искать идущие
+        self.loaded_at: Optional[float] = None  # time.monotonic() последнего разбора
+        self.fetches = 0
+        self.not_modified = 0
+        self._etag: Optional[str] = None
+        self._last_modified: Optional[str] = None
+        self._cached: Optional[RenderedAnswer] = None
+        self._cached_at = 0.0
+        self._client: Optional[httpx.AsyncClient] = None
+        self._task = None
+
+    @property
+    def is_file(self) -> bool:
+        return "://" not in self.url or self.url.startswith("file://")
+
+    def _window(self) -> Tuple[datetime, datetime]:
+        now = datetime.now(self.tz)
+        return now - timedelta(days=1), now + self.horizon
+
+    def _set_events(self, events: List[Event]):
+        self.events = events
+        self._starts = [e.start for e in events]
+        self._longest = max((e.end - e.start for e in events), default=timedelta(0))
+        self.loaded_at = time.monotonic()
+        self._cached = None
+
+    async def refresh(self) -> bool:
+        """Fetch the calendar if it changed; True when the index was rebuilt"""
+        if self.loaded_at is not None and time.monotonic() - self.loaded_at > EVENTS_FULL_RELOAD:
+            self._etag = self._last_modified = None
+        self.fetches += 1
+        events = await (self._fetch_file() if self.is_file else self._fetch_http())
+        if events is None:
+            self.not_modified += 1
+            return False
+        self._set_events(events)
+        logger.info(f"Calendar loaded: {len(events)} events in the next {self.horizon.days} days")
+        return True
+
+    async def _fetch_http(self) -> Optional[List[Event]]:
+        headers = {}
+        if self._etag:
+            headers["If-None-Match"] = self._etag
+        if self._last_modified:
+            headers["If-Modified-Since"] = self._last_modified
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=30, follow_redirects=True, verify=ssl_context())
+        parser = IcsParser(*self._window(), self.tz)
+        async with self._client.stream("GET", self.url, headers=headers) as response:
+            if response.status_code == 304:
+                return None
+            response.raise_for_status()
+            # Разбираем по мере загрузки, между кусками обработчики продолжают работать
+            async for line in response.aiter_lines():
+                parser.feed(line)
+        self._etag = response.headers.get("ETag")
+        self._last_modified = response.headers.get("Last-Modified")
+        return parser.close()
+
+    async def _fetch_file(self) -> Optional[List[Event]]:
+        path = self.url[len("file://"):] if self.url.startswith("file://") else self.url
+        mtime = str(os.stat(path).st_mtime_ns)
+        if mtime == self._etag:
+            return None
+
+        def parse():
+            with open(path, encoding="utf-8") as f:
+                return parse_ics(f, *self._window(), self.tz)
+
+        events = await asyncio.to_thread(parse)
+        self._etag = mtime
+        return events
+
+    def upcoming(self, now: Optional[datetime] = None, limit: Optional[int] = None) -> List[Event]:
+        """Events that have not ended yet (including ongoing ones), by start"""
+        now = now or datetime.now(self.tz)
+        # Идущие сейчас начались не раньше, чем now минус самое длинное событие
+        i = bisect.bisect_left(self._starts, now - self._longest)
+        limit = self.limit if limit is None else limit
+        result = []
+        for event in self.events[i:]:
+            if event.start > now + self.horizon or len(result) >= limit:
+                break
+            if event.end > now:
+                result.append(event)
+        return result
+
+    def answer(self) -> Optional[RenderedAnswer]:
+        """Rendered events answer; None until the calendar has been loaded"""
+        if self.loaded_at is None:
+            return None
+        if self._cached is None or time.monotonic() - self._cached_at > self.cache_ttl:
+            try:
+                self._cached = render_answer(format_events(self.upcoming(), self.tz))
+            except RenderError as e:
+                logger.error(f"Events answer is not valid HTML: {e}")
+                return None
+            self._cached_at = time.monotonic()
+        return self._cached
+
+    async def _refresh_loop(self):
+        while True:
+            try:
+                await self.refresh()
+            except (httpx.HTTPError, OSError, ValueError) as e:
+                logger.warning(f"Calendar refresh failed, keeping {len(self.events)} events: {e}")
+            await asyncio.sleep(self.refresh_interval)
+
+    async def start(self):
+        if self.url:
+            self._task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
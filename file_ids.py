@@ -0,0 +1,71 @@
+"""Кэш Telegram file_id для фото-ответов.
+
+После первой отправки фото по URL Telegram возвращает file_id; дальше
+шлём его, и Telegram не скачивает картинку со стороннего хостинга заново.
+Кэш хранится в небольшом JSON-файле, ключ — пара (answer_key, url): при
+смене photo_url старый file_id просто перестаёт находиться.
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+FILE_ID_CACHE_PATH = os.getenv("FILE_ID_CACHE_PATH", "file_ids.json")
+
+
+class FileIdCache:
+    def __init__(self, path: str = FILE_ID_CACHE_PATH):
+        self.path = path
+        self._ids: Dict[str, str] = self._load()
+        self._write_lock = threading.Lock()  # записи из разных потоков to_thread не пересекаются
+        self._version = 0  # номер последнего изменения
+        self._saved_version = 0  # номер изменения, записанного в файл
+
+    @staticmethod
+    def _key(answer_key: str, url: str) -> str:
+        return f"{answer_key}|{url}"
+
+    def _load(self) -> Dict[str, str]:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.error(f"Cannot read file_id cache {self.path}: {e}")
+            return {}
+
+    def _save(self, snapshot: Dict[str, str], version: int):
+        tmp = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with self._write_lock:
+            if version <= self._saved_version:
+                return  # поток с более новым снимком успел раньше
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(snapshot, f, ensure_ascii=False, indent=1)
+            os.replace(tmp, self.path)
+            self._saved_version = version
+
+    async def _persist(self):
+        try:
+            self._version += 1
+            await asyncio.to_thread(self._save, dict(self._ids), self._version)
+        except OSError as e:
+            logger.error(f"Cannot write file_id cache {self.path}: {e}")
+
+    def get(self, answer_key: str, url: str) -> Optional[str]:
+        return self._ids.get(self._key(answer_key, url))
+
+    async def put(self, answer_key: str, url: str, file_id: str):
+        key = self._key(answer_key, url)
+        if self._ids.get(key) == file_id:
+            return
+        self._ids[key] = file_id
+        await self._persist()
+
+    async def discard(self, answer_key: str, url: str):
+        if self._ids.pop(self._key(answer_key, url), None) is not None:
+            await self._persist()
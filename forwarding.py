@@ -0,0 +1,224 @@
+"""Пакетная пересылка вопросов пользователей в группу менеджеров.
+
+Вопрос сразу дописывается в spool-файл (JSON Lines) и в буфер в памяти,
+пользователь получает подтверждение без ожидания Bot API. Буфер
+отправляется дайджестом, когда набралось FORWARD_BATCH_SIZE вопросов или
+прошло FORWARD_WINDOW секунд. Spool переписывается только после успешной
+отправки, так что при рестарте посреди пачки вопросы не теряются.
+
+Лимит DIGEST_LIMIT считается, как в Telegram, в единицах UTF-16. Если
+Telegram всё же отверг дайджест (BadRequest — ошибка постоянная, повтор не
+поможет), его вопросы отправляются по одному, а отвергнутый одиночный
+вопрос уходит в FORWARD_DEAD_LETTER_PATH и больше не держит очередь.
+
+Вопросы в дайджесте пронумерованы; после отправки каждый сохраняется тикетом
+(tickets.py) с позицией в тексте дайджеста, чтобы ответ менеджера реплаем
+ушёл пользователю.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import List, Tuple
+
+from telegram.error import BadRequest
+
+logger = logging.getLogger(__name__)
+
+FORWARD_BATCH_SIZE = int(os.getenv("FORWARD_BATCH_SIZE", 10))
+FORWARD_WINDOW = float(os.getenv("FORWARD_WINDOW", 30))  # секунды
+FORWARD_SPOOL_PATH = os.getenv("FORWARD_SPOOL_PATH", "manager_spool.jsonl")
+# Вопросы, которые Telegram не принял даже по одному
+FORWARD_DEAD_LETTER_PATH = os.getenv("FORWARD_DEAD_LETTER_PATH", "manager_dead_letter.jsonl")
+DIGEST_LIMIT = 4096
+
+
+def format_question(entry: dict, number: int = 1) -> str:
+    if entry.get("username"):
+        author = f"@{entry['username']}"
+    else:
+        author = f"{entry.get('name') or 'без имени'} (id {entry['user_id']})"
+    return f"#{number} Вопрос от {author}:\n{entry['text']}\n"
+
+
+def utf16_length(text: str) -> int:
+    # Смещения в Telegram (TextQuote.position, entities) считаются в UTF-16
+    return len(text.encode("utf-16-le")) // 2
+
+
+def truncate_utf16(text: str, limit: int) -> str:
+    """Longest prefix of text within limit UTF-16 units, never splitting a surrogate pair"""
+    if len(text) * 2 <= limit:
+        return text  # быстрый путь: даже из одних суррогатных пар уложится
+    return text.encode("utf-16-le")[:limit * 2].decode("utf-16-le", errors="ignore")
+
+
+def build_digests(entries: List[dict], limit: int = DIGEST_LIMIT) -> List[Tuple[str, List[Tuple[int, int]]]]:
+    """Pack questions into as few messages as fit into the limit.
+
+    Returns (text, [(offset, length) of each question in UTF-16 units]) pairs,
+    in order; questions are numbered from #1 in every digest.
+    """
+    digests = []
+    current, positions, size = "", [], 0
+    for entry in entries:
+        block = truncate_utf16(format_question(entry, len(positions) + 1), limit - 2) + "\n"
+        if current and size + utf16_length(block) > limit:
+            digests.append((current.rstrip(), positions))
+            current, positions, size = "", [], 0
+            block = truncate_utf16(format_question(entry), limit - 2) + "\n"
+        positions.append((size, utf16_length(block.rstrip())))
+        current += block
+        size += utf16_length(block)
+    if current:
+        digests.append((current.rstrip(), positions))
+    return digests
+
+
+class ManagerForwarder:
+    def __init__(self, sender, chat_id: int, spool_path: str = FORWARD_SPOOL_PATH,
+                 batch_size: int = FORWARD_BATCH_SIZE, window: float = FORWARD_WINDOW, tickets=None,
+                 dead_letter_path: str = FORWARD_DEAD_LETTER_PATH):
+        self.sender = sender
+        self.chat_id = chat_id
+        self.tickets = tickets  # tickets.TicketStore; None — без ответов пользователям
+        self.spool_path = spool_path
+        self.dead_letter_path = dead_letter_path
+        self.dead_letters = 0
+        self.batch_size = batch_size
+        self.window = window
+        self.buffer: List[dict] = []
+        self._wakeup = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._spool_lock = asyncio.Lock()  # дозапись и перезапись spool не пересекаются
+        self._task = None
+
+    # ── spool
+
+    def _append_spool(self, entry: dict):
+        with open(self.spool_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _rewrite_spool(self, entries: List[dict]):
+        tmp = f"{self.spool_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for entry in entries:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        os.replace(tmp, self.spool_path)
+
+    def _append_dead_letter(self, entry: dict, reason: str):
+        with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({**entry, "error": reason}, ensure_ascii=False) + "\n")
+
+    def _load_spool(self) -> List[dict]:
+        entries = []
+        try:
+            with open(self.spool_path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        logger.warning(f"Skipping broken spool line: {line!r}")
+        except FileNotFoundError:
+            pass
+        return entries
+
+    # ── публичный интерфейс
+
+    async def submit(self, user, text: str):
+        """Record a question durably; it is sent with the next digest"""
+        entry = {
+            "user_id": user.id,
+            "username": user.username,
+            "name": user.full_name,
+            "text": text,
+            "ts": time.time(),
+        }
+        async with self._spool_lock:
+            await asyncio.to_thread(self._append_spool, entry)
+            self.buffer.append(entry)
+        if len(self.buffer) >= self.batch_size:
+            self._wakeup.set()
+
+    async def _drop(self, count: int):
+        async with self._spool_lock:
+            del self.buffer[:count]
+            await asyncio.to_thread(self._rewrite_spool, list(self.buffer))
+
+    async def _deliver(self, digest: str, positions: List[Tuple[int, int]]) -> bool:
+        """Send a digest of the first len(positions) buffered questions; False — retry later"""
+        count = len(positions)
+        try:
+            message = await self.sender.send_message(chat_id=self.chat_id, text=digest)
+        except BadRequest as e:
+            # Постоянная ошибка: тот же дайджест отвергнут будет снова
+            if count > 1:
+                logger.warning(f"Managers' group rejected a digest of {count} questions, sending one by one: {e}")
+                for entry in list(self.buffer[:count]):
+                    (single, single_positions), = build_digests([entry])
+                    if not await self._deliver(single, single_positions):
+                        return False
+                return True
+            entry = self.buffer[0]
+            logger.error(f"Managers' group rejected a question from {entry['user_id']}, "
+                         f"moved to {self.dead_letter_path}: {e}")
+            try:
+                await asyncio.to_thread(self._append_dead_letter, entry, str(e))
+            except OSError as write_error:
+                logger.error(f"Cannot write {self.dead_letter_path}, question dropped: {write_error}")
+            self.dead_letters += 1
+            await self._drop(1)
+            return True
+        except Exception as e:
+            logger.error(f"Error forwarding digest to managers: {e}")
+            return False
+        if self.tickets is not None:
+            try:
+                await self.tickets.add_digest(self.chat_id, message.message_id, self.buffer[:count], positions)
+            except Exception as e:
+                # Дайджест уже у менеджеров: ответить можно вручную по @username или id
+                logger.error(f"Cannot store tickets for digest {message.message_id}: {e}")
+        # Отправленные вопросы не повторяем даже при ошибке на следующем дайджесте
+        await self._drop(count)
+        return True
+
+    async def flush(self):
+        async with self._lock:
+            if not self.buffer:
+                return
+            for digest, positions in build_digests(list(self.buffer)):
+                if not await self._deliver(digest, positions):
+                    return
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.window)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    @property
+    def pending(self) -> int:
+        return len(self.buffer)
+
+    async def start(self):
+        self.buffer = await asyncio.to_thread(self._load_spool)
+        if self.buffer:
+            logger.info(f"Restored {len(self.buffer)} unsent questions from spool")
+            self._wakeup.set()
+        self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
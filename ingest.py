@@ -0,0 +1,210 @@
+"""Надёжный приём обновлений: журнал в SQLite перед обработкой.
+
+Вебхук отвечает Telegram 200 только после того, как обновление записано в
+журнал (INGEST_LOG_PATH). Повторная доставка того же update_id отбрасывается.
+Обработчики берут обновления из журнала: до INGEST_CONCURRENCY обновлений
+разных пользователей обрабатываются параллельно, а обновления одного
+пользователя — строго по очереди (очередь на пользователя, как у sender.py;
+пустая очередь сразу удаляется, так что простаивающие пользователи памяти не
+занимают). Медленный ответ одному пользователю не задерживает остальных.
+
+Отметки об обработке пишутся пачками (раз в INGEST_FLUSH_INTERVAL), поэтому
+после падения процесса несколько последних обновлений могут быть обработаны
+повторно — но ни одно принятое не теряется. При старте необработанные
+обновления из журнала ставятся в очередь заново, при остановке очередь
+дорабатывается до конца (с таймаутом).
+
+При WORKERS > 1 журнал ведёт основной процесс, а process — это передача
+воркеру с ожиданием его подтверждения (cluster.WorkerPool.process): обещание
+«200 только после записи в журнал» действует и в этом режиме.
+"""
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional
+
+from cluster import update_user_id
+
+logger = logging.getLogger(__name__)
+
+INGEST_LOG_PATH = os.getenv("INGEST_LOG_PATH", "updates.db")
+INGEST_CONCURRENCY = int(os.getenv("INGEST_CONCURRENCY", 32))  # обновлений в обработке одновременно
+INGEST_FLUSH_INTERVAL = float(os.getenv("INGEST_FLUSH_INTERVAL", 0.5))  # секунды
+INGEST_RETENTION = float(os.getenv("INGEST_RETENTION", 24 * 3600))  # сколько помнить update_id для дедупликации
+
+
+class UpdateLog:
+    """SQLite table of accepted updates; processed rows are kept for deduplication"""
+
+    def __init__(self, path: str = INGEST_LOG_PATH):
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()  # одно соединение на все потоки to_thread
+
+    def open(self):
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS updates ("
+            " update_id INTEGER PRIMARY KEY,"
+            " payload TEXT NOT NULL,"
+            " received_at REAL NOT NULL,"
+            " processed_at REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS updates_pending ON updates (processed_at)")
+        self._conn.commit()
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def append(self, update_id: int, data: dict) -> bool:
+        """Store an update; False if this update_id was already accepted"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO updates (update_id, payload, received_at) VALUES (?, ?, ?)",
+                (update_id, json.dumps(data, ensure_ascii=False), time.time()),
+            )
+            self._conn.commit()
+            return cursor.rowcount == 1
+
+    def pending(self) -> List[dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT payload FROM updates WHERE processed_at IS NULL ORDER BY update_id"
+            ).fetchall()
+        return [json.loads(payload) for payload, in rows]
+
+    def mark_processed(self, update_ids: List[int]):
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE updates SET processed_at = ? WHERE update_id = ?", [(now, u) for u in update_ids]
+            )
+            self._conn.commit()
+
+    def prune(self, retention: float) -> int:
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM updates WHERE processed_at IS NOT NULL AND processed_at < ?",
+                (time.time() - retention,),
+            )
+            self._conn.commit()
+            return cursor.rowcount
+
+
+class UpdateIngest:
+    def __init__(self, process: Callable[[dict], Awaitable[None]], path: str = INGEST_LOG_PATH,
+                 concurrency: int = INGEST_CONCURRENCY, flush_interval: float = INGEST_FLUSH_INTERVAL,
+                 retention: float = INGEST_RETENTION):
+        self.process = process
+        self.log = UpdateLog(path)
+        self.flush_interval = flush_interval
+        self.retention = retention
+        self.concurrency = max(concurrency, 1)
+        # user_id -> обновления этого пользователя; ключ есть, пока очередь не пуста
+        self._queues: Dict[Optional[int], Deque[dict]] = {}
+        self._ready: asyncio.Queue = asyncio.Queue()  # пользователи, чью очередь можно брать
+        self._done: List[int] = []
+        self._tasks: List[asyncio.Task] = []
+        self.pending = 0
+        self.duplicates = 0
+
+    @property
+    def queue_depth(self) -> int:
+        return self.pending
+
+    @property
+    def active_users(self) -> int:
+        return len(self._queues)
+
+    def _enqueue(self, data: dict):
+        user_id = update_user_id(data)
+        queue = self._queues.get(user_id)
+        if queue is None:
+            queue = self._queues[user_id] = deque()
+            self._ready.put_nowait(user_id)
+        queue.append(data)
+        self.pending += 1
+
+    async def accept(self, data: dict):
+        """Webhook sink: persist the update, then queue it for processing"""
+        if not await asyncio.to_thread(self.log.append, data["update_id"], data):
+            self.duplicates += 1
+            logger.debug("duplicate update", extra={"update_id": data["update_id"]})
+            return
+        self._enqueue(data)
+
+    async def _consume(self):
+        while True:
+            # Пользователь в _ready не более одного раза: его обновления никогда
+            # не обрабатываются двумя задачами сразу
+            user_id = await self._ready.get()
+            queue = self._queues[user_id]
+            data = queue[0]
+            try:
+                await self.process(data)
+            except asyncio.CancelledError:
+                raise  # не доработали — останется в журнале до следующего старта
+            except Exception as e:
+                # Упавшее обновление тоже отмечаем: повтор даст ту же ошибку
+                logger.error(f"Update {data['update_id']} failed: {e}", exc_info=True)
+            queue.popleft()
+            self.pending -= 1
+            self._done.append(data["update_id"])
+            if queue:
+                self._ready.put_nowait(user_id)  # в конец: остальные пользователи не ждут
+            else:
+                del self._queues[user_id]
+            self._ready.task_done()
+
+    async def flush(self):
+        if not self._done:
+            return
+        batch, self._done = self._done, []
+        try:
+            await asyncio.to_thread(self.log.mark_processed, batch)
+        except sqlite3.Error as e:
+            logger.error(f"Cannot mark {len(batch)} updates processed: {e}")
+            self._done = batch + self._done
+
+    async def _flush_loop(self):
+        last_prune = time.monotonic()
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+            if time.monotonic() - last_prune > 3600:
+                last_prune = time.monotonic()
+                removed = await asyncio.to_thread(self.log.prune, self.retention)
+                logger.debug(f"Pruned {removed} processed updates")
+
+    async def start(self):
+        """Open the log and resume updates accepted before the last shutdown"""
+        await asyncio.to_thread(self.log.open)
+        pending = await asyncio.to_thread(self.log.pending)
+        if pending:
+            logger.info(f"Resuming {len(pending)} unprocessed updates")
+        for data in pending:
+            self._enqueue(data)
+        self._tasks = [asyncio.create_task(self._consume()) for _ in range(self.concurrency)]
+        self._tasks.append(asyncio.create_task(self._flush_loop()))
+
+    async def stop(self, timeout: float = 30):
+        """Drain queued updates, record progress and close the log"""
+        try:
+            await asyncio.wait_for(self._ready.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"{self.queue_depth} updates left in the log for the next start")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await self.flush()
+        await asyncio.to_thread(self.log.close)
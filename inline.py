@@ -0,0 +1,102 @@
+"""Инлайн-режим: @bot плазма в любом чате.
+
+Результаты (InlineQueryResultArticle) собираются заранее для каждого ответа
+вместе с контентом. Поиск — по триграммам слов заголовка и текста с бонусом
+за совпадение начала слова в заголовке; результаты по одинаковым запросам
+берутся из LRU-кэша. cache_time передаётся Telegram, чтобы повторные запросы
+вообще не доходили до бота.
+"""
+import os
+import re
+from collections import OrderedDict, defaultdict
+from typing import Dict, List, Tuple
+
+from telegram import InlineQueryResultArticle, InputTextMessageContent
+
+INLINE_CACHE_TIME = int(os.getenv("INLINE_CACHE_TIME", 300))  # секунды, кэш на стороне Telegram
+INLINE_RESULTS = 10
+INLINE_LRU_SIZE = 2048
+DESCRIPTION_LENGTH = 100
+
+_WORD_RE = re.compile(r"[a-zа-яё0-9+]+")
+_TAG_RE = re.compile(r"<[^>]*>")
+
+
+def _words(text: str) -> List[str]:
+    return _WORD_RE.findall(text.lower().replace("ё", "е"))
+
+
+def _trigrams(word: str):
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class InlineIndex:
+    def __init__(self, results: List[Tuple[str, str, InlineQueryResultArticle]]):
+        """results: (title, plain text, prebuilt article) in menu order"""
+        self.articles = [article for _, _, article in results]
+        self.prefixes: Dict[str, set] = defaultdict(set)  # начало слова заголовка -> документы
+        self.postings: Dict[str, Dict[int, int]] = defaultdict(dict)
+        for doc, (title, text, _) in enumerate(results):
+            for word in _words(title):
+                for end in range(1, len(word) + 1):
+                    self.prefixes[word[:end]].add(doc)
+            for word in set(_words(title) + _words(text)):
+                for gram in _trigrams(word):
+                    self.postings[gram][doc] = self.postings[gram].get(doc, 0) + 1
+        self.postings = dict(self.postings)
+        self.prefixes = dict(self.prefixes)
+        self._cache: "OrderedDict[str, Tuple[InlineQueryResultArticle, ...]]" = OrderedDict()
+
+    def _rank(self, query: str) -> Tuple[InlineQueryResultArticle, ...]:
+        words = _words(query)
+        if not words:
+            return tuple(self.articles[:INLINE_RESULTS])
+        scores: Dict[int, float] = defaultdict(float)
+        for word in words:
+            grams = _trigrams(word)
+            for gram in grams:
+                for doc in self.postings.get(gram, ()):
+                    scores[doc] += 1 / len(grams)
+            for doc in self.prefixes.get(word, ()):
+                scores[doc] += 1  # начало слова в заголовке — самый сильный сигнал
+        # Отсекаем случайные совпадения по одной-двум триграммам
+        threshold = 0.5 * len(words)
+        ranked = sorted((d for d, s in scores.items() if s >= threshold), key=lambda d: -scores[d])
+        return tuple(self.articles[d] for d in ranked[:INLINE_RESULTS])
+
+    def search(self, query: str) -> Tuple[InlineQueryResultArticle, ...]:
+        key = " ".join(_words(query))
+        results = self._cache.get(key)
+        if results is not None:
+            self._cache.move_to_end(key)
+            return results
+        results = self._rank(key)
+        self._cache[key] = results
+        if len(self._cache) > INLINE_LRU_SIZE:
+            self._cache.popitem(last=False)
+        return results
+
+
+def build_inline_index(menu, rendered_answers) -> InlineIndex:
+    """One article per answer reachable from the menu, titled by its menu label"""
+    results = []
+    seen = set()
+    for node in menu.nodes.values():
+        key = node.answer
+        if key is None or key in seen or key not in rendered_answers:
+            continue
+        seen.add(key)
+        answer = rendered_answers[key]
+        if not answer.chunks:
+            continue  # фото без текста в инлайн-статью не превратить
+        text = answer.chunks[0]
+        plain = " ".join(_TAG_RE.sub("", text).split())
+        article = InlineQueryResultArticle(
+            id=key,
+            title=node.label,
+            description=plain[:DESCRIPTION_LENGTH],
+            input_message_content=InputTextMessageContent(text, parse_mode=answer.parse_mode),
+        )
+        results.append((node.label, plain, article))
+    return InlineIndex(results)
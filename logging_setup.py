@@ -0,0 +1,101 @@
+"""Настройка логирования.
+
+Запись логов вынесена из цикла событий: обработчики пишут в очередь через
+QueueHandler, а в поток вывода пишет отдельный поток QueueListener.
+
+Переменные окружения:
+    LOG_LEVEL          уровень корневого логгера (INFO)
+    LOG_LEVELS         уровни отдельных логгеров: "httpx=WARNING,telegram.ext=DEBUG"
+    LOG_FORMAT         text | json
+    LOG_DEBUG_SAMPLE   доля DEBUG-записей, которые попадают в лог (1.0 — все)
+    LOG_ASYNC          0 — писать синхронно, как раньше
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+from datetime import datetime, timezone
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+# Поля, которые обработчики передают через extra=
+CONTEXT_FIELDS = ("user", "node", "answer", "chat", "update_id")
+DEFAULT_LEVELS = "httpx=WARNING,httpcore=WARNING,telegram=INFO,tornado.access=WARNING"
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        payload = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for field in CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                payload[field] = value
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class DebugSampler(logging.Filter):
+    """Пропускает только долю DEBUG-записей; INFO и выше — всегда"""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return record.levelno > logging.DEBUG or random.random() < self.rate
+
+
+def parse_levels(spec: str) -> dict:
+    levels = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, level = item.partition("=")
+        levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def setup_logging():
+    global _listener
+
+    stream = logging.StreamHandler()
+    if os.getenv("LOG_FORMAT", "text") == "json":
+        stream.setFormatter(JsonFormatter())
+    else:
+        stream.setFormatter(logging.Formatter(TEXT_FORMAT))
+
+    root = logging.getLogger()
+    root.handlers.clear()
+    root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+    for name, level in {**parse_levels(DEFAULT_LEVELS), **parse_levels(os.getenv("LOG_LEVELS", ""))}.items():
+        logging.getLogger(name).setLevel(level)
+
+    if os.getenv("LOG_ASYNC", "1") == "0":
+        handler = stream
+    else:
+        log_queue = queue.SimpleQueue()
+        handler = logging.handlers.QueueHandler(log_queue)
+        _listener = logging.handlers.QueueListener(log_queue, stream, respect_handler_level=True)
+        _listener.start()
+        atexit.register(stop_logging)
+
+    sample = float(os.getenv("LOG_DEBUG_SAMPLE", 1.0))
+    if sample < 1.0:
+        handler.addFilter(DebugSampler(sample))
+    root.addHandler(handler)
+
+
+def stop_logging():
+    """Дописать очередь логов и остановить поток вывода"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
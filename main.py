@@ -1,229 +1,620 @@
+import time
+STARTED_AT = time.perf_counter()  # до остальных импортов: холодный старт меряется с начала main.py
+
 import os
 import logging
 import asyncio
-from telegram import Update, ReplyKeyboardMarkup
-from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
-from data import MENU_TREE, ANSWERS
-
-logging.basicConfig(
-    level=logging.DEBUG,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    handlers=[
-        logging.StreamHandler()  # Log to the console
-    ]
+from telegram import LinkPreviewOptions, Update
+from telegram.error import BadRequest, Forbidden, TelegramError
+from telegram.ext import (
+    Application, CallbackQueryHandler, CommandHandler, InlineQueryHandler, MessageHandler, filters, ContextTypes
 )
+from analytics import Analytics
+from bot_api import configure_builder, make_bot
+from broadcast import BROADCAST_ADMINS, Broadcaster
+from content import ContentStore
+from events import EVENTS_ANSWER_KEY, EventsFeed
+from file_ids import FileIdCache
+from cluster import WORKERS, MetricsRequest, WorkerPool
+from forwarding import ManagerForwarder
+from ingest import INGEST_CONCURRENCY, UpdateIngest
+from inline import INLINE_CACHE_TIME
+from logging_setup import setup_logging, stop_logging
+from metrics import ANSWERS_SENT, FREE_TEXT, MENU_TAPS, Gauge, instrument_handler, render_all
+from menu import BACK_BUTTON, CUSTOM_QUESTION_BUTTON, CUSTOM_QUESTION_CALLBACK, ROOT_ID, parse_node_callback
+from render import MESSAGE_LIMIT, text_length
+from sender import SendScheduler
+from sessions import SESSION_STORE_URL, create_session_store
+from tickets import TICKET_TTL, choose_ticket, create_ticket_store, format_open_tickets
+from transport import TRANSPORT, create_transport
+from webserver import local_metrics
+
+setup_logging()  # LOG_LEVEL, LOG_LEVELS, LOG_FORMAT=json, LOG_DEBUG_SAMPLE — see logging_setup.py
 logger = logging.getLogger(__name__)
 
 # Load manager group chat ID from environment variable
 MANAGER_GROUP_CHAT_ID = int(os.getenv("MANAGER_GROUP_CHAT_ID", 0))  # Replace with your manager group ID
 RENDER_URL = os.getenv("RENDER_URL")
+# reply — клавиатура под полем ввода; inline — одно сообщение, которое редактируется на месте
+NAVIGATION_MODE = os.getenv("NAVIGATION_MODE", "reply")
+
+# Меню и ответы компилируются заранее и перезагружаются из content.json на лету;
+# обработчики читают готовый снимок content.current
+content = ContentStore()
+# file_id фото, уже загруженных в Telegram {"answer_key|url": file_id}
+photo_file_ids = FileIdCache()
+# Track user navigation state {user_id: node_id}; backend is chosen by SESSION_STORE_URL
+user_navigation = create_session_store()
+# Все исходящие сообщения идут через очередь с лимитами Telegram
+sender = SendScheduler()
+# Вопросы из дайджестов — тикеты в общем хранилище (TICKET_STORE_URL): ответ менеджера реплаем уходит пользователю
+tickets = create_ticket_store()
+# Вопросы менеджерам копятся и уходят дайджестами, переживая рестарт
+manager_forwarder = ManagerForwarder(sender, MANAGER_GROUP_CHAT_ID, tickets=tickets)
+# Рассылки всем пользователям из хранилища сессий, с продолжением после рестарта
+broadcaster = Broadcaster(user_navigation, sender)
+# Ответ events собирается из календаря (EVENTS_ICS_URL), обновляемого в фоне
+events = EventsFeed()
+# Нажатия, ответы и вопросы менеджерам копятся в памяти и пишутся в Postgres пачками (ANALYTICS_URL)
+analytics = Analytics()
+
+
+_gauges_registered = False
+
+
+def register_gauges():
+    """Gauges over the bot components; only where start_bot runs them, not in the cluster front process"""
+    global _gauges_registered
+    if _gauges_registered:
+        return
+    _gauges_registered = True
+    Gauge("donorsbot_sessions", "Users in the session store", lambda: len(user_navigation))
+    Gauge("donorsbot_send_queue_depth", "Messages waiting in the send queue", lambda: sender.queue_depth)
+    Gauge("donorsbot_manager_questions_pending", "Questions waiting for the next digest",
+          lambda: manager_forwarder.pending)
+    Gauge("donorsbot_tickets_open", "Forwarded questions without a manager reply", lambda: tickets.open_count)
+    Gauge("donorsbot_content_version", "Loaded content.json version", lambda: content.current.version)
+    Gauge("donorsbot_analytics_pending", "Analytics events waiting for the next flush", lambda: analytics.pending)
+    Gauge("donorsbot_analytics_dropped", "Analytics events lost to buffer overflow", lambda: analytics.dropped)
+    Gauge("donorsbot_events_upcoming", "Upcoming calendar events in the events answer",
+          lambda: len(events.upcoming()))
 
-# Styled "Back" button
-BACK_BUTTON = "⬅️ Назад"
-CUSTOM_QUESTION_BUTTON = "Свой вопрос❓"
-# Track user navigation state {user_id: ["Main Menu", "Kell+", ...]}
-user_navigation = {}
 
+# Время от запуска процесса до готовности бота; 0 — ещё запускается
+startup_seconds = 0.0
+Gauge("donorsbot_startup_seconds", "Seconds from process start until the bot was ready", lambda: startup_seconds)
 
+
+@instrument_handler
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /start command - show main menu"""
     user_id = update.effective_user.id
-    user_navigation[user_id] = ["Main Menu"]  # Reset navigation state
-
-    keyboard = [
-                   [category] for category in MENU_TREE.keys()
-               ] + [[CUSTOM_QUESTION_BUTTON]]
+    await user_navigation.set(user_id, ROOT_ID)  # Reset navigation state
+    await broadcaster.unblock(user_id)  # снова пишет боту — значит, разблокировал
+    analytics.record(user_id, "start")
 
-    reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
-
-    start_msg = await update.message.reply_text(
+    root = content.current.menu.root
+    start_msg = await reply(
+            update,
             "🩸 Вас приветствует Бот Донорского Движения Пироговского университета\n"
             "Что вас интересует?",
-            reply_markup=reply_markup
+            reply_markup=menu_markup(root)
         )
 
 
-async def show_current_menu(update: Update, path):
-    node = get_node_from_path(path)
-    user_id = update.effective_user.id
-    if node is None:
-        path = ["Main Menu"]
-        node = MENU_TREE
-
-    # Фильтруем только ключи, не начинающиеся с "_"
-    if isinstance(node, dict):
-        visible_keys = [k for k in node.keys() if not k.startswith("_")]
-        keyboard = [[item] for item in visible_keys]
-    else:
-        keyboard = []
+def menu_markup(node):
+    """Keyboard of a menu node for the configured NAVIGATION_MODE"""
+    return node.inline_keyboard if NAVIGATION_MODE == "inline" else node.keyboard
 
-    # Назад / Свой вопрос
-    if len(path) > 1:
-        keyboard.append([BACK_BUTTON])
-    elif len(path) == 1:
-        keyboard.append([CUSTOM_QUESTION_BUTTON])
 
-    reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
+async def reply(update: Update, text, **kwargs):
+    """Send a message to the update's chat through the rate-limited queue"""
+    return await sender.send_message(update.effective_chat.id, text, **kwargs)
 
 
-    # Fallback — send new message with updated keyboard
-    if path[-1] == "Main Menu":
-        message = "Выберите категорию:"
-    else:
-        message = "➤"
+async def show_current_menu(update: Update, node):
+    await reply(update, node.prompt, reply_markup=menu_markup(node))
 
-    await update.message.reply_text(message, reply_markup=reply_markup)
 
-def get_node_from_path(path):
-    """Safe path navigation that preserves your restart logic"""
-    if not path or path[-1] == "Main Menu":
-        return MENU_TREE
+async def send_photo_answer(update, context, answer_key, answer, reply_markup=None):
+    """Send a photo answer, reusing the Telegram file_id after the first upload"""
+    file_id = photo_file_ids.get(answer_key, answer.photo)
+    if file_id is not None:
+        try:
+            return await sender.send_photo(
+                update.effective_chat.id,
+                file_id,
+                caption=answer.caption,
+                parse_mode=answer.parse_mode,
+                reply_markup=reply_markup
+            )
+        except BadRequest as e:
+            # file_id протух — забываем и шлём по URL
+            logger.warning(f"Cached file_id for {answer_key!r} rejected: {e}")
+            await photo_file_ids.discard(answer_key, answer.photo)
+
+    message = await sender.send_photo(
+        update.effective_chat.id,
+        answer.photo,
+        caption=answer.caption,
+        parse_mode=answer.parse_mode,
+        reply_markup=reply_markup
+    )
+    if message.photo:
+        await photo_file_ids.put(answer_key, answer.photo, message.photo[-1].file_id)
+    return message
+
+
+def get_answer(current, answer_key):
+    """Pre-rendered answer; events comes from the calendar once it has loaded"""
+    if answer_key == EVENTS_ANSWER_KEY:
+        answer = events.answer()
+        if answer is not None:
+            return answer
+    return current.answers.get(answer_key)
+
+
+async def send_answer(update, context, answer_key, reply_markup=None):
+    """Send a pre-rendered answer; reply_markup goes on its last message"""
+    answer = get_answer(content.current, answer_key)
+    if answer is None:
+        await reply(update, "Извините, ответ не найден.", reply_markup=reply_markup); return
+    ANSWERS_SENT.inc(answer_key)
 
-    node = MENU_TREE
-    for step in path[1:]:  # Skip "Main Menu"
-        if isinstance(node, dict) and step in node:
-            node = node[step]
-        else:
-            return None
-    return node
+    if answer.photo is not None:
+        await send_photo_answer(update, context, answer_key, answer,
+                                reply_markup=None if answer.chunks else reply_markup)
+    for i, chunk in enumerate(answer.chunks, 1):
+        await reply(update, chunk, parse_mode=answer.parse_mode,
+                    reply_markup=reply_markup if i == len(answer.chunks) else None)
 
 
-def get_answer_from_path(full_path: list) -> str:
-    """Exact path matching for duplicate menu items"""
-    node = MENU_TREE
-    for step in full_path[1:]:  # Skip "Main Menu"
-        if isinstance(node, dict) and step in node:
-            node = node[step]
-        else:
-            return None
-    return ANSWERS.get(node) if isinstance(node, str) else None
+async def open_node(update, context, current, child):
+    """Нажатие на пункт child из меню current"""
+    user_id = update.effective_user.id
+    path = " / ".join(child.path)
+    MENU_TAPS.inc(path)
+    analytics.record(user_id, "tap", path)
+    logger.debug("menu tap", extra={"user": user_id, "node": child.id, "answer": child.answer})
 
-async def send_answer(update, context, answer):
-    if answer is None:
-        await update.message.reply_text("Извините, ответ не найден."); return
-
-    if isinstance(answer, dict):
-        if "photo_url" in answer:
-            await context.bot.send_photo(
-                chat_id=update.effective_chat.id,
-                photo=answer["photo_url"],
-                caption=answer.get("text", "")
-            )
-        else:
-            await update.message.reply_text(answer.get("text", ""), parse_mode='HTML')
-    else:
-        await update.message.reply_text(answer, parse_mode='HTML')
+    # Подменю — входим внутрь, иначе остаёмся в текущем
+    target = child if child.is_menu else current
+    await user_navigation.set(user_id, target.id)
 
+    # Пункт с ответом (конечный или подменю с _answer): клавиатура меню
+    # приходит вместе с ответом, отдельное сообщение «➤» не нужно
+    if child.answer is not None:
+        analytics.record(user_id, "answer", path, child.answer)
+        return await send_answer(update, context, child.answer, reply_markup=menu_markup(target))
+    return await show_current_menu(update, target)
 
+
+@instrument_handler
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     msg = update.message.text
 
     # ── Перезапуск, «Назад», «Свой вопрос»
-    if user_id not in user_navigation:
+    node_id = await user_navigation.get(user_id)
+    if node_id is None:
         await start(update, context); return
-    path = user_navigation[user_id]
+    menu = content.current.menu
+    node = menu.get(node_id)  # узел удалён из контента — вернёмся в главное меню
 
     if msg == BACK_BUTTON:
-        if len(path) > 1: path.pop()
-        return await show_current_menu(update, path)
+        parent = menu.get(node.parent)
+        await user_navigation.set(user_id, parent.id)
+        return await show_current_menu(update, parent)
 
     if msg == CUSTOM_QUESTION_BUTTON:
-        await update.message.reply_text("Данная опция пока находится в разработке")
+        await reply(update, "Данная опция пока находится в разработке")
         return
 
-    # ── Достали текущий узел и проверили, есть ли такой пункт
-    node = get_node_from_path(path)
-    if isinstance(node, dict) and msg in node:
-        next_node = node[msg]
-
-        # ①  Если next_node — dict c _answer  →  присылаем, а затем входим в подменю
-        if isinstance(next_node, dict) and "_answer" in next_node:
-            answer_key = next_node["_answer"]
-            await send_answer(update, context, ANSWERS.get(answer_key))
-            path.append(msg)                    # перейти внутрь
-            return await show_current_menu(update, path)
-
-        # ②  Если next_node — конечная строка‑ключ
-        if isinstance(next_node, str):
-            await send_answer(update, context, ANSWERS.get(next_node))
-            return await show_current_menu(update, path)
-
-        # ③  Обычное подменю‑словарь без _answer
-        if isinstance(next_node, dict):
-            path.append(msg)
-            return await show_current_menu(update, path)
+    # ── Пункт текущего меню
+    child_id = node.children.get(msg)
+    if child_id is not None:
+        return await open_node(update, context, node, menu.nodes[child_id])
 
     # ── Переход из главного меню
-    if msg in MENU_TREE:
-        user_navigation[user_id] = ["Main Menu", msg]
-        return await show_current_menu(update, user_navigation[user_id])
+    root = menu.root
+    child_id = root.children.get(msg)
+    if child_id is not None:
+        return await open_node(update, context, root, menu.nodes[child_id])
+
+    # ── Свободный текст — сначала ищем готовый ответ
+    hit = content.current.search.best(msg)
+    if hit is not None:
+        FREE_TEXT.inc("answered")
+        analytics.record(user_id, "answer", " / ".join(node.path), hit.answer_key)
+        logger.debug("search hit", extra={"user": user_id, "answer": hit.answer_key})
+        return await send_answer(update, context, hit.answer_key, reply_markup=menu_markup(node))
 
     # ── Не распознали — шлём менеджеру
-    if len(path) > 1:
-        return await show_current_menu(update, path)
+    if node.id != ROOT_ID:
+        FREE_TEXT.inc("ignored")
+        return await show_current_menu(update, node)
+    FREE_TEXT.inc("escalated")
+    analytics.record(user_id, "escalation", " / ".join(node.path))
     await forward_to_manager(update, context)
 
 
 async def forward_to_manager(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Forward user's question to manager group"""
     if not MANAGER_GROUP_CHAT_ID:
-        await update.message.reply_text("Извините, сервис временно недоступен.")
+        await reply(update, "Извините, сервис временно недоступен.")
         return
 
     try:
-        user = update.effective_user
-        message = (
-            f"Вопрос от @{user.username}:\n"
-            f"{update.message.text}\n"
+        await manager_forwarder.submit(update.effective_user, update.message.text)
+    except OSError as e:
+        logger.error(f"Error forwarding message: {e}", extra={"user": update.effective_user.id})
+        await reply(
+            update,
+            "❌ Произошла ошибка при отправке вопроса. Пожалуйста, попробуйте позже."
         )
+        return
+    await reply(
+        update,
+        "✅ Ваш вопрос передан менеджеру. Ответ придёт в этот чат.\n"
+        "Вы можете продолжать пользоваться меню ниже:"
+    )
+
+
+@instrument_handler
+async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Инлайн-навигация: id узла приходит в callback_data, сообщение редактируется на месте"""
+    query = update.callback_query
+    if query.data == CUSTOM_QUESTION_CALLBACK:
+        await query.answer("Данная опция пока находится в разработке")
+        return
+    await query.answer()
+
+    current = content.current
+    node = current.menu.get(parse_node_callback(query.data))  # устаревший id -> главное меню
+    # Конечный пункт показываем с клавиатурой меню, в котором он находится
+    target = node if node.is_menu else current.menu.get(node.parent)
+    path = " / ".join(node.path)
+    MENU_TAPS.inc(path)
+    analytics.record(update.effective_user.id, "tap", path)
+
+    text, parse_mode, preview = node.breadcrumb, None, None
+    answer = get_answer(current, node.answer) if node.answer is not None else None
+    extra_chunks = ()
+    if answer is not None:
+        ANSWERS_SENT.inc(node.answer)
+        analytics.record(update.effective_user.id, "answer", path, node.answer)
+        parse_mode = answer.parse_mode
+        text = answer.chunks[0] if answer.chunks else (answer.caption or node.breadcrumb)
+        extra_chunks = answer.chunks[1:]
+        if answer.photo is not None:
+            # Фото в редактируемое сообщение не вставить — показываем его превью ссылки
+            preview = LinkPreviewOptions(url=answer.photo, prefer_large_media=True, show_above_text=True)
 
-        await context.bot.send_message(
-            chat_id=MANAGER_GROUP_CHAT_ID,
-            text=message
-        )
-        await update.message.reply_text(
-            "✅ Ваш вопрос передан менеджеру. Мы ответим вам в ближайшее время.\n"
-            "Вы можете продолжать пользоваться меню ниже:"
-        )
-    except Exception as e:
-        logger.error(f"Error forwarding message: {e}")
-        await update.message.reply_text(
-            "❌ Произошла ошибка при отправке вопроса. Пожалуйста, попробуйте позже."
+    try:
+        await sender.submit(
+            "edit_message_text",
+            chat_id=query.message.chat.id,
+            message_id=query.message.message_id,
+            text=text,
+            parse_mode=parse_mode,
+            link_preview_options=preview,
+            reply_markup=target.inline_keyboard if not extra_chunks else None,
         )
+    except BadRequest as e:
+        if "not modified" in str(e):
+            return  # повторное нажатие на ту же кнопку
+        logger.warning(f"Cannot edit menu message: {e}", extra={"user": update.effective_user.id})
+        await reply(update, text, parse_mode=parse_mode, reply_markup=target.inline_keyboard)
+        return
+    # Ответ длиннее одного сообщения: продолжение и меню — новыми сообщениями
+    for i, chunk in enumerate(extra_chunks, 1):
+        await reply(update, chunk, parse_mode=parse_mode,
+                    reply_markup=target.inline_keyboard if i == len(extra_chunks) else None)
+
+
+@instrument_handler
+async def relay_manager_reply(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Reply to a digest in the manager group goes back to the user who asked"""
+    message = update.message
+    target = message.reply_to_message
+    found = await tickets.find(message.chat_id, target.message_id)
+    if not found:
+        if target.from_user and target.from_user.id == context.bot.id and target.text and "Вопрос от" in target.text:
+            await reply(update, f"Вопрос не найден: ответы принимаются {TICKET_TTL / 86400:.0f} дн. после дайджеста.")
+        return  # обычная переписка менеджеров
+    quote = message.quote.position if message.quote else None
+    ticket, text = choose_ticket(found, message.text_html if message.text else "", quote)
+    if ticket is None:
+        await reply(update, f"В этом дайджесте {len(found)} вопросов: ответьте с цитатой нужного "
+                            f"или начните ответ с его номера, например «#2 …».")
+        return
+    try:
+        if message.text:
+            await sender.send_message(ticket.user_id, f"💬 Ответ менеджера на ваш вопрос:\n\n{text}",
+                                      parse_mode="HTML")
+        else:
+            # Фото, голосовое, документ — как есть
+            await sender.submit("copy_message", chat_id=ticket.user_id, from_chat_id=message.chat_id,
+                                message_id=message.message_id)
+    except Forbidden:
+        await reply(update, f"❌ {ticket.author}: бот заблокирован, ответ на #{ticket.seq} не доставлен.")
+        return
+    except TelegramError as e:
+        logger.error(f"Cannot relay manager reply: {e}", extra={"user": ticket.user_id})
+        await reply(update, f"❌ Не удалось доставить ответ на #{ticket.seq}, попробуйте ещё раз.")
+        return
+    await tickets.mark_answered(ticket)
+    await reply(update, f"✅ Ответ на #{ticket.seq} доставлен: {ticket.author}")
 
 
-async def main():
-    TOKEN = os.getenv("BOT_TOKEN")
-    if not TOKEN:
-        raise ValueError("BOT_TOKEN не найден!")
+@instrument_handler
+async def tickets_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/tickets — открытые вопросы, в группе менеджеров"""
+    if not is_broadcast_admin(update):
+        return
+    count, oldest = await tickets.open_tickets()
+    await reply(update, format_open_tickets(count, oldest), parse_mode="HTML",
+                link_preview_options=LinkPreviewOptions(is_disabled=True))
+
+
+def is_broadcast_admin(update: Update) -> bool:
+    chat = update.effective_chat
+    return bool(MANAGER_GROUP_CHAT_ID) and chat.id == MANAGER_GROUP_CHAT_ID or update.effective_user.id in BROADCAST_ADMINS
+
+
+def format_broadcast(broadcast) -> str:
+    return (
+        f"Рассылка #{broadcast.id}: {broadcast.status}\n"
+        f"Отправлено: {broadcast.sent}, заблокировали бота: {broadcast.blocked}, ошибок: {broadcast.failed}"
+    )
+
 
-    app = Application.builder().token(TOKEN).build()
+@instrument_handler
+async def broadcast_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/broadcast <текст> — из группы менеджеров или от BROADCAST_ADMINS"""
+    if not is_broadcast_admin(update):
+        return
+    parts = update.message.text_html.split(maxsplit=1)
+    if len(parts) < 2:
+        await reply(update, "Использование: /broadcast текст объявления")
+        return
+    text = parts[1]
+    if text_length(text) > MESSAGE_LIMIT:
+        await reply(update, f"Текст длиннее {MESSAGE_LIMIT} символов, сократите его.")
+        return
+    broadcast = await broadcaster.broadcast(text, parse_mode="HTML")
+    audience = ("" if SESSION_STORE_URL not in ("", "memory") else
+                "\nSESSION_STORE_URL не задан: получат только писавшие боту после последнего перезапуска.")
+    await reply(update, f"Рассылка #{broadcast.id} запущена. Прогресс: /broadcast_status {broadcast.id}{audience}")
 
-    # Регистрация обработчиков
+
+@instrument_handler
+async def broadcast_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not is_broadcast_admin(update):
+        return
+    broadcast_id = int(context.args[0]) if context.args and context.args[0].isdigit() else None
+    broadcast = await broadcaster.status(broadcast_id)
+    await reply(update, format_broadcast(broadcast) if broadcast else "Рассылок ещё не было.")
+
+
+@instrument_handler
+async def broadcast_cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not is_broadcast_admin(update):
+        return
+    if not context.args or not context.args[0].isdigit():
+        await reply(update, "Использование: /broadcast_cancel номер")
+        return
+    cancelled = await broadcaster.cancel(int(context.args[0]))
+    await reply(update, "Рассылка остановлена." if cancelled else "Такой идущей рассылки нет.")
+
+
+@instrument_handler
+async def inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Инлайн-режим: @bot плазма — статьи из готового индекса ответов"""
+    results = content.current.inline.search(update.inline_query.query)
+    await update.inline_query.answer(results, cache_time=INLINE_CACHE_TIME, is_personal=False)
+
+
+def register_handlers(app: Application):
+    """Регистрация обработчиков"""
     app.add_handler(CommandHandler("start", start))
-    app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
+    app.add_handler(CommandHandler("broadcast", broadcast_command))
+    app.add_handler(CommandHandler("broadcast_status", broadcast_status))
+    app.add_handler(CommandHandler("broadcast_cancel", broadcast_cancel))
+    app.add_handler(CommandHandler("tickets", tickets_command))
+    # Реплаи менеджеров — до общего обработчика текста; правка уже отправленного ответа не пересылается
+    app.add_handler(MessageHandler(
+        filters.UpdateType.MESSAGE & filters.Chat(MANAGER_GROUP_CHAT_ID) & filters.REPLY & ~filters.COMMAND,
+        relay_manager_reply,
+    ))
+    app.add_handler(MessageHandler(filters.UpdateType.MESSAGE & filters.TEXT & ~filters.COMMAND, handle_message))
+    app.add_handler(InlineQueryHandler(inline_query))
+    app.add_handler(CallbackQueryHandler(handle_callback))
+
+
+def build_application(token: str) -> Application:
+    # BOT_API_POOL_SIZE, BOT_API_KEEPALIVE, BOT_API_HTTP2, BOT_API_URL — see bot_api.py
+    app = configure_builder(Application.builder().token(token)).updater(None).build()
+    register_handlers(app)
+    return app
+
+
+def bot_components(app: Application) -> list:
+    """(start, stop) of every bot component, in start order"""
+    return [
+        (user_navigation.start, user_navigation.close),
+        (app.initialize, app.shutdown),
+        (lambda: sender.start(app.bot), sender.stop),
+        (tickets.start, tickets.close),
+        (manager_forwarder.start, manager_forwarder.stop),
+        (broadcaster.start, broadcaster.stop),
+        (content.start, content.stop),
+        (events.start, events.stop),
+        (analytics.start, analytics.stop),
+        (app.start, app.stop),
+    ]
 
-    # Запуск вебхука
-    await app.initialize()
-    await app.start()
 
+async def start_bot(app: Application, started: list = None):
+    """Запуск всех компонентов бота вокруг Application
+
+    В started добавляется stop каждого запущенного компонента: если запуск
+    прервётся, stop_bot остановит ровно то, что успело запуститься.
+    """
+    started = [] if started is None else started
+    register_gauges()
+    for start_component, stop_component in bot_components(app):
+        await start_component()
+        started.append(stop_component)
+    return started
+
+
+async def stop_bot(app: Application, started: list = None):
+    """Stop started components (all by default) in reverse order"""
+    if started is None:
+        started = [stop_component for _, stop_component in bot_components(app)]
+    while started:
+        stop_component = started.pop()
+        try:
+            await stop_component()
+        except Exception as e:
+            # Остальные всё равно останавливаем: аренды рассылок, сессии, тикеты
+            logger.error(f"Stopping {stop_component} failed: {e}", exc_info=True)
+
+
+def update_processor(app: Application, ready: asyncio.Event = None):
+    """Run the Application's handlers for a raw update and wait for them"""
+    async def process(data: dict):
+        if ready is not None and not ready.is_set():
+            await ready.wait()  # принято до конца запуска: уже в журнале, ждёт start_bot
+        await app.process_update(Update.de_json(data, app.bot))
+    return process
+
+
+async def run_worker(queue, acks, app: Application = None):
+    """Воркер кластера: обрабатывает обновления своего шарда и подтверждает каждое (см. cluster.py)
+
+    Журнал и порядок обновлений одного пользователя — забота основного процесса:
+    следующее обновление пользователя приходит только после подтверждения
+    предыдущего, поэтому обновления разных пользователей обрабатываются параллельно.
+    """
+    if app is None:
+        app = build_application(os.getenv("BOT_TOKEN"))
+    process = update_processor(app)
+    tasks = set()
+
+    async def handle(data: dict):
+        try:
+            await process(data)
+        except Exception as e:
+            # Упавшее обновление тоже подтверждаем: повтор даст ту же ошибку
+            logger.error(f"Update {data['update_id']} failed: {e}", exc_info=True)
+        acks.put(data["update_id"])
+
+    started = []
     try:
-        PORT = int(os.environ.get("PORT", 10000))
-        await app.updater.start_webhook(
-            listen="0.0.0.0",
-            port=PORT,
-            url_path=TOKEN,
-            webhook_url=f"{RENDER_URL}{TOKEN}"
-        )
+        await start_bot(app, started)
+        global startup_seconds
+        startup_seconds = time.perf_counter() - STARTED_AT
+        while True:
+            data = await asyncio.to_thread(queue.get)
+            if data is None:
+                break
+            if isinstance(data, MetricsRequest):
+                # /metrics основного процесса собирается с воркеров
+                acks.put((data, render_all()))
+                continue
+            task = asyncio.create_task(handle(data))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        await asyncio.gather(*tasks)  # дорабатываем полученное до конца
+    finally:
+        await stop_bot(app, started)
+        stop_logging()
 
-        # Бесконечное ожидание через asyncio
-        await asyncio.get_event_loop().create_future()
+
+async def main():
+    TOKEN = os.getenv("BOT_TOKEN")
+    if not TOKEN:
+        raise ValueError("BOT_TOKEN не найден!")
+    if WORKERS > 1 and SESSION_STORE_URL in ("", "memory"):
+        # У каждого воркера была бы своя память: после рестарта или перебалансировки
+        # пользователь оказался бы в начале меню, а рассылка видела бы лишь часть пользователей
+        raise ValueError("WORKERS > 1 требует общего SESSION_STORE_URL (sqlite:///… или postgres://…)")
+    PORT = int(os.environ.get("PORT", 10000))
+    # В кластере обработчики и хранилища — в воркерах, /metrics собирается с них
+    pool = WorkerPool(WORKERS) if WORKERS > 1 else None
+    # TRANSPORT=webhook|polling, POLL_TIMEOUT, POLL_LIMIT — see transport.py
+    transport = create_transport(
+        TRANSPORT, webhook_url=RENDER_URL and f"{RENDER_URL}{TOKEN}",
+        listen="0.0.0.0", port=PORT, url_path=TOKEN,
+        metrics=pool.render_metrics if pool else local_metrics,
+    )
+
+    if WORKERS > 1:
+        # Несколько процессов: этот принимает обновления в журнал и раскладывает их
+        # по воркерам; обработанным обновление становится по подтверждению воркера
+        pool.start()
+        bot = make_bot(TOKEN)
+        await bot.initialize()
+        ingest = UpdateIngest(pool.process, concurrency=INGEST_CONCURRENCY * WORKERS)
+        await ingest.start()
+        sink = ingest.accept
+    else:
+        app = build_application(TOKEN)
+        started = []  # stop запущенных компонентов бота, см. start_bot
+        # Принятые обновления сначала попадают в журнал на диске
+        ready = asyncio.Event()
+        ingest = UpdateIngest(update_processor(app, ready))
+        await ingest.start()
+        bot, sink = app.bot, ingest.accept
+
+    try:
+        if WORKERS > 1:
+            await transport.start(bot, sink)
+        else:
+            # Холодный старт: вебхук принимает обновления в журнал, пока идут
+            # getMe и запуск компонентов; setWebhook и getMe летят одновременно
+            steps = [asyncio.create_task(transport.start(bot, sink)), asyncio.create_task(start_bot(app, started))]
+            try:
+                await asyncio.gather(*steps)
+            finally:
+                # Один шаг упал или нас отменили — второй не должен продолжать в фоне
+                for step in steps:
+                    step.cancel()
+                await asyncio.gather(*steps, return_exceptions=True)
+            ready.set()
+        global startup_seconds
+        startup_seconds = time.perf_counter() - STARTED_AT
+        logger.info(f"Бот готов за {startup_seconds:.2f} с")
+
+        # Работаем, пока идёт приём обновлений и (в кластере) воркеры не падают раз за разом
+        watched = [asyncio.create_task(transport.wait())]
+        if WORKERS > 1:
+            watched.append(asyncio.create_task(pool.supervise()))
+        try:
+            done, _ = await asyncio.wait(watched, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                task.result()
+        finally:
+            for task in watched:
+                task.cancel()
     except asyncio.CancelledError:
         logger.info("Получен сигнал завершения")
     finally:
-        await app.stop()
-        await app.shutdown()
+        await transport.stop()
+        if WORKERS > 1:
+            await ingest.stop()  # неподтверждённое останется в журнале до следующего старта
+            await bot.shutdown()
+            await asyncio.to_thread(pool.stop)
+        else:
+            if ready.is_set():
+                await ingest.stop()
+            else:
+                # Запуск не завершился: принятое остаётся в журнале до следующего старта
+                await ingest.stop(timeout=0)
+            await stop_bot(app, started)  # только то, что успело запуститься
+        stop_logging()
 
 if __name__ == "__main__":
     try:
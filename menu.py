@@ -0,0 +1,123 @@
+"""Компиляция MENU_TREE в плоский индекс узлов.
+
+Дерево меню обходится один раз при старте: каждый узел получает числовой id,
+ссылку на родителя, видимых детей, ключ ответа и готовые клавиатуры:
+обычную (reply) и инлайн, где в callback_data зашит id узла. В обработчиках
+нажатие стоит одного поиска в словаре.
+"""
+import zlib
+from types import MappingProxyType
+from typing import Mapping, NamedTuple, Optional, Tuple
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup
+
+# Styled "Back" button
+BACK_BUTTON = "⬅️ Назад"
+CUSTOM_QUESTION_BUTTON = "Свой вопрос❓"
+
+ROOT_ID = 0
+ROOT_PROMPT = "Выберите категорию:"
+SUBMENU_PROMPT = "➤"
+
+# callback_data инлайн-кнопок: "n:<id узла>" и кнопка «Свой вопрос»
+NODE_CALLBACK_PREFIX = "n:"
+CUSTOM_QUESTION_CALLBACK = "q"
+
+
+class MenuNode(NamedTuple):
+    id: int
+    parent: Optional[int]
+    label: str
+    path: Tuple[str, ...]
+    children: Mapping[str, int]  # видимая подпись кнопки -> id ребёнка
+    answer: Optional[str]  # ключ в ANSWERS
+    keyboard: Optional[ReplyKeyboardMarkup]  # None у конечных пунктов
+    inline_keyboard: Optional[InlineKeyboardMarkup]
+
+    @property
+    def is_menu(self) -> bool:
+        return self.keyboard is not None
+
+    @property
+    def prompt(self) -> str:
+        return ROOT_PROMPT if self.id == ROOT_ID else SUBMENU_PROMPT
+
+    @property
+    def breadcrumb(self) -> str:
+        """Заголовок меню в режиме одного редактируемого сообщения"""
+        return ROOT_PROMPT if self.id == ROOT_ID else f"{SUBMENU_PROMPT} " + " / ".join(self.path)
+
+
+class MenuIndex(NamedTuple):
+    nodes: Mapping[int, MenuNode]
+
+    @property
+    def root(self) -> MenuNode:
+        return self.nodes[ROOT_ID]
+
+    def get(self, node_id) -> MenuNode:
+        """Узел по id; неизвестный id (например, после правки меню) -> корень"""
+        return self.nodes.get(node_id) or self.nodes[ROOT_ID]
+
+
+def node_callback(node_id: int) -> str:
+    return f"{NODE_CALLBACK_PREFIX}{node_id}"
+
+
+def parse_node_callback(data: str) -> Optional[int]:
+    if not data or not data.startswith(NODE_CALLBACK_PREFIX):
+        return None
+    try:
+        return int(data[len(NODE_CALLBACK_PREFIX):])
+    except ValueError:
+        return None
+
+
+def node_id_for(path) -> int:
+    """Стабильный id узла: не зависит от порядка пунктов и переживает рестарт"""
+    if not path:
+        return ROOT_ID
+    return zlib.crc32("\x1f".join(path).encode("utf-8")) & 0x7FFFFFFF
+
+
+def compile_menu(tree: dict) -> MenuIndex:
+    """Flatten a MENU_TREE-style dict into an immutable MenuIndex"""
+    nodes = {}
+    paths = {}
+
+    def visit(label, value, path, parent):
+        node_id = node_id_for(path)
+        if node_id in paths:
+            raise ValueError(f"Коллизия id узла меню: {path!r} и {paths[node_id]!r}")
+        paths[node_id] = path
+
+        if isinstance(value, str):
+            nodes[node_id] = MenuNode(node_id, parent, label, path, MappingProxyType({}), value, None, None)
+            return node_id
+        if not isinstance(value, dict):
+            raise TypeError(f"Недопустимый пункт меню {path!r}: {type(value).__name__}")
+
+        children = {}
+        for child_label, child_value in value.items():
+            if child_label.startswith("_"):
+                continue
+            children[child_label] = visit(child_label, child_value, path + (child_label,), node_id)
+
+        keyboard = [[item] for item in children]
+        keyboard.append([BACK_BUTTON] if path else [CUSTOM_QUESTION_BUTTON])
+        inline = [[InlineKeyboardButton(item, callback_data=node_callback(child))] for item, child in children.items()]
+        if path:
+            inline.append([InlineKeyboardButton(BACK_BUTTON, callback_data=node_callback(parent))])
+        else:
+            inline.append([InlineKeyboardButton(CUSTOM_QUESTION_BUTTON, callback_data=CUSTOM_QUESTION_CALLBACK)])
+        nodes[node_id] = MenuNode(
+            node_id, parent, label, path,
+            MappingProxyType(children),
+            value.get("_answer"),
+            ReplyKeyboardMarkup(keyboard, resize_keyboard=True),
+            InlineKeyboardMarkup(inline),
+        )
+        return node_id
+
+    visit("Main Menu", tree, (), None)
+    return MenuIndex(MappingProxyType(nodes))
@@ -0,0 +1,180 @@
+"""Метрики бота в текстовом формате Prometheus.
+
+Небольшая самодостаточная реализация счётчиков, гистограмм и gauge-функций:
+всё хранится в словарях процесса, отдаётся по GET /metrics веб-сервером
+вебхука (см. webserver.py). При WORKERS > 1 основной процесс собирает тексты
+воркеров и склеивает их через merge_rendered с меткой worker.
+"""
+import functools
+import time
+from typing import Callable, Dict, Iterable, List, Tuple
+
+# Границы корзин в секундах: от долей миллисекунды до таймаутов Bot API
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+_registry: List["_Metric"] = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        _registry.append(self)
+
+    def samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, documentation, labels=()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, *label_values, amount: float = 1):
+        self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def samples(self):
+        for values, count in self._values.items():
+            yield f"{self.name}{_format_labels(self.label_names, values)} {count}"
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+        self._values: Dict[Tuple, list] = {}  # labels -> [counts per bucket..., sum, count]
+
+    def observe(self, value: float, *label_values):
+        state = self._values.get(label_values)
+        if state is None:
+            state = self._values[label_values] = [0] * len(self.buckets) + [0.0, 0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                state[i] += 1
+                break
+        state[-2] += value
+        state[-1] += 1
+
+    def time(self, *label_values):
+        return _Timer(self, label_values)
+
+    def samples(self):
+        for values, state in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                labels = _format_labels(self.label_names, values, f'le="{bound}"')
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.label_names, values, 'le="+Inf"')
+            yield f"{self.name}_bucket{labels} {state[-1]}"
+            yield f"{self.name}_sum{_format_labels(self.label_names, values)} {state[-2]}"
+            yield f"{self.name}_count{_format_labels(self.label_names, values)} {state[-1]}"
+
+
+class Gauge(_Metric):
+    """Gauge whose value is read from a callback at scrape time"""
+    kind = "gauge"
+
+    def __init__(self, name, documentation, read: Callable[[], float]):
+        super().__init__(name, documentation)
+        self.read = read
+
+    def samples(self):
+        yield f"{self.name} {self.read()}"
+
+
+class _Timer:
+    __slots__ = ("histogram", "label_values", "started")
+
+    def __init__(self, histogram, label_values):
+        self.histogram = histogram
+        self.label_values = label_values
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, *self.label_values)
+
+
+def render_all() -> str:
+    return "\n".join(metric.render() for metric in _registry) + "\n"
+
+
+def _add_label(sample: str, name: str, value: str) -> str:
+    end = min(i for i in (sample.find("{"), sample.find(" ")) if i >= 0)
+    label = f'{name}="{_escape(value)}"'
+    if sample[end] == "{":
+        return f"{sample[:end + 1]}{label},{sample[end + 1:]}"
+    return f"{sample[:end]}{{{label}}}{sample[end:]}"
+
+
+def merge_rendered(parts: Dict[str, str], label: str) -> str:
+    """Join render_all() texts of several processes into one, telling them apart by a label"""
+    # Имя семейства -> (HELP и TYPE один раз, сэмплы всех процессов): Prometheus
+    # требует, чтобы строки одного семейства шли подряд
+    families: Dict[str, Tuple[List[str], List[str]]] = {}
+    for value, text in parts.items():
+        family = None
+        for line in text.splitlines():
+            if line.startswith("# "):
+                family = line.split()[2]
+                headers, _ = families.setdefault(family, ([], []))
+                if line not in headers:
+                    headers.append(line)
+            elif line:
+                families[family][1].append(_add_label(line, label, value))
+    return "\n".join("\n".join(headers + samples) for headers, samples in families.values()) + "\n"
+
+
+# ── Метрики бота
+
+HANDLER_SECONDS = Histogram("donorsbot_handler_seconds", "Handler execution time", ["handler"])
+HANDLER_ERRORS = Counter("donorsbot_handler_errors_total", "Handlers that raised", ["handler"])
+BOT_API_SECONDS = Histogram("donorsbot_bot_api_seconds", "Bot API call time", ["method"])
+BOT_API_ERRORS = Counter("donorsbot_bot_api_errors_total", "Failed Bot API calls", ["method", "error"])
+MENU_TAPS = Counter("donorsbot_menu_taps_total", "Menu item taps", ["node"])
+ANSWERS_SENT = Counter("donorsbot_answers_sent_total", "Answers sent", ["answer"])
+FREE_TEXT = Counter("donorsbot_free_text_total", "Free-text questions by outcome", ["outcome"])
+
+
+def instrument_handler(func):
+    """Record execution time and failures of a PTB handler callback"""
+    name = func.__name__
+
+    @functools.wraps(func)
+    async def wrapper(update, context):
+        started = time.perf_counter()
+        try:
+            return await func(update, context)
+        except Exception:
+            HANDLER_ERRORS.inc(name)
+            raise
+        finally:
+            HANDLER_SECONDS.observe(time.perf_counter() - started, name)
+
+    return wrapper
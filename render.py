@@ -0,0 +1,202 @@
+"""Подготовка ответов из ANSWERS к отправке.
+
+Рендер выполняется один раз при импорте (и при перезагрузке контента):
+нормализуем пробелы, проверяем HTML на подмножество тегов Telegram и
+режем длинные ответы на части не длиннее лимита сообщения. В обработчиках
+остаётся только отправить готовый RenderedAnswer.
+"""
+import html
+import logging
+import re
+from html.parser import HTMLParser
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MESSAGE_LIMIT = 4096
+CAPTION_LIMIT = 1024
+
+# Теги и атрибуты, которые принимает Telegram в parse_mode=HTML
+ALLOWED_TAGS = {
+    "b": (), "strong": (), "i": (), "em": (), "u": (), "ins": (),
+    "s": (), "strike": (), "del": (), "tg-spoiler": (), "span": ("class",),
+    "a": ("href",), "code": ("class",), "pre": (), "blockquote": ("expandable",),
+    "tg-emoji": ("emoji-id",),
+}
+ALLOWED_ENTITIES = {"lt", "gt", "amp", "quot"}
+
+_TAG_RE = re.compile(r"(<[^>]*>)")
+_BLANK_LINES_RE = re.compile(r"\n{3,}")
+# Неделимые части текста при разрезе длинного слова: HTML-сущность или один символ
+_ATOM_RE = re.compile(r"&(?:#\d+|#[xX][0-9a-fA-F]+|[a-zA-Z]+);|.", re.S)
+
+
+class RenderError(ValueError):
+    pass
+
+
+class RenderedAnswer(NamedTuple):
+    chunks: Tuple[str, ...]  # сообщения по порядку
+    parse_mode: Optional[str]
+    photo: Optional[str] = None
+    caption: Optional[str] = None
+
+
+def text_length(text: str) -> int:
+    """Length as Telegram counts it: UTF-16 code units of the visible text"""
+    return len(html.unescape(_TAG_RE.sub("", text)).encode("utf-16-le")) // 2
+
+
+def normalize(text: str) -> str:
+    lines = [line.strip(" \t") for line in text.strip().splitlines()]
+    return _BLANK_LINES_RE.sub("\n\n", "\n".join(lines))
+
+
+class _Validator(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        self.stack: List[str] = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag not in ALLOWED_TAGS:
+            raise RenderError(f"недопустимый тег <{tag}>")
+        for name, _ in attrs:
+            if name not in ALLOWED_TAGS[tag]:
+                raise RenderError(f"недопустимый атрибут {name!r} у <{tag}>")
+        if tag == "a" and not dict(attrs).get("href"):
+            raise RenderError("<a> без href")
+        self.stack.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        raise RenderError(f"самозакрывающийся тег <{tag}/>")
+
+    def handle_endtag(self, tag):
+        if not self.stack or self.stack[-1] != tag:
+            raise RenderError(f"непарный закрывающий тег </{tag}>")
+        self.stack.pop()
+
+    def handle_entityref(self, name):
+        if name not in ALLOWED_ENTITIES:
+            raise RenderError(f"неподдерживаемая сущность &{name};")
+
+    def handle_data(self, data):
+        # одиночный ">" Telegram принимает, "<" — нет
+        if "<" in data:
+            raise RenderError("неэкранированный символ <")
+
+    def close(self):
+        super().close()
+        if self.stack:
+            raise RenderError(f"незакрытый тег <{self.stack[-1]}>")
+
+
+def validate_html(text: str):
+    """Raise RenderError if text is not valid Telegram HTML"""
+    parser = _Validator()
+    parser.feed(text)
+    parser.close()
+
+
+def _tag_name(tag: str) -> str:
+    return tag.strip("</>").split()[0].lower()
+
+
+def split_html(text: str, limit: int = MESSAGE_LIMIT) -> List[str]:
+    """Split valid HTML into chunks of at most `limit` visible characters.
+
+    Режем по строкам (или по словам, если строка сама длиннее лимита);
+    открытые на месте разреза теги закрываются и открываются заново в
+    следующей части, так что каждая часть остаётся валидной.
+    """
+    if text_length(text) <= limit:
+        return [text] if text else []
+
+    pieces = []
+    for token in _TAG_RE.split(text):
+        if not token:
+            continue
+        if token.startswith("<"):
+            pieces.append(token)
+            continue
+        for line in token.splitlines(keepends=True):
+            if text_length(line) <= limit:
+                pieces.append(line)
+            else:
+                pieces.extend(re.findall(r"\S+\s*|\s+", line))
+
+    chunks = []
+    current: List[str] = []
+    size = 0
+    open_tags: List[str] = []  # полные открывающие теги
+
+    def cut():
+        nonlocal current, size
+        body = "".join(current) + "".join(f"</{_tag_name(t)}>" for t in reversed(open_tags))
+        if body.strip():
+            chunks.append(body.strip())
+        current = list(open_tags)
+        size = 0
+
+    for piece in pieces:
+        if piece.startswith("<"):
+            if piece.startswith("</"):
+                open_tags.pop()
+            else:
+                open_tags.append(piece)
+            current.append(piece)
+            continue
+        length = text_length(piece)
+        if size + length > limit and size:
+            cut()
+        if length > limit:
+            # одно «слово» длиннее лимита — режем по символам, не разрывая сущности вроде &amp;
+            part: List[str] = []
+            for atom in _ATOM_RE.findall(piece):
+                atom_size = text_length(atom)
+                if size + atom_size > limit:
+                    current.append("".join(part))
+                    part = []
+                    cut()
+                part.append(atom)
+                size += atom_size
+            current.append("".join(part))
+            continue
+        current.append(piece)
+        size += length
+    cut()
+    return chunks
+
+
+def render_answer(answer) -> RenderedAnswer:
+    """Render one ANSWERS value; raises RenderError on invalid HTML"""
+    if isinstance(answer, dict):
+        text = normalize(answer.get("text", ""))
+        photo = answer.get("photo_url")
+    else:
+        text = normalize(answer)
+        photo = None
+    if text:
+        validate_html(text)
+
+    if photo is None:
+        return RenderedAnswer(tuple(split_html(text)), "HTML")
+    if text_length(text) <= CAPTION_LIMIT:
+        return RenderedAnswer((), "HTML", photo, text or None)
+    # Текст не помещается в подпись — фото без подписи, затем текст сообщениями
+    return RenderedAnswer(tuple(split_html(text)), "HTML", photo, None)
+
+
+def render_answers(answers: Dict[str, object], strict: bool = False) -> Dict[str, RenderedAnswer]:
+    """Render all answers once; invalid HTML is sent as plain text unless strict"""
+    rendered = {}
+    for key, answer in answers.items():
+        try:
+            rendered[key] = render_answer(answer)
+        except RenderError as e:
+            if strict:
+                raise RenderError(f"{key}: {e}") from e
+            logger.error(f"Answer {key!r} has invalid HTML, sending as plain text: {e}")
+            text = answer.get("text", "") if isinstance(answer, dict) else answer
+            text = normalize(_TAG_RE.sub("", text))
+            rendered[key] = RenderedAnswer(tuple(split_html(text)), None, answer.get("photo_url") if isinstance(answer, dict) else None)
+    return rendered
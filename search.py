@@ -0,0 +1,267 @@
+"""Полнотекстовый поиск по ответам для вопросов свободным текстом.
+
+Индекс строится вместе с контентом (см. content.compile_content): текст
+ответа без разметки плюс подписи пунктов меню, которые к нему ведут.
+Слова приводятся к основе стеммером Портера для русского языка (Snowball),
+ранжирование — BM25, где вклад слова пропорционален idf², а не idf: одно
+редкое слово вопроса («антибиотики») весит больше пары общих.
+
+Бот отвечает сам, только если лучший ответ покрывает не меньше
+SEARCH_MIN_CONFIDENCE веса вопроса, совпавшие слова весят не меньше
+SEARCH_MIN_WEIGHT (одни общие слова вроде «сдать кровь» не в счёт) и он
+набирает в SEARCH_MIN_MARGIN раз больше второго кандидата; иначе вопрос
+уходит менеджерам. Приветствия, вежливые слова и «сдать кровь» (о донорстве
+все вопросы) не учитываются; незнакомое слово сначала ищется как начало
+слов индекса («гепатит» и «гепатитов» стеммер приводит к разным основам),
+а если не нашлось — весит как слово из одного ответа. Проверка на размеченных
+вопросах: python -m bench.search_check.
+"""
+import bisect
+import math
+import os
+import re
+from collections import Counter, defaultdict
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+SEARCH_MIN_CONFIDENCE = float(os.getenv("SEARCH_MIN_CONFIDENCE", 0.5))
+SEARCH_MIN_WEIGHT = float(os.getenv("SEARCH_MIN_WEIGHT", 6.0))  # сумма idf² совпавших слов
+SEARCH_MIN_MARGIN = float(os.getenv("SEARCH_MIN_MARGIN", 1.2))  # во сколько раз лучший впереди второго
+MIN_PREFIX = 5  # букв основы для поиска незнакомого слова по началу
+LABEL_WEIGHT = 3  # слова из подписей кнопок важнее слов из текста ответа
+MIN_ANSWER_WORDS = 8  # заглушки вроде «Ответ находится в разработке» не индексируем
+
+_WORD_RE = re.compile(r"[a-zа-яё0-9]+")
+_TAG_RE = re.compile(r"<[^>]*>")
+
+STOP_WORDS = frozenset("""
+и в во не что он на я с со как а то все она так его но да ты к у же вы за бы по только ее мне
+было вот от меня еще нет о из ему теперь когда даже ну вдруг ли если уже или ни быть был него
+до вас нибудь опять уж вам ведь там потом себя ничего ей может они тут где есть надо ней для мы
+тебя их чем была сам чтоб без будто чего раз тоже себе под будет ж тогда кто этот того потому
+этого какой совсем ним здесь этом один почти мой тем чтобы нее сейчас были куда зачем всех
+никогда можно при наконец два об другой хоть после над больше тот через эти нас про всего
+них какая много разве три эту моя впрочем хорошо свою этой перед иногда лучше чуть том нельзя
+такой им более всегда конечно всю между это
+""".split()) | frozenset("""
+здравствуйте здравствуй привет добрый доброе доброго вечер утро пожалуйста подскажите скажите
+спасибо благодарю большое хочу хотел хотела хотелось узнать интересует вопрос могу могла мог
+сколько стать какие какое каких сделать сделал сделала делать
+""".split()) | frozenset("""
+сдать сдавать сдаю сдала сдал сдачи сдача сдаче сдачу кровь крови кровью донор донора донором
+доноров донорам донору донация донации донацию донацией
+""".split())  # приветствия и вежливость; «сдать кровь донором» — контекст любого вопроса, а не тема
+
+
+# ── Стеммер Snowball для русского языка
+
+_VOWELS = "аеиоуыэюя"
+_PERFECTIVE_GERUND_1 = ("вшись", "вши", "в")  # после а/я
+_PERFECTIVE_GERUND_2 = ("ывшись", "ившись", "ывши", "ивши", "ыв", "ив")
+_ADJECTIVE = ("ими", "ыми", "его", "ого", "ему", "ому", "ее", "ие", "ые", "ое", "ей", "ий", "ый", "ой",
+              "ем", "им", "ым", "ом", "их", "ых", "ую", "юю", "ая", "яя", "ою", "ею")
+_PARTICIPLE_1 = ("ем", "нн", "вш", "ющ", "щ")  # после а/я
+_PARTICIPLE_2 = ("ивш", "ывш", "ующ")
+_REFLEXIVE = ("ся", "сь")
+_VERB_1 = ("ете", "йте", "ешь", "нно", "ла", "на", "ли", "ем", "ло", "но", "ет", "ют", "ны", "ть",
+           "й", "л", "н")  # после а/я
+_VERB_2 = ("ейте", "уйте", "ила", "ыла", "ена", "ите", "или", "ыли", "ило", "ыло", "ено", "ят", "ует",
+           "уют", "ит", "ыт", "ены", "ить", "ыть", "ишь", "ую", "ю", "ей", "уй", "ил", "ыл", "им",
+           "ым", "ен", "ят", "ит", "ыт", "у")
+_NOUN = ("иями", "ями", "ами", "ией", "иям", "ием", "иях", "ев", "ов", "ие", "ье", "еи", "ии", "ей",
+         "ой", "ий", "ям", "ем", "ам", "ом", "ах", "ях", "ию", "ью", "ия", "ья", "а", "е", "и", "й",
+         "о", "у", "ы", "ь", "ю", "я")
+_SUPERLATIVE = ("ейше", "ейш")
+_DERIVATIONAL = ("ость", "ост")
+
+
+def _sorted(suffixes):
+    return tuple(sorted(suffixes, key=len, reverse=True))
+
+
+_PERFECTIVE_GERUND_1, _PERFECTIVE_GERUND_2 = _sorted(_PERFECTIVE_GERUND_1), _sorted(_PERFECTIVE_GERUND_2)
+_ADJECTIVE, _VERB_1, _VERB_2, _NOUN = _sorted(_ADJECTIVE), _sorted(_VERB_1), _sorted(_VERB_2), _sorted(_NOUN)
+_PARTICIPLE_1, _PARTICIPLE_2 = _sorted(_PARTICIPLE_1), _sorted(_PARTICIPLE_2)
+
+
+def _strip(word: str, suffixes, preceded_by_a: bool = False) -> Optional[str]:
+    for suffix in suffixes:
+        if word.endswith(suffix):
+            stem = word[:-len(suffix)]
+            if preceded_by_a and not stem.endswith(("а", "я")):
+                continue
+            return stem
+    return None
+
+
+def _strip_any(word: str, group1, group2) -> Optional[str]:
+    """Longest matching suffix across both groups; group1 needs а/я before it"""
+    best = None
+    for suffixes, needs_a in ((group1, True), (group2, False)):
+        stem = _strip(word, suffixes, needs_a)
+        if stem is not None and (best is None or len(stem) < len(best)):
+            best = stem
+    return best
+
+
+def _region_start(word: str, start: int) -> int:
+    """Start of the region after the first non-vowel that follows a vowel"""
+    for i in range(start, len(word) - 1):
+        if word[i] in _VOWELS and word[i + 1] not in _VOWELS:
+            return i + 2
+    return len(word)
+
+
+def stem(word: str) -> str:
+    word = word.lower().replace("ё", "е")
+    rv_start = next((i + 1 for i, ch in enumerate(word) if ch in _VOWELS), len(word))
+    r2_start = _region_start(word, _region_start(word, 0))
+    prefix, rv = word[:rv_start], word[rv_start:]
+
+    # Шаг 1
+    result = _strip_any(rv, _PERFECTIVE_GERUND_1, _PERFECTIVE_GERUND_2)
+    if result is not None:
+        rv = result
+    else:
+        if rv.endswith(_REFLEXIVE):
+            rv = _strip(rv, _REFLEXIVE)
+        result = _strip(rv, _ADJECTIVE)
+        if result is not None:
+            rv = _strip_any(result, _PARTICIPLE_1, _PARTICIPLE_2) or result
+        else:
+            result = _strip_any(rv, _VERB_1, _VERB_2)
+            if result is not None:
+                rv = result
+            elif rv.endswith(_NOUN):
+                rv = _strip(rv, _NOUN)
+
+    # Шаг 2
+    if rv.endswith("и"):
+        rv = rv[:-1]
+
+    # Шаг 3: словообразовательные суффиксы только в R2
+    r2_in_rv = max(0, r2_start - rv_start)
+    for suffix in _DERIVATIONAL:
+        if rv.endswith(suffix) and len(rv) - len(suffix) >= r2_in_rv:
+            rv = rv[:-len(suffix)]
+            break
+
+    # Шаг 4
+    if rv.endswith("нн"):
+        rv = rv[:-1]
+    else:
+        result = _strip(rv, _SUPERLATIVE)
+        if result is not None:
+            rv = result[:-1] if result.endswith("нн") else result
+        elif rv.endswith("ь"):
+            rv = rv[:-1]
+    return prefix + rv
+
+
+def tokenize(text: str) -> List[str]:
+    words = _WORD_RE.findall(_TAG_RE.sub(" ", text).lower().replace("ё", "е"))
+    return [stem(w) for w in words if w not in STOP_WORDS and len(w) > 1]
+
+
+# ── Индекс BM25
+
+class SearchHit(NamedTuple):
+    answer_key: str
+    score: float
+    confidence: float  # доля веса запроса (сумма idf²), найденная в ответе
+    weight: float = 0.0  # сама найденная сумма idf²
+
+
+class SearchIndex:
+    K1 = 1.5
+    B = 0.75
+
+    def __init__(self, documents: Dict[str, str]):
+        self.keys: List[str] = []
+        self.lengths: List[int] = []
+        self.postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        for key, text in documents.items():
+            terms = tokenize(text)
+            doc = len(self.keys)
+            self.keys.append(key)
+            self.lengths.append(len(terms))
+            for term, tf in Counter(terms).items():
+                self.postings[term].append((doc, tf))
+        self.postings = dict(self.postings)
+        n = len(self.keys)
+        self.avg_length = (sum(self.lengths) / n) if n else 0.0
+        self.idf = {
+            term: math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+            for term, docs in self.postings.items()
+        }
+        # Незнакомое слово весит как слово из одного ответа, а не больше любого знакомого
+        self.unknown_idf = math.log(1 + (n - 0.5) / 1.5) if n else 0.0
+        self._vocabulary = sorted(self.postings)
+
+    def _expand(self, term: str) -> List[str]:
+        """Index terms a query term stands for: itself, or index terms starting with it"""
+        if term in self.postings:
+            return [term]
+        if len(term) < MIN_PREFIX:
+            return []
+        # Слова индекса, которые начинаются с основы вопроса; обратно — только если
+        # стеммер не снял гласную («завтрака» → «завтрак»), а не часть корня («выходн» ≠ «выход»)
+        found = [term[:-1]] if term[-1] in _VOWELS and term[:-1] in self.postings else []
+        i = bisect.bisect_left(self._vocabulary, term)
+        while i < len(self._vocabulary) and self._vocabulary[i].startswith(term):
+            found.append(self._vocabulary[i])
+            i += 1
+        return found
+
+    def search(self, query: str, limit: int = 3) -> List[SearchHit]:
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+        scores: Dict[int, float] = defaultdict(float)
+        matched: Dict[int, float] = defaultdict(float)
+        total_weight = 0.0
+        for term in terms:
+            expanded = self._expand(term)
+            if not expanded:
+                total_weight += self.unknown_idf ** 2
+                continue
+            # Вес слова — idf²: редкие слова вопроса («прививки») важнее общих («кровь»);
+            # для слова, найденного по началу, — по самому редкому из найденных
+            total_weight += max(self.idf[t] for t in expanded) ** 2
+            best_in_doc: Dict[int, Tuple[float, float]] = {}
+            for index_term in expanded:
+                idf = self.idf[index_term]
+                for doc, tf in self.postings[index_term]:
+                    norm = 1 - self.B + self.B * self.lengths[doc] / self.avg_length
+                    score = idf ** 2 * tf * (self.K1 + 1) / (tf + self.K1 * norm)
+                    if doc not in best_in_doc or score > best_in_doc[doc][0]:
+                        best_in_doc[doc] = (score, idf ** 2)
+            for doc, (score, weight) in best_in_doc.items():
+                scores[doc] += score
+                matched[doc] += weight
+        best = sorted(scores, key=scores.get, reverse=True)[:limit]
+        return [SearchHit(self.keys[d], scores[d], matched[d] / total_weight, matched[d]) for d in best]
+
+    def best(self, query: str, min_confidence: float = SEARCH_MIN_CONFIDENCE,
+             min_weight: float = SEARCH_MIN_WEIGHT, min_margin: float = SEARCH_MIN_MARGIN) -> Optional[SearchHit]:
+        """Top hit if it covers the question, matched distinctive words and is clearly ahead"""
+        hits = self.search(query, limit=2)
+        if not hits or hits[0].confidence < min_confidence or hits[0].weight < min_weight:
+            return None
+        if len(hits) > 1 and hits[0].score < hits[1].score * min_margin:
+            return None  # близкие кандидаты — пусть решит менеджер
+        return hits[0]
+
+
+def build_search_index(menu, raw_answers: dict) -> SearchIndex:
+    """Index answer texts together with the menu labels that lead to them"""
+    labels = defaultdict(list)
+    for node in menu.nodes.values():
+        if node.answer is not None:
+            labels[node.answer].extend(node.path)
+    documents = {}
+    for key, answer in raw_answers.items():
+        text = answer.get("text", "") if isinstance(answer, dict) else answer
+        if len(tokenize(text)) < MIN_ANSWER_WORDS:
+            continue
+        documents[key] = " ".join(labels[key] * LABEL_WEIGHT) + " " + text
+    return SearchIndex(documents)
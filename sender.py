@@ -0,0 +1,233 @@
+"""Очередь исходящих сообщений с лимитами Telegram.
+
+Все вызовы Bot API, которые шлют сообщения, идут через SendScheduler:
+- общий token bucket на бота (около 30 сообщений в секунду);
+- token bucket на каждый чат (личные чаты ~1/с с небольшим запасом,
+  группы — 20 в минуту);
+- сообщения одного чата уходят строго по порядку;
+- RetryAfter откладывает чат на указанное Telegram время, сетевые ошибки
+  повторяются с экспоненциальной задержкой.
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Optional
+
+from telegram.error import BadRequest, NetworkError, RetryAfter, TimedOut
+
+from metrics import BOT_API_ERRORS, BOT_API_SECONDS
+
+logger = logging.getLogger(__name__)
+
+GLOBAL_RATE = float(os.getenv("SEND_GLOBAL_RATE", 30))  # сообщений в секунду на бота
+CHAT_RATE = float(os.getenv("SEND_CHAT_RATE", 1))  # в секунду на личный чат
+CHAT_BURST = float(os.getenv("SEND_CHAT_BURST", 3))
+GROUP_RATE = float(os.getenv("SEND_GROUP_RATE", 20 / 60))  # в секунду на группу
+GROUP_BURST = float(os.getenv("SEND_GROUP_BURST", 3))
+SEND_WORKERS = int(os.getenv("SEND_WORKERS", 32))
+SEND_MAX_ATTEMPTS = int(os.getenv("SEND_MAX_ATTEMPTS", 5))
+MAX_TRACKED_CHATS = 50_000
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated", "blocked_until")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: Optional[float] = None) -> float:
+        """Seconds until one token is available (0 if available now)"""
+        now = time.monotonic() if now is None else now
+        self._refill(now)
+        wait = 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+        return max(wait, self.blocked_until - now)
+
+    def consume(self):
+        self.tokens -= 1
+
+    def block(self, seconds: float):
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+class _Job:
+    __slots__ = ("method", "kwargs", "future", "attempts")
+
+    def __init__(self, method, kwargs, future):
+        self.method = method
+        self.kwargs = kwargs
+        self.future = future
+        self.attempts = 0
+
+
+class SendScheduler:
+    def __init__(self, workers: int = SEND_WORKERS):
+        self.bot = None
+        self.workers = workers
+        # Доля воркера (cluster.split_budgets) может быть меньше 1/с, но копить нужно хотя бы токен
+        self.global_bucket = TokenBucket(GLOBAL_RATE, max(GLOBAL_RATE, 1))
+        self._chat_buckets: "OrderedDict[int, TokenBucket]" = OrderedDict()
+        self._queues: Dict[int, Deque[_Job]] = {}
+        self._ready: Optional[asyncio.Queue] = None
+        self._tasks = []
+        self.pending = 0
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+
+    # ── публичный интерфейс
+
+    async def send_message(self, chat_id: int, text: str, **kwargs):
+        return await self.submit("send_message", chat_id=chat_id, text=text, **kwargs)
+
+    async def send_photo(self, chat_id: int, photo, **kwargs):
+        return await self.submit("send_photo", chat_id=chat_id, photo=photo, **kwargs)
+
+    async def submit(self, method: str, **kwargs):
+        """Queue a Bot API call and wait for its result"""
+        future = asyncio.get_running_loop().create_future()
+        chat_id = kwargs["chat_id"]
+        queue = self._queues.get(chat_id)
+        if queue is None:
+            queue = self._queues[chat_id] = deque()
+            self._ready.put_nowait(chat_id)
+        queue.append(_Job(method, kwargs, future))
+        self.pending += 1
+        return await future
+
+    @property
+    def queue_depth(self) -> int:
+        return self.pending
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self.pending,
+            "chats_waiting": len(self._queues),
+            "sent": self.sent,
+            "retried": self.retried,
+            "failed": self.failed,
+        }
+
+    async def start(self, bot):
+        self.bot = bot
+        self._ready = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self, timeout: float = 10):
+        """Дождаться отправки очереди (не дольше timeout) и остановить воркеров"""
+        deadline = time.monotonic() + timeout
+        while self.pending and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        for queue in self._queues.values():
+            for job in queue:
+                job.future.cancel()
+        self._queues.clear()
+        self.pending = 0
+
+    # ── внутреннее
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            # Отрицательные id — группы и каналы
+            if chat_id < 0:
+                bucket = TokenBucket(GROUP_RATE, GROUP_BURST)
+            else:
+                bucket = TokenBucket(CHAT_RATE, CHAT_BURST)
+            self._chat_buckets[chat_id] = bucket
+            while len(self._chat_buckets) > MAX_TRACKED_CHATS:
+                self._chat_buckets.popitem(last=False)
+        else:
+            self._chat_buckets.move_to_end(chat_id)
+        return bucket
+
+    def _requeue(self, chat_id: int, delay: float):
+        asyncio.get_running_loop().call_later(delay, self._ready.put_nowait, chat_id)
+
+    async def _worker(self):
+        while True:
+            chat_id = await self._ready.get()
+            queue = self._queues[chat_id]
+            job = queue[0]
+
+            bucket = self._chat_bucket(chat_id)
+            wait = bucket.delay()
+            if wait > 0:
+                self._requeue(chat_id, wait)
+                continue
+            wait = self.global_bucket.delay()
+            while wait > 0:
+                await asyncio.sleep(wait)
+                wait = self.global_bucket.delay()
+            self.global_bucket.consume()
+            bucket.consume()
+
+            job.attempts += 1
+            try:
+                result = await self._call(job)
+            except RetryAfter as e:
+                retry_after = e.retry_after.total_seconds() if hasattr(e.retry_after, "total_seconds") else e.retry_after
+                logger.warning(f"Flood limit for chat {chat_id}, retry in {retry_after}s")
+                if self._retry(chat_id, job, e):
+                    bucket.block(retry_after)
+                    self._requeue(chat_id, retry_after)
+                continue
+            except BadRequest as e:
+                # ошибка в самом запросе — повтор не поможет
+                self._finish(chat_id, job, error=e)
+                continue
+            except (TimedOut, NetworkError) as e:
+                if self._retry(chat_id, job, e):
+                    self._requeue(chat_id, min(2 ** job.attempts * 0.5, 30))
+                continue
+            except Exception as e:
+                self._finish(chat_id, job, error=e)
+                continue
+            self._finish(chat_id, job, result=result)
+
+    async def _call(self, job):
+        started = time.perf_counter()
+        try:
+            return await getattr(self.bot, job.method)(**job.kwargs)
+        except Exception as e:
+            BOT_API_ERRORS.inc(job.method, type(e).__name__)
+            raise
+        finally:
+            BOT_API_SECONDS.observe(time.perf_counter() - started, job.method)
+
+    def _retry(self, chat_id, job, error) -> bool:
+        if job.attempts >= SEND_MAX_ATTEMPTS:
+            self._finish(chat_id, job, error=error)
+            return False
+        self.retried += 1
+        return True
+
+    def _finish(self, chat_id, job, result=None, error=None):
+        queue = self._queues[chat_id]
+        queue.popleft()
+        self.pending -= 1
+        if error is None:
+            self.sent += 1
+            if not job.future.done():
+                job.future.set_result(result)
+        else:
+            self.failed += 1
+            if not job.future.done():
+                job.future.set_exception(error)
+        if queue:
+            self._ready.put_nowait(chat_id)
+        else:
+            del self._queues[chat_id]
@@ -0,0 +1,252 @@
+"""Хранилище навигации пользователей {user_id: node_id}.
+
+MemorySessionStore — ограниченный LRU/TTL-кэш в памяти процесса.
+WriteBehindSessionStore — тот же кэш поверх постоянного бэкенда (SQLite или
+Postgres); запись в бэкенд идёт пачками в фоне и не стоит на пути ответа.
+"""
+import asyncio
+import heapq
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SESSION_STORE_URL = os.getenv("SESSION_STORE_URL", "")  # "", sqlite:///path.db, postgres://...
+SESSION_MAX_USERS = int(os.getenv("SESSION_MAX_USERS", 100_000))
+SESSION_TTL = float(os.getenv("SESSION_TTL", 7 * 24 * 3600))  # секунды
+SESSION_FLUSH_INTERVAL = float(os.getenv("SESSION_FLUSH_INTERVAL", 2.0))
+
+
+class MemorySessionStore:
+    """Bounded in-memory LRU store with per-entry TTL"""
+
+    def __init__(self, max_size: int = SESSION_MAX_USERS, ttl: float = SESSION_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data: "OrderedDict[int, Tuple[int, float]]" = OrderedDict()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get_cached(self, user_id: int) -> Optional[int]:
+        entry = self._data.get(user_id)
+        if entry is None:
+            return None
+        node_id, expires = entry
+        if expires < time.monotonic():
+            del self._data[user_id]
+            return None
+        self._data.move_to_end(user_id)
+        return node_id
+
+    def set_cached(self, user_id: int, node_id: int):
+        self._data[user_id] = (node_id, time.monotonic() + self.ttl)
+        self._data.move_to_end(user_id)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    async def get(self, user_id: int) -> Optional[int]:
+        return self.get_cached(user_id)
+
+    async def user_ids_after(self, after: int, limit: int) -> List[int]:
+        """Known user ids greater than after, ascending (keyset pagination for broadcasts)"""
+        now = time.monotonic()
+        return heapq.nsmallest(limit, (u for u, (_, expires) in self._data.items() if u > after and expires >= now))
+
+    async def set(self, user_id: int, node_id: int):
+        self.set_cached(user_id, node_id)
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+
+class SQLiteBackend:
+    """Persistent sessions in a local SQLite file (for local runs and tests)"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()  # одно соединение на все потоки to_thread
+
+    def _connect(self):
+        # timeout: при WORKERS > 1 файл пишут несколько процессов, ждём, а не падаем
+        conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " user_id INTEGER PRIMARY KEY,"
+            " node_id INTEGER NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        conn.commit()
+        return conn
+
+    async def open(self):
+        self._conn = await asyncio.to_thread(self._connect)
+
+    def _close(self):
+        with self._lock:
+            self._conn.close()
+
+    async def close(self):
+        if self._conn is not None:
+            await asyncio.to_thread(self._close)
+            self._conn = None
+
+    def _load(self, user_id):
+        with self._lock:
+            row = self._conn.execute("SELECT node_id FROM sessions WHERE user_id = ?", (user_id,)).fetchone()
+        return row[0] if row else None
+
+    async def load(self, user_id: int) -> Optional[int]:
+        return await asyncio.to_thread(self._load, user_id)
+
+    def _user_ids_after(self, after, limit):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT user_id FROM sessions WHERE user_id > ? ORDER BY user_id LIMIT ?", (after, limit)
+            ).fetchall()
+        return [user_id for user_id, in rows]
+
+    async def user_ids_after(self, after: int, limit: int) -> List[int]:
+        return await asyncio.to_thread(self._user_ids_after, after, limit)
+
+    def _save_many(self, items):
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO sessions (user_id, node_id, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(user_id) DO UPDATE SET node_id = excluded.node_id, updated_at = excluded.updated_at",
+                [(user_id, node_id, now) for user_id, node_id in items],
+            )
+            self._conn.commit()
+
+    async def save_many(self, items: Iterable[Tuple[int, int]]):
+        await asyncio.to_thread(self._save_many, list(items))
+
+
+class PostgresBackend:
+    """Persistent sessions in Postgres via asyncpg"""
+
+    def __init__(self, dsn: str):
+        self.dsn = dsn
+        self._pool = None
+
+    async def open(self):
+        import asyncpg
+
+        self._pool = await asyncpg.create_pool(self.dsn, min_size=1, max_size=4)
+        await self._pool.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " user_id BIGINT PRIMARY KEY,"
+            " node_id INTEGER NOT NULL,"
+            " updated_at TIMESTAMPTZ NOT NULL DEFAULT now())"
+        )
+
+    async def close(self):
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+
+    async def load(self, user_id: int) -> Optional[int]:
+        return await self._pool.fetchval("SELECT node_id FROM sessions WHERE user_id = $1", user_id)
+
+    async def user_ids_after(self, after: int, limit: int) -> List[int]:
+        rows = await self._pool.fetch(
+            "SELECT user_id FROM sessions WHERE user_id > $1 ORDER BY user_id LIMIT $2", after, limit
+        )
+        return [row["user_id"] for row in rows]
+
+    async def save_many(self, items: Iterable[Tuple[int, int]]):
+        await self._pool.executemany(
+            "INSERT INTO sessions (user_id, node_id, updated_at) VALUES ($1, $2, now()) "
+            "ON CONFLICT (user_id) DO UPDATE SET node_id = excluded.node_id, updated_at = now()",
+            list(items),
+        )
+
+
+class WriteBehindSessionStore(MemorySessionStore):
+    """LRU cache in front of a persistent backend with batched background writes"""
+
+    def __init__(self, backend, flush_interval: float = SESSION_FLUSH_INTERVAL, **kwargs):
+        super().__init__(**kwargs)
+        self.backend = backend
+        self.flush_interval = flush_interval
+        self._dirty: Dict[int, int] = {}
+        self._task = None
+
+    async def get(self, user_id: int) -> Optional[int]:
+        node_id = self.get_cached(user_id)
+        if node_id is not None:
+            return node_id
+        node_id = self._dirty.get(user_id)
+        if node_id is None:
+            # Промах кэша — только первое нажатие после рестарта или вытеснения
+            try:
+                node_id = await self.backend.load(user_id)
+            except Exception as e:
+                logger.error(f"Session load failed for {user_id}: {e}")
+                return None
+        if node_id is not None:
+            self.set_cached(user_id, node_id)
+        return node_id
+
+    async def set(self, user_id: int, node_id: int):
+        self.set_cached(user_id, node_id)
+        self._dirty[user_id] = node_id
+
+    async def user_ids_after(self, after: int, limit: int) -> List[int]:
+        # Бэкенд знает всех пользователей, кэш — только недавних
+        await self.flush()
+        return await self.backend.user_ids_after(after, limit)
+
+    async def flush(self):
+        if not self._dirty:
+            return
+        batch, self._dirty = self._dirty, {}
+        try:
+            await self.backend.save_many(batch.items())
+        except Exception as e:
+            logger.error(f"Session flush failed ({len(batch)} entries): {e}")
+            # Возвращаем в очередь, не затирая более свежие значения
+            batch.update(self._dirty)
+            self._dirty = batch
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def start(self):
+        await self.backend.open()
+        self._task = asyncio.create_task(self._flush_loop())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        await self.backend.close()
+
+
+def create_session_store(url: str = SESSION_STORE_URL):
+    """Pick a session store backend from SESSION_STORE_URL"""
+    if not url or url == "memory":
+        return MemorySessionStore()
+    if url.startswith("sqlite:///"):
+        return WriteBehindSessionStore(SQLiteBackend(url[len("sqlite:///"):]))
+    if url.startswith(("postgres://", "postgresql://")):
+        return WriteBehindSessionStore(PostgresBackend(url))
+    raise ValueError(f"Неизвестный SESSION_STORE_URL: {url}")
@@ -0,0 +1,375 @@
+"""Тикеты вопросов менеджерам: ответ в группе уходит пользователю.
+
+Каждый вопрос из дайджеста (forwarding.py) сохраняется тикетом с ключом
+(группа, message_id дайджеста, номер вопроса в нём) — поиск по первичному
+ключу, без перебора. Менеджер отвечает на дайджест реплаем; если вопросов в
+дайджесте несколько, нужный выбирается цитатой (ответ с цитатой части
+сообщения) или номером в начале ответа: «#2 Да, можно».
+
+Хранилище общее для всех воркеров кластера и переживает рестарт: SQLite-файл
+без суффикса воркера (TICKET_STORE_URL=sqlite:///tickets.db) или Postgres.
+Тикет живёт TICKET_TTL с отправки дайджеста, истёкшие удаляются в фоне.
+Открытые — ещё без ответа менеджера; их число пересчитывается раз в
+TICKET_REFRESH_INTERVAL для метрик и по команде /tickets.
+"""
+import asyncio
+import html
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+TICKET_STORE_URL = os.getenv("TICKET_STORE_URL", "sqlite:///tickets.db")  # sqlite:///path.db, postgres://...
+TICKET_TTL = float(os.getenv("TICKET_TTL", 14 * 24 * 3600))  # секунды
+TICKET_REFRESH_INTERVAL = float(os.getenv("TICKET_REFRESH_INTERVAL", 60))  # секунды
+QUESTION_PREVIEW = 200  # символов вопроса в тикете, для /tickets
+
+# «#2» в начале ответа менеджера — номер вопроса в дайджесте
+_TICKET_NUMBER = re.compile(r"\s*#(\d+)\b[\s:.,—-]*")
+
+
+class Ticket(NamedTuple):
+    chat_id: int  # группа менеджеров
+    message_id: int  # дайджест в этой группе
+    seq: int  # номер вопроса в дайджесте, с 1
+    user_id: int
+    author: str  # @username или имя
+    question: str
+    offset: int  # начало вопроса в тексте дайджеста, в единицах UTF-16, как TextQuote.position
+    length: int
+    asked_at: float  # time.time()
+    answered_at: Optional[float] = None
+
+
+def choose_ticket(tickets: List[Ticket], text: str, quote_position: Optional[int] = None
+                  ) -> Tuple[Optional[Ticket], str]:
+    """Ticket a manager's reply is meant for, and the reply text without a #N prefix"""
+    if quote_position is not None:
+        for ticket in tickets:
+            if ticket.offset <= quote_position < ticket.offset + ticket.length:
+                return ticket, text
+    match = _TICKET_NUMBER.match(text)
+    if match:
+        seq = int(match.group(1))
+        for ticket in tickets:
+            if ticket.seq == seq:
+                return ticket, text[match.end():]
+    if len(tickets) == 1:
+        return tickets[0], text
+    return None, text
+
+
+def message_link(chat_id: int, message_id: int) -> Optional[str]:
+    # Ссылки t.me/c/ есть только у супергрупп: -100XXXXXXXXXX
+    chat = str(chat_id)
+    return f"https://t.me/c/{chat[4:]}/{message_id}" if chat.startswith("-100") else None
+
+
+def format_age(seconds: float) -> str:
+    if seconds < 3600:
+        return f"{max(1, int(seconds // 60))} мин"
+    if seconds < 2 * 86400:
+        return f"{int(seconds // 3600)} ч"
+    return f"{int(seconds // 86400)} дн"
+
+
+def format_open_tickets(count: int, oldest: List[Ticket], now: Optional[float] = None) -> str:
+    """HTML summary for /tickets"""
+    if not count:
+        return "Открытых вопросов нет."
+    now = time.time() if now is None else now
+    lines = [f"Открытых вопросов: {count}. Самые старые:"]
+    for ticket in oldest:
+        label = f"#{ticket.seq}"
+        link = message_link(ticket.chat_id, ticket.message_id)
+        if link:
+            label = f'<a href="{link}">{label}</a>'
+        preview = ticket.question if len(ticket.question) <= 60 else ticket.question[:59] + "…"
+        lines.append(f"{label} · {html.escape(ticket.author)} · {format_age(now - ticket.asked_at)} — "
+                     f"{html.escape(preview)}")
+    return "\n".join(lines)
+
+
+_COLUMNS = "chat_id, message_id, seq, user_id, author, question, text_offset, text_length"
+
+
+class SQLiteTicketBackend:
+    """Tickets in a SQLite file shared by all worker processes"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()  # одно соединение на все потоки to_thread
+
+    def _connect(self):
+        # Файл пишут несколько процессов: WAL и ожидание блокировки вместо ошибки
+        conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(
+            "CREATE TABLE IF NOT EXISTS tickets ("
+            " chat_id INTEGER NOT NULL,"
+            " message_id INTEGER NOT NULL,"
+            " seq INTEGER NOT NULL,"
+            " user_id INTEGER NOT NULL,"
+            " author TEXT NOT NULL,"
+            " question TEXT NOT NULL,"
+            " text_offset INTEGER NOT NULL,"
+            " text_length INTEGER NOT NULL,"
+            " asked_at REAL NOT NULL,"
+            " answered_at REAL,"
+            " expires_at REAL NOT NULL,"
+            " PRIMARY KEY (chat_id, message_id, seq));"
+            "CREATE INDEX IF NOT EXISTS tickets_expires ON tickets (expires_at);"
+            "CREATE INDEX IF NOT EXISTS tickets_open ON tickets (asked_at) WHERE answered_at IS NULL;"
+        )
+        conn.commit()
+        return conn
+
+    async def open(self):
+        self._conn = await asyncio.to_thread(self._connect)
+
+    def _close(self):
+        with self._lock:
+            self._conn.close()
+
+    async def close(self):
+        if self._conn is not None:
+            await asyncio.to_thread(self._close)
+            self._conn = None
+
+    def _add_many(self, tickets, expires_at):
+        with self._lock:
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO tickets ({_COLUMNS}, asked_at, answered_at, expires_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(*ticket, expires_at) for ticket in tickets],
+            )
+            self._conn.commit()
+
+    async def add_many(self, tickets: List[Ticket], expires_at: float):
+        await asyncio.to_thread(self._add_many, tickets, expires_at)
+
+    def _find(self, chat_id, message_id, now):
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {_COLUMNS}, asked_at, answered_at FROM tickets "
+                "WHERE chat_id = ? AND message_id = ? AND expires_at > ? ORDER BY seq",
+                (chat_id, message_id, now),
+            ).fetchall()
+            return [Ticket(*row) for row in rows]
+
+    async def find(self, chat_id: int, message_id: int, now: float) -> List[Ticket]:
+        return await asyncio.to_thread(self._find, chat_id, message_id, now)
+
+    def _mark_answered(self, ticket, now):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE tickets SET answered_at = coalesce(answered_at, ?) WHERE chat_id = ? AND message_id = ? AND seq = ?",
+                (now, ticket.chat_id, ticket.message_id, ticket.seq),
+            )
+            self._conn.commit()
+
+    async def mark_answered(self, ticket: Ticket, now: float):
+        await asyncio.to_thread(self._mark_answered, ticket, now)
+
+    def _open_tickets(self, now, limit):
+        with self._lock:
+            count = self._conn.execute(
+                "SELECT count(*) FROM tickets WHERE answered_at IS NULL AND expires_at > ?", (now,)
+            ).fetchone()[0]
+            rows = self._conn.execute(
+                f"SELECT {_COLUMNS}, asked_at, answered_at FROM tickets "
+                "WHERE answered_at IS NULL AND expires_at > ? ORDER BY asked_at LIMIT ?",
+                (now, limit),
+            ).fetchall()
+            return count, [Ticket(*row) for row in rows]
+
+    async def open_tickets(self, now: float, limit: int) -> Tuple[int, List[Ticket]]:
+        return await asyncio.to_thread(self._open_tickets, now, limit)
+
+    def _prune(self, now):
+        with self._lock:
+            removed = self._conn.execute("DELETE FROM tickets WHERE expires_at <= ?", (now,)).rowcount
+            self._conn.commit()
+            return removed
+
+    async def prune(self, now: float) -> int:
+        return await asyncio.to_thread(self._prune, now)
+
+
+class PostgresTicketBackend:
+    """Tickets in Postgres via asyncpg"""
+
+    def __init__(self, dsn: str):
+        self.dsn = dsn
+        self._pool = None
+
+    async def open(self):
+        import asyncpg
+
+        pool = await asyncpg.create_pool(self.dsn, min_size=1, max_size=4)
+        try:
+            await pool.execute(
+                "CREATE TABLE IF NOT EXISTS tickets ("
+                " chat_id BIGINT NOT NULL,"
+                " message_id BIGINT NOT NULL,"
+                " seq INTEGER NOT NULL,"
+                " user_id BIGINT NOT NULL,"
+                " author TEXT NOT NULL,"
+                " question TEXT NOT NULL,"
+                " text_offset INTEGER NOT NULL,"
+                " text_length INTEGER NOT NULL,"
+                " asked_at DOUBLE PRECISION NOT NULL,"
+                " answered_at DOUBLE PRECISION,"
+                " expires_at DOUBLE PRECISION NOT NULL,"
+                " PRIMARY KEY (chat_id, message_id, seq));"
+                "CREATE INDEX IF NOT EXISTS tickets_expires ON tickets (expires_at);"
+                "CREATE INDEX IF NOT EXISTS tickets_open ON tickets (asked_at) WHERE answered_at IS NULL"
+            )
+        except BaseException:
+            pool.terminate()
+            raise
+        self._pool = pool
+
+    async def close(self):
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+
+    async def add_many(self, tickets: List[Ticket], expires_at: float):
+        await self._pool.executemany(
+            f"INSERT INTO tickets ({_COLUMNS}, asked_at, answered_at, expires_at) "
+            "VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11) "
+            "ON CONFLICT (chat_id, message_id, seq) DO UPDATE SET user_id = excluded.user_id,"
+            " author = excluded.author, question = excluded.question, text_offset = excluded.text_offset,"
+            " text_length = excluded.text_length, asked_at = excluded.asked_at,"
+            " answered_at = excluded.answered_at, expires_at = excluded.expires_at",
+            [(*ticket, expires_at) for ticket in tickets],
+        )
+
+    async def find(self, chat_id: int, message_id: int, now: float) -> List[Ticket]:
+        rows = await self._pool.fetch(
+            f"SELECT {_COLUMNS}, asked_at, answered_at FROM tickets "
+            "WHERE chat_id = $1 AND message_id = $2 AND expires_at > $3 ORDER BY seq",
+            chat_id, message_id, now,
+        )
+        return [Ticket(*row) for row in rows]
+
+    async def mark_answered(self, ticket: Ticket, now: float):
+        await self._pool.execute(
+            "UPDATE tickets SET answered_at = coalesce(answered_at, $1) "
+            "WHERE chat_id = $2 AND message_id = $3 AND seq = $4",
+            now, ticket.chat_id, ticket.message_id, ticket.seq,
+        )
+
+    async def open_tickets(self, now: float, limit: int) -> Tuple[int, List[Ticket]]:
+        count = await self._pool.fetchval(
+            "SELECT count(*) FROM tickets WHERE answered_at IS NULL AND expires_at > $1", now
+        )
+        rows = await self._pool.fetch(
+            f"SELECT {_COLUMNS}, asked_at, answered_at FROM tickets "
+            "WHERE answered_at IS NULL AND expires_at > $1 ORDER BY asked_at LIMIT $2",
+            now, limit,
+        )
+        return count, [Ticket(*row) for row in rows]
+
+    async def prune(self, now: float) -> int:
+        status = await self._pool.execute("DELETE FROM tickets WHERE expires_at <= $1", now)
+        return int(status.split()[-1])  # "DELETE 12"
+
+
+class TicketStore:
+    """Tickets over a shared backend; opened on first use, pruned in the background"""
+
+    def __init__(self, backend, ttl: float = TICKET_TTL, refresh_interval: float = TICKET_REFRESH_INTERVAL):
+        self.backend = backend
+        self.ttl = ttl
+        self.refresh_interval = refresh_interval
+        self.open_count = 0  # по последнему пересчёту; другие воркеры тоже меняют его
+        self._opened = False
+        self._open_lock = asyncio.Lock()
+        self._task = None
+
+    async def _ready(self):
+        if not self._opened:
+            async with self._open_lock:
+                if not self._opened:
+                    await self.backend.open()
+                    self._opened = True
+        return self.backend
+
+    async def add_digest(self, chat_id: int, message_id: int, entries: Iterable[dict],
+                         positions: Iterable[Tuple[int, int]]) -> List[Ticket]:
+        """Store one ticket per question of a digest sent to the manager group"""
+        tickets = [
+            Ticket(
+                chat_id, message_id, seq, entry["user_id"],
+                f"@{entry['username']}" if entry.get("username") else entry.get("name") or f"id {entry['user_id']}",
+                entry["text"][:QUESTION_PREVIEW], offset, length, entry.get("ts") or time.time(),
+            )
+            for seq, (entry, (offset, length)) in enumerate(zip(entries, positions), 1)
+        ]
+        backend = await self._ready()
+        await backend.add_many(tickets, time.time() + self.ttl)
+        self.open_count += len(tickets)
+        return tickets
+
+    async def find(self, chat_id: int, message_id: int) -> List[Ticket]:
+        """Live tickets of one digest message, by primary key"""
+        backend = await self._ready()
+        return await backend.find(chat_id, message_id, time.time())
+
+    async def mark_answered(self, ticket: Ticket):
+        backend = await self._ready()
+        await backend.mark_answered(ticket, time.time())
+        if ticket.answered_at is None:
+            self.open_count = max(0, self.open_count - 1)
+
+    async def open_tickets(self, limit: int = 10) -> Tuple[int, List[Ticket]]:
+        """Number of unanswered tickets and the oldest of them"""
+        backend = await self._ready()
+        self.open_count, oldest = await backend.open_tickets(time.time(), limit)
+        return self.open_count, oldest
+
+    async def _refresh_loop(self):
+        while True:
+            try:
+                backend = await self._ready()
+                removed = await backend.prune(time.time())
+                if removed:
+                    logger.info(f"Removed {removed} expired tickets")
+                await self.open_tickets(limit=0)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Ticket store maintenance failed: {e}")
+            await asyncio.sleep(self.refresh_interval)
+
+    async def start(self):
+        self._task = asyncio.create_task(self._refresh_loop())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._opened:
+            await self.backend.close()
+            self._opened = False
+
+
+def create_ticket_store(url: str = TICKET_STORE_URL) -> TicketStore:
+    """Pick a ticket store backend from TICKET_STORE_URL"""
+    if url.startswith("sqlite:///"):
+        return TicketStore(SQLiteTicketBackend(url[len("sqlite:///"):]))
+    if url.startswith(("postgres://", "postgresql://")):
+        return TicketStore(PostgresTicketBackend(url))
+    raise ValueError(f"Неизвестный TICKET_STORE_URL: {url}")
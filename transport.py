@@ -0,0 +1,136 @@
+"""Откуда приходят обновления: вебхук или long polling.
+
+TRANSPORT=webhook (по умолчанию) — Telegram сам присылает обновления на
+RENDER_URL, нужен публичный адрес. TRANSPORT=polling — бот сам забирает их
+getUpdates; подходит для локального запуска, NAT и нагрузочных тестов.
+
+Оба транспорта отдают сырые обновления (dict) в один и тот же приёмник:
+журнал ingest.py или диспетчер воркеров cluster.py. Параллельность обработки
+задаётся там же (INGEST_CONCURRENCY). HTTP-сервер с /metrics и /healthz
+поднимается в обоих режимах.
+
+Если приёмник не принял обновление (например, журнал занят или диск полон),
+вебхук отвечает Telegram 500, а polling повторяет тот же getUpdates с
+нарастающей задержкой: offset не сдвигается, обновление придёт снова.
+main() ждёт transport.wait() и завершается, если приём обновлений прекратился.
+"""
+import asyncio
+import logging
+import os
+
+from telegram import Bot
+from telegram.error import RetryAfter, TelegramError, TimedOut
+
+from webserver import MetricsSource, UpdateSink, local_metrics, start_server
+
+logger = logging.getLogger(__name__)
+
+TRANSPORT = os.getenv("TRANSPORT", "webhook")  # webhook | polling
+POLL_TIMEOUT = int(os.getenv("POLL_TIMEOUT", 30))  # секунды long poll на стороне Telegram
+POLL_LIMIT = int(os.getenv("POLL_LIMIT", 100))  # обновлений за запрос, 1..100
+POLL_MAX_BACKOFF = 30.0
+
+
+class WebhookTransport:
+    def __init__(self, url: str, listen: str, port: int, url_path: str, metrics: MetricsSource = local_metrics):
+        if not url:
+            raise ValueError("Для TRANSPORT=webhook нужен RENDER_URL")
+        self.url = url
+        self.listen = listen
+        self.port = port
+        self.url_path = url_path
+        self.metrics = metrics
+        self._server = None
+
+    async def start(self, bot: Bot, sink: UpdateSink):
+        self._server = start_server(sink, listen=self.listen, port=self.port, url_path=self.url_path,
+                                    metrics=self.metrics)
+        await bot.set_webhook(url=self.url)
+
+    async def wait(self):
+        """Run until cancelled: the HTTP server receives updates on its own"""
+        await asyncio.get_running_loop().create_future()
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.stop()
+            self._server = None
+
+
+class PollingTransport:
+    def __init__(self, listen: str, port: int, timeout: int = POLL_TIMEOUT, limit: int = POLL_LIMIT,
+                 metrics: MetricsSource = local_metrics):
+        self.listen = listen
+        self.port = port
+        self.timeout = timeout
+        self.limit = limit
+        self.metrics = metrics
+        self._server = None
+        self._task = None
+
+    async def start(self, bot: Bot, sink: UpdateSink):
+        # Вебхук и getUpdates взаимоисключающие
+        await bot.delete_webhook()
+        self._server = start_server(None, listen=self.listen, port=self.port, url_path="", metrics=self.metrics)
+        self._task = asyncio.create_task(self._poll(bot, sink))
+
+    async def _poll(self, bot: Bot, sink: UpdateSink):
+        offset = None
+        backoff = 1.0
+        while True:
+            try:
+                updates = await bot.get_updates(
+                    offset=offset, limit=self.limit, timeout=self.timeout,
+                    read_timeout=self.timeout + 10,
+                )
+            except RetryAfter as e:
+                delay = e.retry_after if isinstance(e.retry_after, (int, float)) else e.retry_after.total_seconds()
+                await asyncio.sleep(delay)
+                continue
+            except TimedOut:
+                continue
+            except TelegramError as e:
+                logger.warning(f"getUpdates failed, retrying in {backoff:.0f}s: {e}")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, POLL_MAX_BACKOFF)
+                continue
+            # offset сдвигаем только после того, как приёмник принял обновление:
+            # непринятые Telegram пришлёт снова, повторы отсеет журнал
+            try:
+                for update in updates:
+                    await sink(update.to_dict())
+                    offset = update.update_id + 1
+            except Exception as e:
+                logger.error(f"Update sink failed, fetching again in {backoff:.0f}s: {e}", exc_info=True)
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, POLL_MAX_BACKOFF)
+                continue
+            backoff = 1.0
+
+    async def wait(self):
+        """Run until cancelled; raise if polling has stopped"""
+        # shield: отмена ожидания не должна отменять сам опрос — это делает stop()
+        await asyncio.shield(self._task)
+        raise RuntimeError("Polling stopped")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._server is not None:
+            self._server.stop()
+            self._server = None
+
+
+def create_transport(name: str, webhook_url: str, listen: str, port: int, url_path: str,
+                     metrics: MetricsSource = local_metrics):
+    """Pick the update transport from TRANSPORT"""
+    if name == "webhook":
+        return WebhookTransport(webhook_url, listen, port, url_path, metrics)
+    if name == "polling":
+        return PollingTransport(listen, port, metrics=metrics)
+    raise ValueError(f"Неизвестный TRANSPORT: {name}")
@@ -0,0 +1,144 @@
+"""Проверка content.json перед деплоем.
+
+    python validate.py [content.json] [--allow-host example.org ...]
+
+Ищет пункты меню со ссылками на несуществующие ответы, неиспользуемые
+ответы, подписи кнопок, которые конфликтуют с переходом из главного меню
+или служебными кнопками, невалидный для Telegram HTML и ссылки на домены
+вне списка разрешённых. Сеть не используется. Код выхода 1, если есть ошибки.
+"""
+import argparse
+import re
+import sys
+from collections import defaultdict
+from typing import List, NamedTuple
+from urllib.parse import urlsplit
+
+from content import CONTENT_PATH, ContentError, check_structure, read_raw
+from menu import BACK_BUTTON, CUSTOM_QUESTION_BUTTON, compile_menu
+from render import MESSAGE_LIMIT, RenderError, normalize, render_answer, text_length
+
+# Домены, на которые можно ссылаться из ответов
+ALLOWED_HOSTS = {
+    "vk.com",
+    "t.me",
+    "calendar.google.com",
+    "paper.rsmu.ru",
+    "rdkb.ru",
+    "disk.yandex.ru",
+    "i.ibb.co",
+}
+
+_URL_RE = re.compile(r"""https?://[^\s"'<>]+""")
+
+
+class Issue(NamedTuple):
+    level: str  # "ERROR" | "WARNING"
+    where: str
+    message: str
+
+    def __str__(self):
+        return f"{self.level} {self.where}: {self.message}"
+
+
+def _walk_labels(tree, path=()):
+    for label, value in tree.items():
+        if label.startswith("_"):
+            continue
+        yield path + (label,), value
+        if isinstance(value, dict):
+            yield from _walk_labels(value, path + (label,))
+
+
+def _host_allowed(host: str, allowed) -> bool:
+    return any(host == h or host.endswith("." + h) for h in allowed)
+
+
+def check_content(raw, allowed_hosts=ALLOWED_HOSTS) -> List[Issue]:
+    issues = []
+    try:
+        check_structure(raw)
+        menu = compile_menu(raw["menu"])
+    except (ContentError, TypeError, ValueError) as e:
+        return [Issue("ERROR", "content", str(e))]
+    answers = raw["answers"]
+
+    # ── Целостность ключей
+    used = set()
+    for node in menu.nodes.values():
+        if node.answer is None:
+            continue
+        used.add(node.answer)
+        if node.answer not in answers:
+            where = "menu." + " / ".join(node.path) if node.path else "menu"
+            issues.append(Issue("ERROR", where, f"ответ {node.answer!r} не найден в answers"))
+    for key in answers:
+        if key not in used:
+            issues.append(Issue("WARNING", f"answers.{key}", "ответ не используется в меню"))
+
+    # ── Подписи кнопок
+    root_labels = {label: value for label, value in raw["menu"].items() if not label.startswith("_")}
+    by_label = defaultdict(list)
+    for path, value in _walk_labels(raw["menu"]):
+        label = path[-1]
+        where = "menu." + " / ".join(path)
+        by_label[label].append((path, value))
+        if label in (BACK_BUTTON, CUSTOM_QUESTION_BUTTON):
+            issues.append(Issue("ERROR", where, "подпись совпадает со служебной кнопкой, пункт недоступен"))
+    for label, places in by_label.items():
+        if label not in root_labels or len(places) < 2:
+            continue
+        # Вложенный пункт с подписью пункта главного меню: набранный вне своего
+        # подменю текст уведёт в раздел главного меню. Безвредно, только если
+        # содержимое одинаковое (как у «Донорство компонентов крови»)
+        for path, value in places:
+            if len(path) > 1 and value != root_labels[label]:
+                issues.append(Issue(
+                    "WARNING", "menu." + " / ".join(path),
+                    "подпись совпадает с пунктом главного меню, но ведёт к другому содержимому",
+                ))
+
+    # ── HTML и ссылки
+    for key, answer in answers.items():
+        where = f"answers.{key}"
+        text = answer.get("text", "") if isinstance(answer, dict) else answer
+        try:
+            render_answer(answer)
+        except RenderError as e:
+            issues.append(Issue("ERROR", where, f"HTML: {e}"))
+        if text_length(normalize(text)) > MESSAGE_LIMIT:
+            issues.append(Issue("WARNING", where, "длиннее 4096 символов, будет отправлен частями"))
+        urls = _URL_RE.findall(text)
+        if isinstance(answer, dict) and answer.get("photo_url"):
+            urls.append(answer["photo_url"])
+        for url in urls:
+            host = (urlsplit(url).hostname or "").lower()
+            if not _host_allowed(host, allowed_hosts):
+                issues.append(Issue("ERROR", where, f"ссылка на неразрешённый домен: {url}"))
+    return issues
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Проверка content.json")
+    parser.add_argument("path", nargs="?", default=CONTENT_PATH)
+    parser.add_argument("--allow-host", action="append", default=[],
+                        help="дополнительный разрешённый домен (можно несколько раз)")
+    parser.add_argument("--strict", action="store_true", help="считать предупреждения ошибками")
+    args = parser.parse_args(argv)
+
+    try:
+        raw = read_raw(args.path)
+    except (OSError, ValueError) as e:
+        print(f"ERROR {args.path}: {e}")
+        return 1
+
+    issues = check_content(raw, ALLOWED_HOSTS | set(args.allow_host))
+    for issue in issues:
+        print(issue)
+    errors = sum(1 for i in issues if i.level == "ERROR" or args.strict)
+    print(f"{args.path}: {errors} ошибок, {len(issues) - errors} предупреждений")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,81 @@
+"""HTTP-сервер вебхука (tornado, как у PTB start_webhook).
+
+Свой сервер вместо Updater.start_webhook нужен, чтобы рядом с вебхуком
+отдавать служебные страницы: GET /metrics (Prometheus) и GET /healthz, а
+принятые обновления отдавать куда нужно: в журнал (см. ingest.py) или, в
+режиме нескольких воркеров, в очередь нужного воркера (см. cluster.py).
+В режиме polling сервер отдаёт только служебные страницы. Текст /metrics
+по умолчанию — метрики этого процесса; при WORKERS > 1 — собранные со всех
+воркеров (cluster.WorkerPool.render_metrics).
+"""
+import json
+import logging
+from typing import Awaitable, Callable, Optional
+
+import tornado.web
+from tornado.httpserver import HTTPServer
+
+from metrics import render_all
+
+logger = logging.getLogger(__name__)
+
+UpdateSink = Callable[[dict], Awaitable[None]]
+MetricsSource = Callable[[], Awaitable[str]]
+
+
+async def local_metrics() -> str:
+    return render_all()
+
+
+class WebhookHandler(tornado.web.RequestHandler):
+    def initialize(self, on_update: UpdateSink):
+        self.on_update = on_update
+
+    async def post(self):
+        try:
+            data = json.loads(self.request.body)
+        except ValueError as e:
+            logger.warning(f"Bad webhook payload: {e}")
+            raise tornado.web.HTTPError(400)
+        if not isinstance(data, dict) or "update_id" not in data:
+            raise tornado.web.HTTPError(400)
+        await self.on_update(data)
+        self.set_status(200)
+
+    def log_exception(self, typ, value, tb):
+        logger.error(f"Webhook handler error: {value}", exc_info=(typ, value, tb))
+
+
+class MetricsHandler(tornado.web.RequestHandler):
+    def initialize(self, render: MetricsSource):
+        self.render = render
+
+    async def get(self):
+        text = await self.render()
+        self.set_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.write(text)
+
+
+class HealthHandler(tornado.web.RequestHandler):
+    def get(self):
+        self.write("ok")
+
+
+def make_web_app(on_update: Optional[UpdateSink], url_path: str,
+                 metrics: MetricsSource = local_metrics) -> tornado.web.Application:
+    """Service pages plus the webhook route; without on_update (polling) only the service pages"""
+    routes = [
+        (r"/metrics", MetricsHandler, {"render": metrics}),
+        (r"/healthz", HealthHandler),
+    ]
+    if on_update is not None:
+        routes.insert(0, ("/" + url_path.strip("/"), WebhookHandler, {"on_update": on_update}))
+    return tornado.web.Application(routes)
+
+
+def start_server(on_update: Optional[UpdateSink], listen: str, port: int, url_path: str,
+                 metrics: MetricsSource = local_metrics) -> HTTPServer:
+    server = HTTPServer(make_web_app(on_update, url_path, metrics), xheaders=True)
+    server.listen(port, address=listen)
+    logger.info(f"HTTP server listening on {listen}:{port}")
+    return server